@@ -0,0 +1,169 @@
+"""
+Connection graph of a workspace. Links are kept between FMU names and variable names,
+so renaming, reloading or lazily loading an FMU never invalidates them.
+
+Every link is a tuple ("output_fmu_name", "output_name", "input_fmu_name", "input_name").
+An input can only be given by one output, adding a link to an input that is already linked replaces the old link.
+"""
+
+
+class ConnectionGraph:
+    """
+    Links indexed by input port and by output port of every FMU, adding, removing and looking up a link is O(1).
+    """
+    def __init__(self):
+        self.links = {}                     # {("input_fmu_name", "input_name") : ("output_fmu_name", "output_name")} in the order they were linked
+        self.inputs = {}                    # {"fmu_name" : {"input_name" : ("output_fmu_name", "output_name")}}
+        self.outputs = {}                   # {"fmu_name" : {"output_name" : {("input_fmu_name", "input_name"), ...}}}
+        self.version = 0                    # changes with every change of the links, resolved value references are cached per version
+        self.resolved = None                # (version, fmu_objects, [(output FMUObject, output_vr, input FMUObject, input_vr), ...])
+
+    def __len__(self):
+        return len(self.links)
+
+    def __iter__(self):
+        for (in_fmu, in_name), (out_fmu, out_name) in self.links.items():
+            yield (out_fmu, out_name, in_fmu, in_name)
+
+    def add(self, out_fmu, out_name, in_fmu, in_name):
+        """
+        Links out_fmu's output to in_fmu's input, returns the link it replaced or None.
+        """
+        replaced = self.remove(in_fmu, in_name)
+        self.links[(in_fmu, in_name)] = (out_fmu, out_name)
+        self.inputs.setdefault(in_fmu, {})[in_name] = (out_fmu, out_name)
+        self.outputs.setdefault(out_fmu, {}).setdefault(out_name, set()).add((in_fmu, in_name))
+        self.version += 1
+        return replaced
+
+    def remove(self, in_fmu, in_name):
+        """
+        Removes the link to in_fmu's input, returns the removed link or None if the input wasn't linked.
+        """
+        source = self.links.pop((in_fmu, in_name), None)
+        if source is None:
+            return None
+
+        out_fmu, out_name = source
+        del self.inputs[in_fmu][in_name]
+        if not self.inputs[in_fmu]:
+            del self.inputs[in_fmu]
+        targets = self.outputs[out_fmu][out_name]
+        targets.discard((in_fmu, in_name))
+        if not targets:
+            del self.outputs[out_fmu][out_name]
+            if not self.outputs[out_fmu]:
+                del self.outputs[out_fmu]
+
+        self.version += 1
+        return (out_fmu, out_name, in_fmu, in_name)
+
+    def remove_link(self, out_fmu, out_name, in_fmu, in_name):
+        """
+        Removes one specific link, returns it or None if it doesn't exist.
+        """
+        if self.links.get((in_fmu, in_name)) != (out_fmu, out_name):
+            return None
+        return self.remove(in_fmu, in_name)
+
+    def remove_output(self, out_fmu, out_name = None):
+        """
+        Removes every link from out_fmu's output (every output if out_name is None), returns the removed links.
+        """
+        outputs = self.outputs.get(out_fmu, {})
+        out_names = list(outputs) if out_name is None else [out_name]
+        targets = [target for name in out_names for target in list(outputs.get(name, ()))]
+        return [self.remove(in_fmu, in_name) for in_fmu, in_name in targets]
+
+    def remove_input(self, in_fmu, in_name = None):
+        """
+        Removes the link to in_fmu's input (every input if in_name is None), returns the removed links.
+        """
+        in_names = list(self.inputs.get(in_fmu, {})) if in_name is None else [in_name]
+        removed = [self.remove(in_fmu, name) for name in in_names]
+        return [link for link in removed if link is not None]
+
+    def remove_fmu(self, fmu_name):
+        """
+        Removes every link from or to fmu_name, returns the removed links.
+        """
+        return self.remove_output(fmu_name) + self.remove_input(fmu_name)
+
+    def rename_fmu(self, old_name, new_name):
+        """
+        Renames an FMU in every link, keeping the order of the links.
+        """
+        if old_name not in self.inputs and old_name not in self.outputs:
+            return
+        rename = lambda fmu_name: new_name if fmu_name == old_name else fmu_name
+        links = [(rename(out_fmu), out_name, rename(in_fmu), in_name) for out_fmu, out_name, in_fmu, in_name in self]
+        self.clear()
+        for link in links:
+            self.add(*link)
+
+    def clear(self):
+        self.links.clear()
+        self.inputs.clear()
+        self.outputs.clear()
+        self.version += 1
+
+    def get_source(self, in_fmu, in_name):
+        """
+        Returns ("output_fmu_name", "output_name") linked to in_fmu's input, or None.
+        """
+        return self.links.get((in_fmu, in_name))
+
+    def get_targets(self, out_fmu, out_name):
+        """
+        Returns the set of ("input_fmu_name", "input_name") linked to out_fmu's output.
+        """
+        return self.outputs.get(out_fmu, {}).get(out_name, set())
+
+    def is_input_linked(self, in_fmu, in_name):
+        return (in_fmu, in_name) in self.links
+
+    def get_links(self, fmu_name = None):
+        """
+        Returns every link in the order they were linked, or only the links from or to fmu_name
+        (links from its outputs first, then links to its inputs).
+        """
+        if fmu_name is None:
+            return list(self)
+
+        links = [(fmu_name, out_name, in_fmu, in_name)
+                 for out_name, targets in self.outputs.get(fmu_name, {}).items() for in_fmu, in_name in sorted(targets)]
+        links += [(out_fmu, out_name, fmu_name, in_name)
+                  for in_name, (out_fmu, out_name) in self.inputs.get(fmu_name, {}).items() if out_fmu != fmu_name]
+        return links
+
+    def get_fmu_names(self):
+        return set(self.inputs) | set(self.outputs)
+
+    def resolve(self, fmu_objects):
+        """
+        Returns [(output FMUObject, output_vr, input FMUObject, input_vr), ...] for fmu_objects ({"fmu_name" : FMUObject}).
+        Value references come from the FMUs' metadata and are only looked up again after the links changed.
+        Raises KeyError if a linked FMU or variable doesn't exist.
+        """
+        if self.resolved is not None and self.resolved[0] == self.version and self.resolved[1] is fmu_objects:
+            return self.resolved[2]
+
+        resolved = []
+        for out_fmu, out_name, in_fmu, in_name in self:
+            out_obj, in_obj = fmu_objects[out_fmu], fmu_objects[in_fmu]
+            out_vr = out_obj.metadata.get_value_reference(out_name)
+            in_vr = in_obj.metadata.get_value_reference(in_name)
+            if out_vr is None or in_vr is None:
+                raise KeyError(f"Link ({out_fmu}) {out_name} -> ({in_fmu}) {in_name} has a variable that doesn't exist.")
+            resolved.append((out_obj, out_vr, in_obj, in_vr))
+
+        self.resolved = (self.version, fmu_objects, resolved)
+        return resolved
+
+    def get_master_connections(self, fmu_objects):
+        """
+        Returns the connection list pyFMI's Master needs: [(output model, "output_name", input model, "input_name"), ...].
+        fmu_objects is {"fmu_name" : FMUObject}, the models are looked up when this is called so reloaded FMUs are used.
+        """
+        return [(fmu_objects[out_fmu].loaded_fmu, out_name, fmu_objects[in_fmu].loaded_fmu, in_name)
+                for out_fmu, out_name, in_fmu, in_name in self]
@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+import threading
+
+"""
+Helper functions for the on-disk cache shared by every session.
+Entries are keyed by the content hash of the FMU file, so a moved or renamed
+FMU still hits the cache and a re-exported FMU never does.
+"""
+# cache lives in the user's home directory unless COSIM_CACHE_DIR is set
+CACHE_DIR = os.environ.get("COSIM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cosim_cache"))
+
+# {"abs_path": (mtime_ns, size, "sha256")} so a session only hashes a file once
+_hash_memo = {}
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    Returns the sha256 hex digest of the file at path.
+    """
+    abs_path = os.path.abspath(path)
+    stat = os.stat(abs_path)
+
+    memo = _hash_memo.get(abs_path)
+    if memo is not None and memo[0] == stat.st_mtime_ns and memo[1] == stat.st_size:
+        return memo[2]
+
+    sha = hashlib.sha256()
+    with open(abs_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha.update(chunk)
+
+    digest = sha.hexdigest()
+    _hash_memo[abs_path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def get_cache_dir(kind):
+    """
+    Returns (and creates) the cache sub directory for one kind of cached data.
+    """
+    path = os.path.join(CACHE_DIR, kind)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def load_cached_json(kind, key):
+    """
+    Returns the cached dictionary for key, or None if there is no usable entry.
+    """
+    try:
+        path = os.path.join(get_cache_dir(kind), key + ".json")
+        with open(path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached_json(kind, key, data):
+    """
+    Writes data for key. Writes go through a temp file so parallel sessions/threads never read half a file.
+    Returns 1 if saved, 0 otherwise (a failed cache write never stops a run).
+    """
+    try:
+        path = os.path.join(get_cache_dir(kind), key + ".json")
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(data, file)
+        os.replace(temp_path, path)
+        return 1
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Warning: could not write {kind} cache entry: {e}")
+        return 0
+
+
+def load_cached_bytes(kind, key):
+    """
+    Returns the cached bytes for key, or None. A hit marks the entry as recently used (see evict_cache).
+    """
+    try:
+        path = os.path.join(get_cache_dir(kind), key + ".bin")
+        with open(path, "rb") as file:
+            data = file.read()
+        os.utime(path)
+        return data
+    except OSError:
+        return None
+
+
+def save_cached_bytes(kind, key, data, max_bytes):
+    """
+    Writes data for key, then evicts the least recently used entries of kind beyond max_bytes.
+    Returns 1 if saved, 0 otherwise (a failed cache write never stops a run).
+    """
+    if len(data) > max_bytes:
+        print(f"Warning: {kind} cache entry of {len(data)} bytes is larger than the whole cache ({max_bytes} bytes), not saved.")
+        return 0
+    try:
+        path = os.path.join(get_cache_dir(kind), key + ".bin")
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Warning: could not write {kind} cache entry: {e}")
+        return 0
+    evict_cache(kind, max_bytes)
+    return 1
+
+
+def evict_cache(kind, max_bytes):
+    """
+    Removes the least recently used entries of kind until the entries take at most max_bytes.
+    """
+    cache_dir = get_cache_dir(kind)
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".bin"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total = sum(size for mtime, size, path in entries)
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
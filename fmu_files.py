@@ -1,9 +1,19 @@
 import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import matplotlib.pyplot as plt
 from pyfmi import load_fmu, exceptions
+from fmu_metadata import FMUMetadata
+from connection_graph import ConnectionGraph
+from link_rules import match_links
 from runSim.runSim import main as run_sim
-from runSim.runSim import get_master_step_size
+from runSim.runSim import get_master_step_size, RESULT_FORMATS, MASTER_TYPES
+from runSim.coupling_graph import analyze_coupling
+from runSim.model_worker import ModelProcess
+from runSim.checkpoint import get_checkpoint_dir, read_checkpoint_info, CHECKPOINT_FILE, DEFAULT_SNAPSHOT_CACHE_BYTES
+from runSim.input_data import FILL_METHODS, DEFAULT_CHUNK_ROWS, InputStore
+from runSim.result_store import is_binary_result, load_schema, open_columns
 
 """
 Helper functions for anything related to linking
@@ -43,6 +53,100 @@ def get_output_names(fmu):
         return None
     
 
+def read_result_header(result_path):
+    """
+    Returns the variable names of a result file (csv or columnar binary) without reading any data.
+    """
+    if is_binary_result(result_path):
+        return load_schema(result_path)["columns"]
+    return list(pd.read_csv(result_path, nrows=0).columns)
+
+def read_result_data(result_path, variables):
+    """
+    Reads only the given variables of a result file, returns {"variable_name": np.array}.
+    Binary results are memory-mapped, so only the requested columns are ever read from disk.
+    """
+    if is_binary_result(result_path):
+        schema, data = open_columns(result_path)
+        column_index = {name: index for index, name in enumerate(schema["columns"])}
+        return {var: data[column_index[var]] for var in variables}
+
+    df = pd.read_csv(result_path, usecols=variables)
+    return {var: df[var].to_numpy() for var in variables}
+
+
+def read_result_table(result_path):
+    """
+    Returns every variable of a result file as a DataFrame, binary results are built from their memory-mapped columns.
+    """
+    if is_binary_result(result_path):
+        return pd.DataFrame(read_result_data(result_path, read_result_header(result_path)))
+    return pd.read_csv(result_path)
+
+
+class ResultReader:
+    """
+    Reads result columns for view-res/graph-res/list-res and keeps them in a size bounded LRU cache.
+    Cached columns are keyed by (result_name, fmu_name, variable_name).
+    """
+    max_bytes = 256 * 1024 * 1024
+
+    def __init__(self, max_bytes = None):
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        self.columns = OrderedDict()        # {(result_name, fmu_name, var) : np.array}, least recently used first
+        self.cached_bytes = 0
+        self.headers = {}                   # {result_path : ["variable_name", ...]}
+
+    def get_header(self, result_path):
+        if result_path not in self.headers:
+            self.headers[result_path] = read_result_header(result_path)
+        return self.headers[result_path]
+
+    def read_columns(self, result_name, fmu_name, result_path, variables):
+        """
+        Returns {"variable_name": np.array} for variables, reading the ones that aren't cached in one pass.
+        Raises KeyError if a variable isn't inside the result file.
+        """
+        header = set(self.get_header(result_path))
+        missing = [var for var in variables if var not in header]
+        if missing:
+            raise KeyError(f"{missing} not in result of '{fmu_name}'")
+
+        data = {}
+        for var in dict.fromkeys(variables):
+            key = (result_name, fmu_name, var)
+            if key in self.columns:
+                self.columns.move_to_end(key)
+                data[var] = self.columns[key]
+
+        to_read = [var for var in dict.fromkeys(variables) if var not in data]
+        if to_read:
+            data.update(read_result_data(result_path, to_read))
+            # the columns of this request are returned as read, the cache never drops them to make room for each other
+            keep = {(result_name, fmu_name, var) for var in data}
+            for var in to_read:
+                self.add(result_name, fmu_name, var, data[var], keep)
+
+        return {var: data[var] for var in variables}
+
+    def add(self, result_name, fmu_name, var, column, keep = ()):
+        """
+        Caches column, dropping the least recently used columns (other than the keys in keep) while over max_bytes.
+        Columns in keep, or a column bigger than max_bytes on its own, may leave the cache over max_bytes.
+        """
+        self.columns[(result_name, fmu_name, var)] = column
+        self.cached_bytes += column.nbytes
+        for key in [key for key in self.columns if key not in keep]:
+            if self.cached_bytes <= self.max_bytes or len(self.columns) <= 1:
+                break
+            self.cached_bytes -= self.columns.pop(key).nbytes
+
+    def rename_result(self, old_name, new_name):
+        for key in [key for key in self.columns if key[0] == old_name]:
+            self.columns[(new_name, key[1], key[2])] = self.columns.pop(key)
+
+
 def add_index_to_name(new_name, list):
     index = 0
     old_name = new_name
@@ -60,6 +164,9 @@ def add_index_to_name(new_name, list):
 
 #     return new_file_path
 
+# variables printed per page by list-inputs/list-outputs/list-vars
+LIST_PAGE_SIZE = 100
+
 """
 Class which holds the information for individual FMU object
 """
@@ -70,7 +177,11 @@ class FMUObject:
 
     loaded_fmu = None
 
-    input_files = []
+    metadata = None                     # FMUMetadata index, built once when the FMU is added
+
+    input_files = []                    # ["data_path", ...] files giving data to at least one input
+
+    input_store = None                  # InputStore, every data file parsed once when it is added
 
     # {"input_name": bool} will be set TRUE if
     # A. "input_name" is inside connections
@@ -80,57 +191,179 @@ class FMUObject:
 
     suppressed_inputs = []
 
-    def __init__(self, name, fmu_path):
+    # lazy FMUs are only loaded by pyFMI when a run needs them (see instantiate/release)
+    lazy = False
+
+    # isolated FMUs live in their own worker process (runSim/model_worker.py), loaded_fmu is then a ModelProcess
+    isolated = False
+
+    # an FMU that went through a run is reset in place (fmi2Reset) before the next one instead of loaded again
+    needs_reset = False
+
+    # False for FMUs that can't be reset, they are loaded again instead (see prepare_run)
+    can_reset = True
+
+    def __init__(self, name, fmu_path, lazy = False):
         self.name = name
         self.fmu_path = fmu_path
-        self.load_fmu()
+        self.lazy = lazy
+        self.needs_reset = False
+        self.input_files = []
+        self.input_store = InputStore()
+        self.suppressed_inputs = []
+        self.metadata = FMUMetadata.from_fmu(fmu_path)
+        self.can_reset = not self.metadata.is_energyplus()      # EnergyPlus starts over in a new run directory
+        if not lazy:
+            self.load_fmu()
         
-        self.connection_bools = {}
-        for input_name in get_input_names(self.loaded_fmu):
-            self.connection_bools[input_name] = False
-
-        self.input_file_bools = {}
-        for input_name in get_input_names(self.loaded_fmu):
-            self.input_file_bools[input_name] = False
+        self.connection_bools = dict.fromkeys(self.metadata.inputs, False)
+        self.input_file_bools = dict.fromkeys(self.metadata.inputs, False)
     
 
     def load_fmu(self):  
+        self.close_worker()
+        self.needs_reset = False
+        if self.isolated:
+            self.loaded_fmu = ModelProcess(self.fmu_path, self.name)
+            self.loaded_fmu.wait_ready()
+            return
         self.loaded_fmu = load_fmu(self.fmu_path, kind='CS', log_level=7)  # Load the FMU using pyfmi
+
+
+    def close_worker(self):
+        if isinstance(self.loaded_fmu, ModelProcess):
+            self.loaded_fmu.close()
+            self.loaded_fmu = None
+
+
+    def instantiate(self):
+        """
+        Loads the FMU with pyFMI if it isn't loaded yet, returns the loaded model.
+        The worker of an isolated FMU that crashed is started again.
+        """
+        if isinstance(self.loaded_fmu, ModelProcess) and not self.loaded_fmu.is_alive():
+            print(f"The worker process of FMU '{self.name}' had stopped (exit code {self.loaded_fmu.process.exitcode}), restarting it.")
+            self.loaded_fmu.restart()
+        if self.loaded_fmu is None:
+            self.load_fmu()
+        return self.loaded_fmu
+
+
+    def prepare_run(self):
+        """
+        Gets the FMU ready for a run: loaded if it isn't, reset in place if it went through a run,
+        loaded again if it can't be reset. Returns what was done: "ready", "loaded", "reset" or "reloaded".
+        Raises FMUException if the FMU can't be loaded.
+        """
+        if self.loaded_fmu is None or (isinstance(self.loaded_fmu, ModelProcess) and not self.loaded_fmu.is_alive()):
+            self.instantiate()
+            self.needs_reset = False                                    # a restarted worker loaded the FMU again
+            return "loaded"
+        if not self.needs_reset:
+            return "ready"
+
+        self.needs_reset = False
+        if self.can_reset:
+            try:
+                self.loaded_fmu.reset()
+                return "reset"
+            except (exceptions.FMUException, AttributeError) as e:
+                print(f"FMU '{self.name}' can't be reset ({e}), it is loaded again before every run from now on.")
+                self.can_reset = False
+        self.load_fmu()
+        return "reloaded"
+
+
+    def finish_run(self):
+        """
+        Marks the FMU as run, it has to be reset before the next run. Lazy FMUs are released.
+        """
+        self.needs_reset = self.loaded_fmu is not None
+        self.release()
+
+
+    def release(self):
+        """
+        Drops the pyFMI instance of a lazy FMU so its unzipped files and shared library are freed.
+        """
+        if self.lazy:
+            self.close_worker()
+            self.loaded_fmu = None
+            self.needs_reset = False
+
+
+    def set_isolated(self, isolated):
+        """
+        Moves the FMU into its own worker process (isolated = True) or back into this process.
+        A loaded FMU is loaded again, its state is lost.
+        """
+        if isolated == self.isolated:
+            return
+        was_loaded = self.loaded_fmu is not None
+        self.close_worker()
+        self.loaded_fmu = None
+        self.isolated = isolated
+        if was_loaded or not self.lazy:
+            self.load_fmu()
+
+
+    def restart(self):
+        """
+        Loads the FMU again, in a new worker process if it is isolated.
+        """
+        if isinstance(self.loaded_fmu, ModelProcess):
+            self.loaded_fmu.restart()
+            self.needs_reset = False
+        else:
+            self.load_fmu()
         
 
     def change_name(self, new_name):
         self.name = new_name
 
 
+    # names come from the metadata index, the returned lists must not be modified
     def get_input_names(self):
-        return get_input_names(self.loaded_fmu)
+        return self.metadata.inputs
     
 
     def get_output_names(self):
-        return get_output_names(self.loaded_fmu)
+        return self.metadata.outputs
+
+
+    def has_input(self, input_name):
+        return self.metadata.has_input(input_name)
+
+
+    def has_output(self, output_name):
+        return self.metadata.has_output(output_name)
 
 
-    # appends data_path to input_files to later be turned into input_object when running simulation
-    # deletes input_name from input_files if input_name is not an input name of the FMU
+    # parses data_path into the input store, raises ValueError/OSError if it can't be read
+    # streamed data files only have their column names read
+    def load_data(self, data_path, stream = False):
+        return self.input_store.load(data_path, stream)
+
+
+    # gives the inputs in header from an already loaded data file (see load_data)
+    # deletes input_name from header if input_name is not an input name of the FMU
     # returns added header
-    def add_data(self, data_path, df, header):
-        self.input_files.append(data_path)
-        for input_name in header:
-            if input_name not in self.get_input_names():
+    def add_data(self, source, header):
+        for input_name in list(header):
+            if not self.has_input(input_name):
                 header.remove(input_name)  # remove input_name if it is not in the input names of the FMU
-                df.drop(input_name, axis=1)
             else:
                 self.input_file_bools[input_name] = True
+        self.input_store.add(source, header)
+        self.input_files = self.input_store.get_paths()
         return header
 
 
     def remove_data(self, input_name):
-        if input_name in self.get_input_names():
-            for input_file in self.input_files:
-                df = pd.read_csv(input_file)
-                if input_name in list(df.columns):
-                    df.drop(input_name, axis=1)
-                    self.input_file_bools[input_name] = False
+        if self.has_input(input_name):
+            if self.input_store.remove(input_name) is not None:
+                self.input_files = self.input_store.get_paths()
+            self.input_file_bools[input_name] = False
         else:
             return -1
     
@@ -148,7 +381,7 @@ class FMUObject:
         type = None
         overlap = False
 
-        if input_name in self.get_input_names():
+        if self.has_input(input_name):
             if self.connection_bools[input_name]:
                 type = "connection"
                 overlap = True
@@ -167,7 +400,7 @@ class FMUObject:
 
 
     def suppress_all_warnings(self):
-        self.suppressed_inputs = self.get_input_names()
+        self.suppressed_inputs = list(self.get_input_names())
 
 
     def unsuppress_input_warnings(self, input):
@@ -179,31 +412,51 @@ class FMUObject:
         self.suppressed_inputs.clear()
 
 
-    def list_inputs(self):
-        inputs = self.get_input_names()
+    def search_variables(self, **search):
+        """
+        Searches the FMU's variable catalog (see VariableCatalog.search), returns (["variable_name", ...], total).
+        """
+        return self.metadata.get_catalog().search(**search)
 
-        if inputs is None:
-            print("No inputs could be found or this fmu. FMU name may be incorrect.")
-            return 0
 
-        print(f"Inputs in {self.name}:")
-        num = 0
-        for name in inputs:
-            print(f" {num} - {name}")
-            num += 1
+    # inputs/outputs are listed in name order, the number is still the index used by link
+    def list_inputs(self, page_size = LIST_PAGE_SIZE, **search):
+        return self.list_variables("input", self.metadata.input_index, page_size, search)
 
-    def list_outputs(self):
-        outputs = self.get_output_names()
+    def list_outputs(self, page_size = LIST_PAGE_SIZE, **search):
+        return self.list_variables("output", self.metadata.output_index, page_size, search)
 
-        if outputs is None:
-            print("No inputs could be found or this fmu. FMU name may be incorrect.")
+    def list_variables(self, causality, index = None, page_size = LIST_PAGE_SIZE, search = None):
+        """
+        Prints one page of the variables matching search, causality None lists every variable with its attributes.
+        """
+        search = search or {}
+        try:
+            names, total = self.search_variables(causality=causality, page_size=page_size, **search)
+        except ValueError as e:
+            print(f"Error: {e}")
             return 0
 
-        print(f"Outputs in {self.name}:")
-        num = 0
-        for name in outputs:
-            print(f" {num} - {name}")
-            num += 1
+        # list-inputs/list-outputs pass their causality, a causality=... search filter (a list) lists "variables"
+        kind = f"{causality}s" if isinstance(causality, str) else "variables"
+        if total == 0:
+            print(f"No {kind} in {self.name} match.")
+            return 1
+
+        print(f"{kind.capitalize()} in {self.name}:")
+        catalog = self.metadata.get_catalog()
+        for name in names:
+            if index is not None:
+                print(f" {index[name]} - {name}")
+            else:
+                var_causality, variability, var_type = catalog.attributes[name]
+                print(f" {name:<60} {var_causality:<20} {variability:<12} {var_type}")
+
+        if len(names) < total:
+            page = search.get("page", 1)
+            first = (page - 1) * page_size + 1
+            print(f"Showing {first}-{first + len(names) - 1} of {total} {kind}. Add page={page + 1} for the next page.")
+        return 1
     
     def list_suppressed(self):
         print(f"{self.name} - {self.suppressed_inputs}")
@@ -219,46 +472,54 @@ class FMUObject:
             master_header.append((self.loaded_fmu, input_var))
         return master_header
 
-    def create_data_df(self, dfs):
-        merged_df = None
-        if len(dfs):
-            merged_df = dfs[0]
-            for df in dfs:
-                if not df.equals(dfs[0]):
-                    merged_df.merge(df, how='outer', on='time')
-            merged_df.ffill(inplace=True)
-
-        return merged_df
-
     def csv_to_input_object(self, master = False):
         """
-        Function to add data to input
+        Function to add data to input.
+        Returns [header, sources], sources is [(times, values), ...] with one source per data file,
+        columns of values follow header. Data comes from the input store, only files changed on disk are read again.
+        Returns 0 if a data file can't be read anymore.
         """
-        # returned input_object is = [header, df]
         tot_header = []
-        input_data_dfs = []
-
-        for data_path in self.input_files:
-            base_type = os.path.splitext(data_path)[1]  # Get the file extension
+        sources = []
 
-            if base_type != ".csv":
-                print(f"Error: The file {data_path} is not in form csv. Currently only csvs are correctly loaded.") 
-                return 0   
-            
-            load = pd.read_csv(data_path)
-            header = list(load.columns)
-            header.remove('time')
+        try:
+            store_sources = self.input_store.get_sources()
+        except (ValueError, OSError) as e:
+            print(f"Error: input data of '{self.name}' can't be read: {e}")
+            return 0
 
+        for header, times, values in store_sources:
             tot_header = tot_header + header
-            input_data_dfs.append(load)
-        
-        merged_df = self.create_data_df(input_data_dfs)
+            sources.append((times, values))
 
         if master:
             tot_header = self.create_header_master(tot_header)
         
-        # if no input_object, return [[], None]
-        return [tot_header, merged_df]
+        # if no input_object, return [[], []]
+        return [tot_header, sources]
+
+    def stream_input_object(self, master = False, fill = "hold", chunk_rows = DEFAULT_CHUNK_ROWS):
+        """
+        Same as csv_to_input_object, but the data files are read chunk by chunk while running.
+        Returns [header, readers] with one ChunkedSourceReader per data file, 0 if a data file can't be read.
+        """
+        tot_header = []
+        readers = []
+
+        try:
+            streams = self.input_store.get_streams(fill, chunk_rows)
+        except (ValueError, OSError) as e:
+            print(f"Error: input data of '{self.name}' can't be read: {e}")
+            return 0
+
+        for header, reader in streams:
+            tot_header = tot_header + header
+            readers.append(reader)
+
+        if master:
+            tot_header = self.create_header_master(tot_header)
+
+        return [tot_header, readers]
 
 
 """
@@ -271,7 +532,35 @@ class FMUWorkspace:
 
     fmu_objects = {}                        # {"fmu_name" : FMUObject}
 
-    connections = []                        # [(fmu_output_object, "out_name", fmu_input_object, "input_name"), ...]
+    connections = None                      # ConnectionGraph of ("output_fmu_name", "out_name", "input_fmu_name", "input_name") links
+
+    lazy = False                            # when True, FMUs are built from modelDescription.xml and only loaded for runs
+
+    interactive = True                      # when False, nothing is asked with input() and overlaps are overridden
+
+    result_format = "csv"                   # default result format of runs, "csv" or "binary" (see runSim.RESULT_FORMATS)
+
+    recording_outputs = {}                  # {"fmu_name" : ["var_name", "var*"...]}, FMUs not in here record every variable
+
+    record_every_steps = 1                  # record every N-th communication step
+
+    record_every_seconds = None             # record at most once every T seconds (binary result formats only)
+
+    input_fill = "hold"                     # how input data is filled between time points, "hold" or "linear"
+
+    stream_inputs = False                   # when True, data files are read chunk by chunk while running instead of kept in memory
+
+    master_type = "pyfmi"                   # co-simulation master of the next runs, "pyfmi" or "python" (see runSim/py_master.py)
+
+    checkpoint_every = 0                    # seconds of simulation time between checkpoints of python master runs, 0 for none
+
+    last_run_dir = None                     # run directory of the last run, where 'resume' looks for a checkpoint
+
+    warmup_time = 0                         # seconds python master runs step before recording starts
+
+    snapshot_cache = False                  # when True, python master runs cache their state after initialization and warm-up
+
+    snapshot_cache_bytes = DEFAULT_SNAPSHOT_CACHE_BYTES     # disk space of all cached snapshots, least recently used go first
 
     # master_input_object = (None, None)    # input_object is formated as such:
     #                                       # (header, total_data)
@@ -287,7 +576,14 @@ class FMUWorkspace:
     # tolerance
     # step_size
 
-    def __init__(self, fmu_paths = [], save_dir = ""):
+    def __init__(self, fmu_paths = [], save_dir = "", lazy = False, interactive = True):
+        self.lazy = lazy
+        self.interactive = interactive
+        self.fmu_objects = {}
+        self.connections = ConnectionGraph()
+        self.results = {}
+        self.recording_outputs = {}
+        self.result_reader = ResultReader()
         if save_dir != "":
             self.save_dir = save_dir
             self.RESULT_LOG_dir = save_dir + "\\Result_and_Logs"
@@ -295,18 +591,17 @@ class FMUWorkspace:
         self.make_new_run_dir()
         
         if len(fmu_paths):
-            for fmu_path in fmu_paths:
-                ret = self.add_fmu(fmu_path)
-                if not ret:
+            for fmu_name, fmu_path, ret in self.add_fmus(fmu_paths):
+                if ret != 1:
                     print(f"{fmu_path} skipped.")
             
     """
     Overall helper methods
     """
-    # TODO: change connection to just be the name, the real connection will be made later inside of run_sim
+    # connections hold FMU names, the pyFMI models are only looked up inside of run_sim
     def get_inverted_dict(self):
         # invert dictionary {fmu_object: fmu_name}
-        return {v.loaded_fmu: k for k, v in self.fmu_objects.items()}
+        return {v: k for k, v in self.fmu_objects.items()}
 
     def get_loaded_fmu(self, fmu_name = None):
         if fmu_name is not None:
@@ -335,6 +630,41 @@ class FMUWorkspace:
         if fmu_name in self.fmu_objects:
             return self.fmu_objects[fmu_name].suppressed_inputs
     
+    def instantiate_fmus(self):
+        for fmu_obj in self.fmu_objects.values():
+            fmu_obj.instantiate()
+
+    def release_fmus(self):
+        for fmu_obj in self.fmu_objects.values():
+            fmu_obj.release()
+
+    def prepare_fmus(self):
+        """
+        Gets every FMU ready for the next run (see FMUObject.prepare_run): FMUs that already ran are reset in place,
+        only the ones that can't be reset are loaded again. The FMUObjects stay the same, so the connections
+        (kept between FMU names) need no change.
+        Returns {"fmu_name" : what was done}, or None if an FMU can't be loaded.
+        """
+        actions = {}
+        for fmu_name, fmu_obj in self.fmu_objects.items():
+            try:
+                actions[fmu_name] = fmu_obj.prepare_run()
+            except exceptions.FMUException as e:
+                print(f"Error: FMU '{fmu_name}' could not be loaded: {e}")
+                return None
+
+        reset = [fmu_name for fmu_name, action in actions.items() if action == "reset"]
+        reloaded = [fmu_name for fmu_name, action in actions.items() if action == "reloaded"]
+        if reset:
+            print(f"FMUs reset for this run: {reset}")
+        if reloaded:
+            print(f"FMUs loaded again for this run: {reloaded}")
+        return actions
+
+    def finish_fmus(self):
+        for fmu_obj in self.fmu_objects.values():
+            fmu_obj.finish_run()
+
     def make_new_run_dir(self):
         os.chdir(self.save_dir)
         while ("Result_and_Logs" not in os.getcwd()):
@@ -357,24 +687,9 @@ class FMUWorkspace:
         # checking if we want to restart .simulate (aka re-initialize) the FMUs
         self.make_new_run_dir()
 
-        for fmu_name in self.fmu_objects:
-            old_fmu = self.get_loaded_fmu(fmu_name)
-            self.fmu_objects[fmu_name].load_fmu()
-            new_fmu = self.get_loaded_fmu(fmu_name)
-
-            for old_tuple in self.connections:                                      # resetting tuple in self.connections with reloaded EP model
-                index = self.connections.index(old_tuple)
-                output_fmu = old_tuple[0]
-                input_fmu = old_tuple[2]
-
-                new_tuple = old_tuple
-                if output_fmu == old_fmu and input_fmu == old_fmu:
-                    new_tuple = (new_fmu, old_tuple[1], new_fmu, old_tuple[3])
-                elif output_fmu == old_fmu:
-                    new_tuple = (new_fmu, old_tuple[1], old_tuple[2], old_tuple[3])
-                elif input_fmu == old_fmu:
-                    new_tuple = (old_tuple[0], old_tuple[1], new_fmu, old_tuple[3])
-                self.connections[index] = new_tuple
+        # connections hold FMU names, so they stay valid when the pyFMI models are reloaded
+        for fmu_obj in self.fmu_objects.values():
+            fmu_obj.load_fmu()
 
     def run_checks(self):
         """
@@ -407,16 +722,40 @@ class FMUWorkspace:
 
         return True
 
-    def run_sim(self, initialize = True):
+    def run_sim(self, initialize = True, result_dir = None, **run_options):
         """
         Function to run FMUs in simulation mode.
+        result_dir defaults to the workspace's run directory (RESULT_LOG_dir).
+        run_options are passed on to runSim.main (start_time, final_time, interactive, step_size...).
         """
         print("")
         print("Running FMUs in simulation mode...")
         print("")
 
+        new_run_dir = result_dir is None
+        if new_run_dir and self.last_run_dir == self.RESULT_LOG_dir:
+            self.make_new_run_dir()                                                                         # results of the last run (and EnergyPlus output) are kept
+
+        actions = self.prepare_fmus()                                                                       # lazy FMUs are only loaded now, FMUs that ran are reset
+        if actions is None:
+            return -1
+        run_options.setdefault("result_format", self.result_format)
+        run_options.setdefault("record_every_steps", self.record_every_steps)
+        run_options.setdefault("record_every_seconds", self.record_every_seconds)
+        run_options.setdefault("input_fill", self.input_fill)
+        run_options.setdefault("input_streaming", self.stream_inputs)
+        run_options.setdefault("master_type", self.master_type)
+        run_options.setdefault("checkpoint_every", self.checkpoint_every)
+        run_options.setdefault("warmup_time", self.warmup_time)
+        run_options.setdefault("snapshot_cache", self.snapshot_cache)
+        run_options.setdefault("snapshot_cache_bytes", self.snapshot_cache_bytes)
+        if self.recording_outputs:
+            run_options.setdefault("outputs", self.recording_outputs)
+
+        result_dir = self.RESULT_LOG_dir if new_run_dir else result_dir
+        self.last_run_dir = result_dir
         if initialize: # xael
-            res = run_sim(self.RESULT_LOG_dir, self.fmu_objects.values(), self.connections)                  # run_sim will either return pyFMI result object, or Exception object raised
+            res = run_sim(result_dir, self.fmu_objects, self.connections, **run_options)   # run_sim will either return pyFMI result object, or Exception object raised
         # else:
         #     res = run_sim(self.RESULT_LOG_dir, self.fmu_objects, self.connections, inputs, start_time=self.final_time, initialize=False)  # run_sim will either return pyFMI result object, or Exception object raised
         print("")
@@ -424,13 +763,22 @@ class FMUWorkspace:
         if "Failed to setup the experiment" in str(res):
             print("This is a result of already running once and not reloading into new working directory... reloading models...")
             print("")
+            # a reset that didn't bring the FMU back to a clean state, load it again from now on
+            for fmu_name, action in actions.items():
+                if action == "reset":
+                    self.fmu_objects[fmu_name].can_reset = False
             self.reload()
-            res = run_sim(self.RESULT_LOG_dir, self.fmu_objects.values(), self.connections) # run sim again with reloaded models
+            if new_run_dir:
+                result_dir = self.last_run_dir = self.RESULT_LOG_dir
+            res = run_sim(result_dir, self.fmu_objects, self.connections, **run_options) # run sim again with reloaded models
+
+        self.finish_fmus()
 
         print("Run finished...")
         print("")
             
-        if res is Exception or res is exceptions.FMUException:
+        # successful runs return {"fmu_name" : "result_file"}, failed runs return None, -1 or the raised exception
+        if not isinstance(res, dict):
             print(f"Run ended with a raised exception: {res}")
             print("Check above to see if error spawned from where.")
             print("To see more information about what this error may mean, use command 'doc'")
@@ -445,6 +793,38 @@ class FMUWorkspace:
             print("Rename the result with 'name-res <old_name> <new_name>'")
             return 1
     
+    def find_checkpoint(self, target = None):
+        """
+        Returns the checkpoint directory of target: a run directory or a checkpoint directory.
+        Without target, the checkpoint of the last run. Returns None if there is no checkpoint.
+        Failed runs aren't saved as results (and successful ones remove their checkpoint), so results can't be a target.
+        """
+        run_dir = self.last_run_dir if target is None else target
+        if run_dir is None:
+            return None
+        for checkpoint_dir in [run_dir, get_checkpoint_dir(run_dir)]:
+            if os.path.exists(os.path.join(checkpoint_dir, CHECKPOINT_FILE)):
+                return checkpoint_dir
+        return None
+
+    def resume_sim(self, target = None, **run_options):
+        """
+        Function to continue a failed run of the python master from its last checkpoint (see find_checkpoint for target).
+        The results are written on into the run's own result files.
+        """
+        checkpoint_dir = self.find_checkpoint(target)
+        if checkpoint_dir is None:
+            print(f"No checkpoint found for '{target if target is not None else 'the last run'}'. Runs only write checkpoints with 'checkpoint-every <T>' and the python master.")
+            return 0
+        try:
+            read_checkpoint_info(checkpoint_dir)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            return 0
+        run_dir = os.path.dirname(os.path.normpath(checkpoint_dir))
+        run_options["master_type"] = "python"                                                             # only the python master writes checkpoints
+        return self.run_sim(result_dir=run_dir, resume_from=checkpoint_dir, **run_options)
+
     def run_lab(self):
         print("Connecting FMUs to LabView...")
         print("Not implemented yet.")
@@ -454,22 +834,29 @@ class FMUWorkspace:
     """
     Function related to altering/viewing results
     """
-    def get_result(self, name_or_index):
-        res = None
-
+    def get_result_name(self, name_or_index):
         if name_or_index is None:
             print("You must input either result name or index.")
-        else:
-            try: 
-                index = int(name_or_index)
-                list_ver = list(self.results.items())
-                if index > len(list_ver) or index < 0:
-                    res = list_ver[index]
-            except ValueError:
-                if name_or_index in self.results:
-                    res = self.results[name_or_index]
-        
-        return res
+            return None
+
+        if name_or_index in self.results:
+            return name_or_index
+
+        try: 
+            index = int(name_or_index)
+            names = list(self.results.keys())
+            if 0 <= index < len(names):
+                return names[index]
+        except ValueError:
+            pass
+
+        return None
+
+    def get_result(self, name_or_index):
+        result_name = self.get_result_name(name_or_index)
+        if result_name is None:
+            return None
+        return self.results[result_name]
 
     def rename_result(self, old_name, new_name):
         if old_name not in self.results:
@@ -482,11 +869,13 @@ class FMUWorkspace:
             print(f"Result name '{old_new_name}' already exists in result list. Changing new name to '{new_name}'")
         
         self.results[new_name] = self.results.pop(old_name)
+        self.result_reader.rename_result(old_name, new_name)
         return 1
     
     def show_results(self, name_or_index, model_name = None, variables = None):
         # variables are formatted as ["variable_name", "variable_name2"...]
         # res is formatted as: {"model_name" : "result_file.csv", "model_name2" : "result_file2.csv"}
+        result_name = self.get_result_name(name_or_index)
         res = self.get_result(name_or_index)
         if res is None:
             print(f"'{name_or_index}' does not exist in results.")
@@ -504,14 +893,17 @@ class FMUWorkspace:
         if model_name is not None and variables is not None:
             print(f"{model_name}")
             print("")
+            if model_name not in res:
+                print(f"{model_name} doesn't exist, please input an FMU that was inside this result")
+                return -1
             try:
-                df = pd.read_csv(res[model_name], usecols=variables)
+                df = pd.DataFrame(self.result_reader.read_columns(result_name, model_name, res[model_name], variables))
                 print("Variables:")
                 print(f"{df}")
                 print("")
-            except FileNotFoundError as e:
+            except (FileNotFoundError, OSError, ValueError) as e:
                 print(e)
-                print(f"{model_name} doesn't exist, please input an FMU that was inside this result")
+                print(f"Result file of '{model_name}' can't be read, it may have been moved.")
                 return -1
             except KeyError as e:
                 print(e)
@@ -521,13 +913,20 @@ class FMUWorkspace:
             for model_name in res:
                 print(f"{model_name}: ")
                 pd.options.display.max_rows = 20  #xael option to change this later
-                df = pd.read_csv(res[model_name])
+                # the whole table is read straight from the file, caching every column would only push out the others
+                try:
+                    df = read_result_table(res[model_name])
+                except (FileNotFoundError, OSError, ValueError) as e:
+                    print(e)
+                    print(f"Result file of '{model_name}' can't be read, it may have been moved.")
+                    continue
                 print(df)
                 input("Press any button to continue to next model... ")
         return 1
     
     def graph_results(self, name_or_index, x_axis_fmu, x_axis_var, y_axis_fmu_names, y_axis_vars, together = False):
         # res is formatted as: {"model_name" : "file_name.csv", "model_name2" : "file_name2.csv"}
+        result_name = self.get_result_name(name_or_index)
         res = self.get_result(name_or_index)
         if res is None:
             print(f"'{name_or_index}' does not exist in results.")
@@ -541,10 +940,20 @@ class FMUWorkspace:
             print(error_str)
             return None
         
+        # read every variable of the same FMU in one pass, the lookups below are then served from the cache
+        requested = {x_axis_fmu: [x_axis_var]}
+        for fmu_name, var in zip(y_axis_fmu_names, y_axis_vars):
+            requested.setdefault(fmu_name, []).append(var)
+        for fmu_name, variables in requested.items():
+            if fmu_name in res:
+                try:
+                    self.result_reader.read_columns(result_name, fmu_name, res[fmu_name], [var for var in variables if var in self.result_reader.get_header(res[fmu_name])])
+                except (FileNotFoundError, OSError, KeyError, ValueError):
+                    pass                                                # reported below for the variable that needs it
+
         if x_axis_fmu in res:
             try:
-                df_x = pd.read_csv(res[x_axis_fmu], usecols=[x_axis_var])
-                x_axis = df_x[x_axis_var].to_list()
+                x_axis = self.result_reader.read_columns(result_name, x_axis_fmu, res[x_axis_fmu], [x_axis_var])[x_axis_var]
             except FileNotFoundError as e:
                 print(e)
                 print(f"Result file cannot be found. Either'{x_axis_fmu}' FMU isn't inside this result, or result file got moved.")
@@ -562,8 +971,7 @@ class FMUWorkspace:
         for fmu_name, var in zipped_y_mod_var:
             if fmu_name in res:
                 try:
-                    df_y = pd.read_csv(res[fmu_name], usecols=[var])
-                    y_axis.append(df_y[var].to_list())
+                    y_axis.append(self.result_reader.read_columns(result_name, fmu_name, res[fmu_name], [var])[var])
                 except FileNotFoundError as e:
                     print(e)
                     print(f"Result file cannot be found. Either'{fmu_name}' FMU isn't inside this result, or result file got moved.")
@@ -644,11 +1052,164 @@ class FMUWorkspace:
                 print(f"Warning: {old_new_name} already exists, changing name to {new_name}")
             self.fmu_objects[old_name].change_name(new_name)
             self.fmu_objects[new_name] = self.fmu_objects.pop(old_name)
+            self.connections.rename_fmu(old_name, new_name)
             return 1
         else:
             print(f"Error: {old_name} does not exist")
             return 0
         
+    def set_result_format(self, result_format):
+        """
+        Function to change the result format of the next runs.
+        """
+        if result_format not in RESULT_FORMATS:
+            print(f"Error: result format '{result_format}' doesn't exist, options are: {RESULT_FORMATS}")
+            return 0
+        self.result_format = result_format
+        return 1
+
+    def isolate_fmu(self, fmu_name, isolated = True):
+        """
+        Function to run an FMU in its own worker process (or back in this process), so a crash of the FMU
+        doesn't end the session. Isolated FMUs need the python master.
+        """
+        if fmu_name not in self.fmu_objects:
+            print(f"FMU with name {fmu_name} does not exist.")
+            return 0
+        try:
+            self.fmu_objects[fmu_name].set_isolated(isolated)
+        except exceptions.FMUException as e:
+            print(f"Error: FMU '{fmu_name}' could not be loaded: {e}")
+            return 0
+        if isolated and self.master_type != "python":
+            print("Isolated FMUs can only run with the python master, switching to it.")
+            self.master_type = "python"
+        return 1
+
+    def restart_fmu(self, fmu_name):
+        """
+        Function to load an FMU again, e.g. after its worker process crashed.
+        """
+        if fmu_name not in self.fmu_objects:
+            print(f"FMU with name {fmu_name} does not exist.")
+            return 0
+        try:
+            self.fmu_objects[fmu_name].restart()
+        except exceptions.FMUException as e:
+            print(f"Error: FMU '{fmu_name}' could not be restarted: {e}")
+            return 0
+        return 1
+
+    def close_workers(self):
+        for fmu_obj in self.fmu_objects.values():
+            fmu_obj.close_worker()
+
+    def set_checkpoint_every(self, seconds):
+        """
+        Function to checkpoint the next python master runs every seconds of simulation time (0 turns checkpoints off).
+        """
+        if seconds < 0:
+            print("Error: the checkpoint interval can't be negative.")
+            return 0
+        self.checkpoint_every = seconds
+        return 1
+
+    def set_warmup_time(self, seconds):
+        """
+        Function to step python master runs for seconds of simulation time before recording starts.
+        """
+        if seconds < 0:
+            print("Error: the warm-up time can't be negative.")
+            return 0
+        self.warmup_time = seconds
+        return 1
+
+    def set_snapshot_cache(self, enabled, max_mb = None):
+        """
+        Function to cache (and reuse) the state of python master runs after initialization and warm-up,
+        max_mb bounds the disk space of every cached snapshot together.
+        """
+        if max_mb is not None:
+            if max_mb <= 0:
+                print("Error: the snapshot cache size must be positive.")
+                return 0
+            self.snapshot_cache_bytes = int(max_mb * 1024 * 1024)
+        self.snapshot_cache = enabled
+        return 1
+
+    def set_master_type(self, master_type):
+        """
+        Function to change the co-simulation master of the next runs.
+        """
+        if master_type not in MASTER_TYPES:
+            print(f"Error: master '{master_type}' doesn't exist, options are: {MASTER_TYPES}")
+            return 0
+        isolated = [fmu_name for fmu_name, fmu_obj in self.fmu_objects.items() if fmu_obj.isolated]
+        if master_type != "python" and isolated:
+            print(f"Error: isolated FMUs {isolated} can only run with the python master. Use 'isolate <fmu_name> off' first.")
+            return 0
+        self.master_type = master_type
+        return 1
+
+    def set_input_fill(self, input_fill):
+        """
+        Function to change how input data is filled between its time points in the next runs.
+        """
+        if input_fill not in FILL_METHODS:
+            print(f"Error: input fill '{input_fill}' doesn't exist, options are: {FILL_METHODS}")
+            return 0
+        self.input_fill = input_fill
+        return 1
+
+    def set_input_streaming(self, stream):
+        """
+        Function to stream data files chunk by chunk in the next runs, for data too large to keep in memory.
+        Only data files added from now on skip being parsed when they are added.
+        """
+        self.stream_inputs = stream
+        return 1
+
+    def set_recording(self, fmu_name, patterns = None):
+        """
+        Function to only record some variables (names or glob patterns) of an FMU. No patterns records every variable.
+        """
+        if fmu_name not in self.fmu_objects:
+            print(f"Error: '{fmu_name}' do not exist.")
+            return 0
+
+        if not patterns:
+            self.recording_outputs.pop(fmu_name, None)
+            print(f"Recording every variable of '{fmu_name}'.")
+        else:
+            self.recording_outputs[fmu_name] = list(patterns)
+            print(f"Recording only {patterns} of '{fmu_name}'.")
+        return 1
+
+    def set_record_interval(self, every_steps = None, every_seconds = None):
+        """
+        Function to record every N-th step and/or at most once every T seconds. An interval left None isn't changed,
+        see clear_record_interval to remove one.
+        """
+        if (every_steps is not None and every_steps < 1) or (every_seconds is not None and every_seconds <= 0):
+            print("Error: the recording interval must be positive.")
+            return 0
+
+        if every_steps is not None:
+            self.record_every_steps = every_steps
+        if every_seconds is not None:
+            self.record_every_seconds = every_seconds
+        return 1
+
+    def clear_record_interval(self, steps = True, seconds = True):
+        """
+        Function to record every step again (steps) and/or drop the time interval (seconds).
+        """
+        if steps:
+            self.record_every_steps = 1
+        if seconds:
+            self.record_every_seconds = None
+        return 1
+
     def change_dir(self, new_dir):
         """
         Function to change the save directory
@@ -663,16 +1224,16 @@ class FMUWorkspace:
             self.save_dir = new_dir
             return 1
 
-    def add_fmu(self, fmu_path, fmu_name = None):
+    def check_fmu_path(self, fmu_path, fmu_name = None):
         """
-        Function to add an FMU to the fmuFiles dictionary.
+        Checks that fmu_path can be added, returns (fmu_name, fmu_path) or None if it can't.
         """
         if fmu_name is None:
             fmu_name = os.path.splitext(os.path.basename(fmu_path))[0]  # Get the base name of the FMU file
         
         if not os.path.isfile(fmu_path): 
             print(f"Error: The file {fmu_path} does not exist.")
-            return 0
+            return None
         
         base_type = os.path.splitext(fmu_path)[1]  # Get the file extension
     
@@ -680,31 +1241,87 @@ class FMUWorkspace:
             fmu_path = self.export_fmu(fmu_path)
             if (fmu_path is None):
                 print(f"Error: The file {fmu_path} could not be exported as an FMU. Skipping file")
-                return 0
-        
-        if fmu_name in self.fmu_objects:
-            new_name = add_index_to_name(fmu_name, self.fmu_objects.keys())
+                return None
+
+        return fmu_name, fmu_path
+
+    def register_fmu(self, fmu_obj):
+        """
+        Adds an already loaded FMUObject to the fmuFiles dictionary, renaming it if the name is taken.
+        """
+        if fmu_obj.name in self.fmu_objects:
+            new_name = add_index_to_name(fmu_obj.name, self.fmu_objects.keys())
             print(f"Warning: you're inputting a repeat file. Setting as new name: '{new_name}'")
+            fmu_obj.change_name(new_name)
+
+        self.fmu_objects[fmu_obj.name] = fmu_obj
+        print(f"Adding FMU to the list of FMUs: '{fmu_obj.name}'")
+        return 1
+
+    def add_fmu(self, fmu_path, fmu_name = None):
+        """
+        Function to add an FMU to the fmuFiles dictionary.
+        """
+        checked = self.check_fmu_path(fmu_path, fmu_name)
+        if checked is None:
+            return 0
+        fmu_name, fmu_path = checked
         
         try:
-            self.fmu_objects[fmu_name] = FMUObject(fmu_name, fmu_path)
-            print(f"Adding FMU to the list of FMUs: '{fmu_name}'")
-            return 1
-        except exceptions:
+            fmu_obj = FMUObject(fmu_name, fmu_path, lazy=self.lazy)
+        except (exceptions.FMUException, ValueError, OSError) as e:
+            print(e)
             print(f"Error: Could not load FMU from {fmu_path}.")
             return -1
 
+        return self.register_fmu(fmu_obj)
+
+    def add_fmus(self, fmu_paths, max_workers = None):
+        """
+        Function to add several FMUs at once. The FMUs are extracted, validated and loaded
+        on a thread pool, then added to the fmuFiles dictionary in name order.
+        Returns [(fmu_name, fmu_path, ret), ...] in name order, ret is the same as add_fmu's.
+        """
+        rets = []
+        to_load = []                            # [(fmu_name, fmu_path), ...]
+
+        for fmu_path in fmu_paths:
+            checked = self.check_fmu_path(fmu_path)
+            if checked is None:
+                rets.append((os.path.splitext(os.path.basename(fmu_path))[0], fmu_path, 0))
+            else:
+                to_load.append(checked)
+
+        to_load.sort()
+
+        # hashing, unzipping and loading the shared libraries are mostly spent outside of the GIL
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(FMUObject, fmu_name, fmu_path, self.lazy) for fmu_name, fmu_path in to_load]
+
+        for (fmu_name, fmu_path), future in zip(to_load, futures):
+            try:
+                fmu_obj = future.result()
+            except (exceptions.FMUException, ValueError, OSError) as e:
+                print(e)
+                print(f"Error: Could not load FMU from {fmu_path}.")
+                rets.append((fmu_name, fmu_path, -1))
+                continue
+
+            rets.append((fmu_obj.name, fmu_path, self.register_fmu(fmu_obj)))
+
+        rets.sort(key=lambda ret: ret[0])
+        return rets
+
         
     def delete_fmu(self, fmu_name):
         """
         Function to delete an FMU from the fmuFiles dictionary and clears links to it.
         """
         if fmu_name in self.fmu_objects:
-            ret = self.unlink_input_output(fmu_name)
-            if not ret:
-                return 0
+            self.remove_links(self.connections.remove_fmu(fmu_name))
             print(f"Connections related to FMU {fmu_name} have been removed.")
 
+            self.fmu_objects[fmu_name].close_worker()
             del self.fmu_objects[fmu_name]
             print(f"FMU {fmu_name} deleted.")
             return 1
@@ -717,6 +1334,7 @@ class FMUWorkspace:
         Resets the simulation, deletes all FMUs.
         """
         self.make_new_run_dir()
+        self.close_workers()
         # for fmu_obj in self.fmu_objects.values():     keeping because smth smth master is malloc'd xael
         #     del fmu_obj
         self.fmu_objects.clear()  # Reset the fmuFiles dictionary
@@ -731,13 +1349,19 @@ class FMUWorkspace:
         overlap_remove = []
         for input_name in input_names:
             type, overlap = self.fmu_objects[fmu_name].check_overlap(input_name)
-            if overlap:
+            if overlap and not self.interactive:
+                # non-interactive workspaces (scenario files) always override the previous input
+                print(f"Warning: overriding previous {type} for input '{input_name}' of '{fmu_name}'.")
+                if type == "data":
+                    self.remove_data(fmu_name, input_name)
+            elif overlap:
                 if type == "connection":
                     confirmation = input(f"Warning: Previous link/connection already has '{input_name}'. Override previous connection/link? [Y/y] ")
                     if confirmation.lower() == 'y':
                         print("Confirmed, overriding previous connection...")
                     else:
                         print(f"Canceling connection for input: {input_name}...")
+                        overlap_remove.append(input_name)
                 elif type == "data":
                     confirmation = input(f"Warning: Previous data file has '{input_name}' as a column. Override previous input file inputs? [Y/y] ")
                     if confirmation.lower() == 'y':
@@ -760,26 +1384,29 @@ class FMUWorkspace:
             return 0
 
         if isinstance(data_path, str):
-            df = pd.read_csv(data_path)
-            header = list(df.columns)
-            if 'time' in header:
-                header.remove('time')
-                overlap_remove = self.check_overlap(fmu_name, header)  # check if any of the inputs overlap with previous connections/data files
+            try:
+                source = self.fmu_objects[fmu_name].load_data(data_path, stream=self.stream_inputs)   # the only time this file is parsed
+            except (ValueError, OSError) as e:
+                print(f"Error: {e}")
+                return 0
 
-                for input_name in overlap_remove:
-                    header.remove(input_name)
+            header = list(source.columns)
+            overlap_remove = self.check_overlap(fmu_name, header)  # check if any of the inputs overlap with previous connections/data files
 
-                self.fmu_objects[fmu_name].add_data(data_path, df, header)
-                print(f"Added data file '{data_path}' to FMU '{fmu_name}'.")
-            else:
-                print("'time' is a necessary column inside of your csv file. Please input it as a column.")
+            for input_name in overlap_remove:
+                header.remove(input_name)
+
+            self.fmu_objects[fmu_name].add_data(source, header)
+            print(f"Added data file '{data_path}' to FMU '{fmu_name}'.")
+            return 1
+        return 0
 
                 
     def remove_data(self, fmu_name, input_name):
         if fmu_name not in self.fmu_objects:
             return 0
 
-        if input_name in self.fmu_objects[fmu_name].get_input_names():
+        if self.fmu_objects[fmu_name].has_input(input_name):
             self.fmu_objects[fmu_name].remove_data(input_name)
             return 1
 
@@ -798,15 +1425,11 @@ class FMUWorkspace:
             print(f"Error: One or both FMUs '{fmu_name_1}' and '{fmu_name_2}' do not exist.")
             return 0
 
-        fmu1 = self.get_loaded_fmu(fmu_name_1)
-        fmu2 = self.get_loaded_fmu(fmu_name_2)
+        fmu1_obj = self.fmu_objects[fmu_name_1]
+        fmu2_obj = self.fmu_objects[fmu_name_2]
 
-        fmu1_outputs = get_output_names(fmu1)
-        fmu2_inputs = get_input_names(fmu2)
-
-        if fmu1_outputs is None or fmu2_inputs is None:
-            print("No inputs could be found or this fmu. FMU name may be incorrect.")
-            return 0
+        fmu1_outputs = fmu1_obj.get_output_names()
+        fmu2_inputs = fmu2_obj.get_input_names()
 
         # Getting output_name from index
         if isinstance(output_name, int):
@@ -831,12 +1454,12 @@ class FMUWorkspace:
                 print(f"Error: {input_name} is out of bounds. Please input a index that exists")
                 return 0
             
-        if output_name not in fmu1_outputs or input_name not in fmu2_inputs:
-            if output_name not in fmu1_outputs:
+        if not fmu1_obj.has_output(output_name) or not fmu2_obj.has_input(input_name):
+            if not fmu1_obj.has_output(output_name):
                 print(f"Error: Output '{output_name}' does not exist in {fmu_name_1}")
                 print(f"Available outputs for {fmu_name_1}")
                 self.list_outputs(fmu_name_1)
-            if input_name not in fmu2_inputs:
+            if not fmu2_obj.has_input(input_name):
                 print(f"Error: Input '{input_name}' does not exist in {fmu_name_2}.")
                 print(f"Available inputs for {fmu_name_2}:")
                 self.list_inputs(fmu_name_2)
@@ -848,13 +1471,66 @@ class FMUWorkspace:
         if input_name in do_not_override:
             return 0 # if input_name is in do_not_override, then it means that the user chose not to override the previous connection/data file
         
-        # Link the input and output
-        self.connections.append((fmu1, output_name, fmu2, input_name))
+        # Link the input and output, a previous link to the same input is replaced
+        self.connections.add(fmu_name_1, output_name, fmu_name_2, input_name)
         self.fmu_objects[fmu_name_2].add_connection(input_name)
 
         print(f"Linked output '{output_name}' of FMU '{fmu_name_1}' to input '{input_name}' of FMU '{fmu_name_2}'.")
         return 1
 
+    def link_by_rules(self, rules):
+        """
+        Links every output/input pair matched by rules (see link_rules.py) as one transaction:
+        nothing is linked if a rule is invalid or two outputs match the same input,
+        inputs that already have a connection/data file are reported together and confirmed once.
+        """
+        links, unmatched, errors = match_links(rules, self.fmu_objects)
+        if errors:
+            for error in errors:
+                print(f"Error: {error}")
+            print("No links were made.")
+            return 0
+
+        if not links:
+            print("No outputs and inputs matched the rules.")
+            return 0
+
+        # links that already exist are left as they are
+        links = [link for link in links if self.connections.get_source(link[2], link[3]) != (link[0], link[1])]
+        if not links:
+            print("Every matched input is already linked.")
+            return 1
+
+        overlaps = {}                       # {("input_fmu_name", "input_name") : "connection"/"data"}
+        for out_fmu, out_name, in_fmu, in_name in links:
+            type, overlap = self.fmu_objects[in_fmu].check_overlap(in_name)
+            if overlap:
+                overlaps[(in_fmu, in_name)] = type
+
+        if overlaps:
+            print(f"{len(overlaps)} of the matched inputs already have a connection or data file:")
+            for (in_fmu, in_name), type in overlaps.items():
+                print(f"    ({in_fmu}) {in_name:<40} {type}")
+            if self.interactive:
+                confirmation = input(f"Override all {len(overlaps)}? Otherwise only the other inputs are linked. [Y/y] ")
+                if confirmation.lower() != 'y':
+                    print("Keeping the previous connections/data files...")
+                    links = [link for link in links if (link[2], link[3]) not in overlaps]
+                    overlaps = {}
+            else:
+                print("Warning: overriding the previous connections/data files of these inputs.")
+
+        for out_fmu, out_name, in_fmu, in_name in links:
+            if overlaps.get((in_fmu, in_name)) == "data":
+                self.remove_data(in_fmu, in_name)
+            self.connections.add(out_fmu, out_name, in_fmu, in_name)
+            self.fmu_objects[in_fmu].add_connection(in_name)
+
+        print(f"Linked {len(links)} inputs.")
+        if unmatched:
+            print(f"{unmatched} matching outputs had no input with the matching name.")
+        return 1
+
 
     # 6 ways to unlink:
     # 1. fmu_name                                       unlinks all connections to fmu_name
@@ -870,8 +1546,6 @@ class FMUWorkspace:
         if fmu_name_1 not in self.fmu_objects:
             print(f"Error: FMU '{fmu_name_1}' do not exist.")
             return 0
-        
-        fmu1 = self.get_loaded_fmu(fmu_name_1)
 
         if fmu_name_2 is None:
             if output_name is None and input_name is None:
@@ -882,36 +1556,35 @@ class FMUWorkspace:
                 else:
                     print("Stopping unlinking proceedure...")
                     return 0
-                
-            inverted_dict = self.get_inverted_dict()
-            
-            for tuple in self.connections:
-                if (tuple[0] == fmu1):
-                    if (tuple[1] == output_name or output_name == "All"):
-                        self.connections.remove(tuple)
-                if (tuple[2] == fmu1):
-                    if (tuple[3] == input_name or input_name == "All"):
-                        self.connections.remove(tuple)
-                fmu_name = inverted_dict.get(tuple[2])
-                self.fmu_objects[fmu_name].remove_connection(tuple[3])
+
+            removed = []
+            if output_name is not None:
+                removed += self.connections.remove_output(fmu_name_1, None if output_name == "All" else output_name)
+            if input_name is not None:
+                removed += self.connections.remove_input(fmu_name_1, None if input_name == "All" else input_name)
+            self.remove_links(removed)
         elif fmu_name_2 not in self.fmu_objects:
             print(f"Error: FMU '{fmu_name_2}' do not exist.")
             return 0
         else:
             # no check for input_name = None and output_name = None, because run.py will not send with fmu_name_2 without input/output names
-            fmu2 = self.get_loaded_fmu(fmu_name_2)
-
-            for tuple in self.connections:
-                if (tuple[0] == fmu1 and tuple[1] == output_name and tuple[2] == fmu2 and tuple[3] == input_name):
-                    self.connections.remove(tuple)
-
-            self.fmu_objects[fmu_name_2].remove_connection(input_name)
+            removed = self.connections.remove_link(fmu_name_1, output_name, fmu_name_2, input_name)
+            if removed is not None:
+                self.remove_links([removed])
 
             print("New connections: ")
             self.list_links()
 
         return 1
 
+    def remove_links(self, links):
+        """
+        Marks the inputs of already removed links as unconnected.
+        """
+        for out_fmu, out_name, in_fmu, in_name in links:
+            if in_fmu in self.fmu_objects:
+                self.fmu_objects[in_fmu].remove_connection(in_name)
+
 
     def check_inputs_warning(self):
         missing_connection = False
@@ -945,8 +1618,7 @@ class FMUWorkspace:
             print("Inputs will no longer show warnings if no input or link is given.")
             fmu_obj.suppress_all_warnings()
         else:
-            inputs = fmu_obj.get_input_names()
-            if input_name not in inputs:
+            if not fmu_obj.has_input(input_name):
                 print(f"{input_name} is not in fmu {fmu_name}")
                 return 0
             
@@ -993,44 +1665,71 @@ class FMUWorkspace:
                 print(f" - {name}")
 
 
-    def list_inputs(self, fmu_name):
+    def list_inputs(self, fmu_name, **search):
         """
-        Function to list (print) all inputs for an FMU.
+        Function to list (print) the inputs for an FMU, search filters them (see VariableCatalog.search).
         """
         if fmu_name not in self.fmu_objects:
             print(f"Error: '{fmu_name}' do not exist.")
             return 0
         
-        self.fmu_objects[fmu_name].list_inputs()
-        
-        return 1
+        return self.fmu_objects[fmu_name].list_inputs(**search)
 
 
-    def list_outputs(self, fmu_name):
+    def list_outputs(self, fmu_name, **search):
         """
-        Function to list all inputs for an FMU.
+        Function to list the outputs for an FMU, search filters them (see VariableCatalog.search).
         """
         if fmu_name not in self.fmu_objects:
             print(f"Error: '{fmu_name}' do not exist.")
             return 0
         
-        self.fmu_objects[fmu_name].list_outputs()
-        
-        return 1
+        return self.fmu_objects[fmu_name].list_outputs(**search)
+
+
+    def list_variables(self, fmu_name, **search):
+        """
+        Function to list every variable (any causality) of an FMU with its causality, variability and type.
+        """
+        if fmu_name not in self.fmu_objects:
+            print(f"Error: '{fmu_name}' do not exist.")
+            return 0
+
+        page_size = search.pop("page_size", LIST_PAGE_SIZE)
+        return self.fmu_objects[fmu_name].list_variables(search.pop("causality", None), None, page_size, search)
+
+
+    def search_variables(self, fmu_name, **search):
+        """
+        Returns {"total" : matches, "variables" : [{"name", "causality", "variability", "type"}, ...]}
+        for one page of fmu_name's variable catalog, or None if the FMU doesn't exist. Raises ValueError for an invalid regex.
+        """
+        if fmu_name not in self.fmu_objects:
+            return None
+
+        catalog = self.fmu_objects[fmu_name].metadata.get_catalog()
+        names, total = catalog.search(**search)
+        return {"total": total, "variables": [catalog.get_attributes(name) for name in names]}
 
 
     def list_links(self):
         """
         Function that prints all connection/links
         """
-        # invert dictionary {fmu_object: fmu_name}
-        inverted_dict = self.get_inverted_dict()
-
         print("Output:                                         Input:")
-        for tuple in self.connections:
-            input_file_name = inverted_dict.get(tuple[0])
-            output_file_name = inverted_dict.get(tuple[2])
-            print(f"({input_file_name}) {tuple[1]:<30}({output_file_name}) {tuple[3]}")
+        for output_fmu_name, output_name, input_fmu_name, input_name in self.connections:
+            print(f"({output_fmu_name}) {output_name:<30}({input_fmu_name}) {input_name}")
+
+
+    def list_order(self):
+        """
+        Function that prints the execution order, FMUs coupled both ways and algebraic loops of the current links.
+        """
+        coupling = analyze_coupling(self.fmu_objects, self.connections)
+        coupling.print_summary()
+        for level, fmu_names in enumerate(coupling.levels):
+            print(f" {level} - {fmu_names}")
+        return coupling
 
 
     def list_link_for_fmu(self, fmu_name):
@@ -1040,18 +1739,10 @@ class FMUWorkspace:
         if fmu_name not in self.fmu_objects:
             print(f"Error: '{fmu_name}' do not exist.")
             return 0
-        
-        fmu_obj = self.fmu_objects[fmu_name].loaded_fmu
-
-        # invert dictionary {fmu_object: fmu_name}
-        inverted_dict = {v.loaded_fmu: k for k, v in self.fmu_objects.items()}
 
         print("Output:                                         Input:")
-        for tuple in self.connections:
-            if tuple[0] == fmu_obj or tuple[2] == fmu_obj:
-                input_file_name = inverted_dict.get(tuple[0])
-                output_file_name = inverted_dict.get(tuple[2])
-                print(f"({input_file_name}) {tuple[1]:<30}({output_file_name}) {tuple[3]}")
+        for output_fmu_name, output_name, input_fmu_name, input_name in self.connections.get_links(fmu_name):
+            print(f"({output_fmu_name}) {output_name:<30}({input_fmu_name}) {input_name}")
         return
 
 
@@ -1080,8 +1771,7 @@ class FMUWorkspace:
                 print(f"Result file location for FMU '{model}': {self.results[res_name][model]}")
                 print(f"Output Variable Names in FMU '{model}':")
                 try:
-                    load = pd.read_csv(self.results[res_name][model])
-                    print(load.columns)
+                    print(self.result_reader.get_header(self.results[res_name][model]))
                 except FileNotFoundError as e:
                     print(e)
 
@@ -1113,21 +1803,6 @@ class FMUWorkspace:
 
     def format_export_connection(self):
         connection_jsons = []
-        # invert dictionary {fmu_object: fmu_name}
-        inverted_dict = self.get_inverted_dict()
-
-        for tuple in self.connections:
-            output_fmu = tuple[0]
-            output_name = tuple[1]
-            input_fmu = tuple[2]
-            input_name = tuple[3]
-
-            output_fmu_name = inverted_dict.get(output_fmu, None)
-            input_fmu_name = inverted_dict.get(input_fmu, None)
-
+        for output_fmu_name, output_name, input_fmu_name, input_name in self.connections:
             connection_jsons.append({"output_model" : output_fmu_name, "output_var_name" : output_name, "input_model":input_fmu_name, "input_var_name":input_name})
         return connection_jsons
-    
-            
-    
-    
\ No newline at end of file
@@ -0,0 +1,431 @@
+import re
+import bisect
+import zipfile
+import xml.etree.ElementTree as ET
+try:
+    import re._parser as sre_parse                                      # Python 3.11+
+except ImportError:
+    import sre_parse
+from fmu_cache import file_hash, load_cached_json, save_cached_json
+
+"""
+Metadata index for a single FMU, built from modelDescription.xml.
+The index is built once per FMU file and persisted keyed by the file's content hash,
+so introspection (inputs, outputs, value references, capabilities...) never has to
+query the loaded pyFMI model or re-parse the XML.
+"""
+# bump whenever the fields stored below change, old cache entries are then ignored
+METADATA_VERSION = 3
+
+# type elements of a ScalarVariable in FMI 2.0
+VARIABLE_TYPES = ["Real", "Integer", "Boolean", "String", "Enumeration"]
+
+# default used by FMIL (and therefore pyFMI) when DefaultExperiment has no stepSize
+DEFAULT_STEP_SIZE = 0.01
+
+# CoSimulation attributes that are read as flags (all default to False in FMI 2.0)
+CAPABILITY_FLAGS = [
+    "needsExecutionTool",
+    "canHandleVariableCommunicationStepSize",
+    "canInterpolateInputs",
+    "canRunAsynchronuously",
+    "canBeInstantiatedOnlyOncePerProcess",
+    "canNotUseMemoryManagementFunctions",
+    "canGetAndSetFMUstate",
+    "canSerializeFMUstate",
+    "providesDirectionalDerivative",
+]
+
+
+def parse_bool(value):
+    return value is not None and value.strip().lower() == "true"
+
+
+def parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_model_description(fmu_path):
+    """
+    Reads modelDescription.xml straight out of the FMU zip without extracting anything else.
+    """
+    try:
+        with zipfile.ZipFile(fmu_path) as zf:
+            return zf.read("modelDescription.xml")
+    except zipfile.BadZipFile:
+        raise ValueError(f"{fmu_path} is not a valid FMU (not a zip file).")
+    except KeyError:
+        raise ValueError(f"{fmu_path} is not a valid FMU (no modelDescription.xml).")
+
+
+def parse_model_description(xml_bytes):
+    """
+    Parses modelDescription.xml into the dictionary stored in the cache.
+    """
+    try:
+        root = ET.fromstring(xml_bytes)
+    except ET.ParseError as e:
+        raise ValueError(f"modelDescription.xml could not be parsed: {e}")
+
+    data = {
+        "version": METADATA_VERSION,
+        "fmi_version": root.get("fmiVersion", ""),
+        "model_name": root.get("modelName", ""),
+        "guid": root.get("guid", ""),
+        "generation_tool": root.get("generationTool", ""),
+        "model_identifier": "",
+        "capability_flags": {},
+        "default_experiment": {},
+        "inputs": [],
+        "outputs": [],
+        "value_references": {},
+        "variables": [],
+        "output_dependencies": {},
+    }
+
+    co_sim = root.find("CoSimulation")
+    if co_sim is not None:
+        data["model_identifier"] = co_sim.get("modelIdentifier", "")
+        for flag in CAPABILITY_FLAGS:
+            data["capability_flags"][flag] = parse_bool(co_sim.get(flag))
+        try:
+            data["capability_flags"]["maxOutputDerivativeOrder"] = int(co_sim.get("maxOutputDerivativeOrder", 0))
+        except ValueError:
+            data["capability_flags"]["maxOutputDerivativeOrder"] = 0
+
+    default_experiment = root.find("DefaultExperiment")
+    if default_experiment is not None:
+        for attribute, key in [("startTime", "start_time"), ("stopTime", "stop_time"), ("tolerance", "tolerance"), ("stepSize", "step_size")]:
+            value = parse_float(default_experiment.get(attribute))
+            if value is not None:
+                data["default_experiment"][key] = value
+
+    model_variables = root.find("ModelVariables")
+    if model_variables is not None:
+        # variables are kept in modelDescription order, same as pyFMI's get_model_variables
+        for variable in model_variables.iter("ScalarVariable"):
+            name = variable.get("name")
+            causality = variable.get("causality", "local")
+            try:
+                data["value_references"][name] = int(variable.get("valueReference"))
+            except (TypeError, ValueError):
+                raise ValueError(f"Variable '{name}' has no valid valueReference.")
+
+            var_type = next((child.tag for child in variable if child.tag in VARIABLE_TYPES), "")
+            data["variables"].append([name, causality, variable.get("variability", "continuous"), var_type])
+
+            if causality == "input":
+                data["inputs"].append(name)
+            elif causality == "output":
+                data["outputs"].append(name)
+
+    data["output_dependencies"] = parse_output_dependencies(root, [variable[0] for variable in data["variables"]], data["inputs"])
+    return data
+
+
+def parse_output_dependencies(root, variable_names, inputs):
+    """
+    Returns {"output_name" : ["input_name", ...]}, the inputs every output directly depends on (direct feedthrough),
+    from ModelStructure/Outputs. Outputs without a dependencies attribute (or without ModelStructure) may depend
+    on every input, following FMI 2.0.
+    """
+    input_set = set(inputs)
+    dependencies = {}
+    outputs = root.find("ModelStructure/Outputs")
+    for unknown in (outputs if outputs is not None else []):
+        try:
+            name = variable_names[int(unknown.get("index")) - 1]          # indexes start at 1
+        except (TypeError, ValueError, IndexError):
+            continue
+        if unknown.get("dependencies") is None:
+            continue
+        depends_on = []
+        for index in unknown.get("dependencies").split():
+            try:
+                variable = variable_names[int(index) - 1]
+            except (ValueError, IndexError):
+                continue
+            if variable in input_set:
+                depends_on.append(variable)
+        dependencies[name] = depends_on
+    return dependencies
+
+
+def glob_to_regex(pattern):
+    """
+    Compiles a glob pattern ("zone*_T?", "[!a]*") into a regex where every * and ? is a capture group.
+    Returns (compiled regex, literal prefix before the first wildcard).
+    """
+    parts = []
+    prefix = None
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char in "*?[" and prefix is None:
+            prefix = pattern[:i]
+        if char == "*":
+            parts.append("(.*)")
+        elif char == "?":
+            parts.append("(.)")
+        elif char == "[" and pattern.find("]", i + 2) != -1:
+            end = pattern.find("]", i + 2)
+            seq = pattern[i + 1:end]
+            if seq.startswith("!"):
+                seq = "^" + seq[1:]
+            parts.append("[" + seq.replace("\\", "\\\\") + "]")
+            i = end
+        else:
+            parts.append(re.escape(char))
+        i += 1
+
+    return re.compile("".join(parts) + r"\Z", re.DOTALL), pattern if prefix is None else prefix
+
+
+def regex_prefix(regex):
+    """
+    Returns the literal text every full match of the compiled regex starts with, "" if it can't be told
+    (a leading group, class, alternation or quantifier, or case-insensitive matching).
+    """
+    if not isinstance(regex.pattern, str) or regex.flags & re.IGNORECASE:
+        return ""
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except re.error:
+        return ""
+    prefix = []
+    for op, value in parsed:
+        if op is not sre_parse.LITERAL:
+            break
+        prefix.append(chr(value))
+    return "".join(prefix)
+
+
+class NameIndex:
+    """
+    Sorted index of variable names: O(1) exact lookups, prefix ranges by binary search,
+    and glob/regex matching that only scans the names sharing the pattern's literal prefix.
+    """
+    def __init__(self, names):
+        self.names = sorted(names)
+        self.name_set = set(self.names)
+
+    def __contains__(self, name):
+        return name in self.name_set
+
+    def __len__(self):
+        return len(self.names)
+
+    def prefix_range(self, prefix):
+        """
+        Returns (start, stop) of the names starting with prefix inside self.names.
+        """
+        start = bisect.bisect_left(self.names, prefix)
+        stop = bisect.bisect_left(self.names, prefix + "\U0010ffff") if prefix else len(self.names)
+        return start, stop
+
+    def with_prefix(self, prefix):
+        start, stop = self.prefix_range(prefix)
+        return self.names[start:stop]
+
+    def match_glob(self, pattern):
+        """
+        Returns [("name", (captures...)), ...] of the names matching the glob pattern, captures are the text of every * and ?.
+        """
+        regex, prefix = glob_to_regex(pattern)
+        if prefix == pattern:                                           # no wildcards, a plain lookup
+            return [(pattern, ())] if pattern in self.name_set else []
+        matches = []
+        for name in self.with_prefix(prefix):
+            match = regex.match(name)
+            if match:
+                matches.append((name, match.groups()))
+        return matches
+
+    def match_regex(self, pattern):
+        """
+        Returns [("name", re.Match), ...] of the names fully matching the regex pattern.
+        Only the names starting with the regex's literal prefix (see regex_prefix) are scanned.
+        """
+        regex = re.compile(pattern) if isinstance(pattern, str) else pattern
+        matches = []
+        for name in self.with_prefix(regex_prefix(regex)):
+            match = regex.fullmatch(name)
+            if match:
+                matches.append((name, match))
+        return matches
+
+
+class VariableCatalog:
+    """
+    Searchable catalog of every variable of an FMU. Names are kept in a NameIndex and every causality,
+    variability and type value maps to the set of its names, so a search only scans the names
+    sharing its prefix and never touches the loaded model.
+    """
+    FIELDS = ["causality", "variability", "type"]
+
+    def __init__(self, variables):
+        self.attributes = {}                # {"variable_name" : ("causality", "variability", "type")}
+        self.field_sets = {field: {} for field in self.FIELDS}     # {"causality" : {"input" : {"name", ...}}, ...}
+        for name, causality, variability, var_type in variables:
+            self.attributes[name] = (causality, variability, var_type)
+            for field, value in zip(self.FIELDS, (causality, variability, var_type)):
+                self.field_sets[field].setdefault(value, set()).add(name)
+        self.names = NameIndex(self.attributes)
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_attributes(self, name):
+        """
+        Returns {"name", "causality", "variability", "type"} of a variable, or None.
+        """
+        attributes = self.attributes.get(name)
+        if attributes is None:
+            return None
+        return dict(zip(["name"] + self.FIELDS, (name,) + attributes))
+
+    def search(self, prefix = None, contains = None, regex = None, causality = None, variability = None, type = None,
+               page = 1, page_size = None):
+        """
+        Returns (["variable_name", ...] of the requested page in name order, number of matches).
+        Every given filter must match: prefix/contains are plain text, regex is searched anywhere in the name,
+        causality/variability/type are a value or a list of values. page starts at 1, page_size None is one page.
+        Raises ValueError if regex is invalid.
+        """
+        names = self.names.with_prefix(prefix) if prefix else self.names.names
+
+        for field, values in zip(self.FIELDS, (causality, variability, type)):
+            if values is None:
+                continue
+            values = [values] if isinstance(values, str) else values
+            sets = [self.field_sets[field].get(value, set()) for value in values]
+            allowed = sets[0] if len(sets) == 1 else set().union(*sets)
+            names = [name for name in names if name in allowed]
+
+        if contains:
+            names = [name for name in names if contains in name]
+        if regex:
+            try:
+                compiled = re.compile(regex)
+            except re.error as e:
+                raise ValueError(f"'{regex}' is not a valid regex: {e}")
+            names = [name for name in names if compiled.search(name)]
+
+        total = len(names)
+        if page_size:
+            start = (max(page, 1) - 1) * page_size
+            names = names[start:start + page_size]
+        return list(names), total
+
+
+class FMUMetadata:
+    """
+    Read-only index of an FMU's modelDescription.xml.
+    """
+    fmu_hash = ""
+
+    inputs = []                 # ["input_name", ...] in modelDescription order
+
+    outputs = []                # ["output_name", ...] in modelDescription order
+
+    input_index = {}            # {"input_name" : index into inputs}
+
+    output_index = {}           # {"output_name" : index into outputs}
+
+    value_references = {}       # {"variable_name" : value_reference} for every variable
+
+    capability_flags = {}       # {"canHandleVariableCommunicationStepSize" : bool, ...}
+
+    generation_tool = ""
+
+    default_experiment = {}     # {"start_time", "stop_time", "tolerance", "step_size"}, only keys present in the xml
+
+    name_indexes = {}           # {"input"/"output" : NameIndex}, see get_name_index
+
+    variables = []              # [["variable_name", "causality", "variability", "type"], ...] in modelDescription order
+
+    catalog = None              # VariableCatalog, see get_catalog
+
+    output_dependencies = {}    # {"output_name" : ["input_name", ...]} direct feedthrough, missing outputs may depend on every input
+
+    def __init__(self, data, fmu_hash = ""):
+        self.fmu_hash = fmu_hash
+        self.fmi_version = data["fmi_version"]
+        self.model_name = data["model_name"]
+        self.guid = data["guid"]
+        self.model_identifier = data["model_identifier"]
+        self.generation_tool = data["generation_tool"]
+        self.capability_flags = data["capability_flags"]
+        self.default_experiment = data["default_experiment"]
+        self.inputs = data["inputs"]
+        self.outputs = data["outputs"]
+        self.value_references = data["value_references"]
+        self.variables = data["variables"]
+        self.output_dependencies = data["output_dependencies"]
+
+        self.input_index = {name: index for index, name in enumerate(self.inputs)}
+        self.output_index = {name: index for index, name in enumerate(self.outputs)}
+        self.name_indexes = {}
+        self.catalog = None
+
+    @classmethod
+    def from_fmu(cls, fmu_path):
+        """
+        Returns the metadata for fmu_path, from the on-disk cache if this FMU was seen before.
+        Raises ValueError if the FMU's modelDescription.xml is missing or invalid.
+        """
+        fmu_hash = file_hash(fmu_path)
+
+        data = load_cached_json("metadata", fmu_hash)
+        if data is None or data.get("version") != METADATA_VERSION:
+            data = parse_model_description(read_model_description(fmu_path))
+            save_cached_json("metadata", fmu_hash, data)
+
+        return cls(data, fmu_hash)
+
+    def get_name_index(self, causality):
+        """
+        Returns the NameIndex of the "input" or "output" names, built the first time it is needed.
+        """
+        if causality not in self.name_indexes:
+            self.name_indexes[causality] = NameIndex(self.inputs if causality == "input" else self.outputs)
+        return self.name_indexes[causality]
+
+    def get_catalog(self):
+        """
+        Returns the VariableCatalog of every variable, built the first time it is needed.
+        """
+        if self.catalog is None:
+            self.catalog = VariableCatalog(self.variables)
+        return self.catalog
+
+    def get_feedthrough(self, output_name):
+        """
+        Returns the input names output_name directly depends on.
+        """
+        return self.output_dependencies.get(output_name, self.inputs)
+
+    def has_input(self, name):
+        return name in self.input_index
+
+    def has_output(self, name):
+        return name in self.output_index
+
+    def get_value_reference(self, name):
+        return self.value_references.get(name)
+
+    def is_energyplus(self):
+        tool = self.generation_tool.lower()
+        return "idf" in tool or "energyplus" in tool
+
+    def can_handle_variable_step(self):
+        return self.capability_flags.get("canHandleVariableCommunicationStepSize", False)
+
+    def can_serialize_state(self):
+        return self.capability_flags.get("canGetAndSetFMUstate", False) and self.capability_flags.get("canSerializeFMUstate", False)
+
+    def get_default_step_size(self):
+        return self.default_experiment.get("step_size", DEFAULT_STEP_SIZE)
@@ -0,0 +1,120 @@
+import re
+import fnmatch
+
+"""
+Bulk linking. Rules map outputs of one FMU to inputs of another by name, so dozens of links are made at once.
+
+Rule format (json or dictionary):
+{"from" : "Building", "to" : "Controls", "match" : "exact"}                                  every output linked to the input with the same name
+{"from" : "Building", "to" : "Controls", "match" : "exact", "map" : {"output_name" : "input_name", ...}}
+{"from" : "Building", "to" : "Controls", "match" : "glob", "outputs" : "zone*_T", "inputs" : "T_zone*"}
+                                            every * and ? of "inputs" is filled with the text matched by the same wildcard of "outputs"
+{"from" : "Building", "to" : "Controls", "match" : "regex", "outputs" : "zone(\\d+)_T", "inputs" : "T_zone\\1"}
+                                            "outputs" must match the whole name, "inputs" is a re template (\\1, \\g<name>)
+"inputs" defaults to "outputs" (the same names). "from" and "to" may also be glob patterns of FMU names ("Zone*"),
+an FMU is never linked to itself by a pattern.
+"""
+MATCH_TYPES = ["exact", "glob", "regex"]
+
+
+def fill_glob_template(template, captures):
+    """
+    Replaces the wildcards of template, in order, with captures. Raises ValueError if there are more wildcards than captures.
+    """
+    parts = []
+    index = 0
+    for char in template:
+        if char in "*?":
+            if index >= len(captures):
+                raise ValueError(f"'{template}' has more wildcards than the output pattern.")
+            parts.append(captures[index])
+            index += 1
+        else:
+            parts.append(char)
+    return "".join(parts)
+
+
+def match_fmu_names(pattern, fmu_names):
+    if pattern in fmu_names:
+        return [pattern]
+    return sorted(fnmatch.filter(fmu_names, pattern))
+
+
+def expand_rule(rule, fmu_objects):
+    """
+    Returns ([(output_fmu_name, output_name, input_fmu_name, input_name), ...], unmatched)
+    for one rule, unmatched counts the matching outputs that have no matching input.
+    Raises ValueError if the rule is invalid.
+    """
+    match_type = rule.get("match", "exact")
+    if match_type not in MATCH_TYPES:
+        raise ValueError(f"Match type '{match_type}' doesn't exist, options are: {MATCH_TYPES}")
+    if "from" not in rule or "to" not in rule:
+        raise ValueError(f"Rule {rule} needs a 'from' and a 'to' FMU.")
+
+    out_fmus = match_fmu_names(rule["from"], fmu_objects.keys())
+    in_fmus = match_fmu_names(rule["to"], fmu_objects.keys())
+    if not out_fmus or not in_fmus:
+        raise ValueError(f"Rule {rule} matches no FMU in 'from' or 'to'.")
+
+    try:
+        regex = re.compile(rule["outputs"]) if match_type == "regex" and "outputs" in rule else None
+    except re.error as e:
+        raise ValueError(f"'{rule['outputs']}' is not a valid regex: {e}")
+
+    links = []
+    unmatched = 0
+    for out_fmu in out_fmus:
+        output_index = fmu_objects[out_fmu].metadata.get_name_index("output")
+
+        # [(output_name, input_name)] candidates of this output FMU, the same for every input FMU
+        if match_type == "exact" and "map" in rule:
+            pairs = [(out_name, in_name) for out_name, in_name in rule["map"].items() if out_name in output_index]
+            unmatched += len(rule["map"]) - len(pairs)
+        elif match_type == "exact":
+            pairs = [(out_name, out_name) for out_name in output_index.names]
+        elif match_type == "glob":
+            template = rule.get("inputs", rule.get("outputs", "*"))
+            pairs = [(out_name, fill_glob_template(template, captures))
+                     for out_name, captures in output_index.match_glob(rule.get("outputs", "*"))]
+        else:
+            template = rule.get("inputs")
+            pairs = [(out_name, out_name if template is None else match.expand(template))
+                     for out_name, match in output_index.match_regex(regex if regex is not None else ".*")]
+
+        for in_fmu in in_fmus:
+            if in_fmu == out_fmu and (rule["from"] != out_fmu or rule["to"] != in_fmu):
+                continue                                                # patterns never link an FMU to itself
+            input_index = fmu_objects[in_fmu].metadata.get_name_index("input")
+            for out_name, in_name in pairs:
+                if in_name in input_index:
+                    links.append((out_fmu, out_name, in_fmu, in_name))
+                elif not (match_type == "exact" and "map" not in rule):
+                    unmatched += 1
+
+    return links, unmatched
+
+
+def match_links(rules, fmu_objects):
+    """
+    Expands every rule. Returns (links, unmatched, errors): links without duplicates in rule order,
+    errors lists invalid rules and inputs that two different outputs would be linked to.
+    """
+    links = {}                              # {("input_fmu_name", "input_name") : ("output_fmu_name", "output_name")}
+    unmatched = 0
+    errors = []
+
+    for rule in rules:
+        try:
+            rule_links, rule_unmatched = expand_rule(rule, fmu_objects)
+        except (ValueError, AttributeError, TypeError) as e:
+            errors.append(str(e))
+            continue
+        unmatched += rule_unmatched
+
+        for out_fmu, out_name, in_fmu, in_name in rule_links:
+            source = links.setdefault((in_fmu, in_name), (out_fmu, out_name))
+            if source != (out_fmu, out_name):
+                errors.append(f"Input '{in_name}' of '{in_fmu}' is matched by both ({source[0]}) {source[1]} and ({out_fmu}) {out_name}.")
+
+    return [(out_fmu, out_name, in_fmu, in_name) for (in_fmu, in_name), (out_fmu, out_name) in links.items()], unmatched, errors
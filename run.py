@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 import fmu_files
 import API_code
 
@@ -27,6 +28,31 @@ def login_or_reg():
             return 0
         print(text)
     return 1
+
+
+SEARCH_KEYS = ["prefix", "contains", "regex", "causality", "variability", "type", "page", "page-size"]
+
+def parse_search_options(args):
+    """
+    Parses list-inputs/list-outputs/list-vars filters ("key=value", a bare word is a prefix) into search keyword arguments.
+    Returns None if a filter is invalid.
+    """
+    search = {}
+    for arg in args:
+        key, value = arg.split("=", 1) if "=" in arg else ("prefix", arg)
+        if key not in SEARCH_KEYS:
+            print(f"Unknown filter '{key}', options are: {SEARCH_KEYS}")
+            return None
+        if key in ["page", "page-size"]:
+            try:
+                value = int(value)
+            except ValueError:
+                print(f"'{key}' must be a number.")
+                return None
+        elif key in ["causality", "variability", "type"]:
+            value = value.split(",")
+        search[key.replace("-", "_")] = value
+    return search
     
 
 if __name__ == "__main__":
@@ -40,12 +66,16 @@ if __name__ == "__main__":
     print("")
 
     echo = False
+    lazy = False
     save_dir = ""
     fmu_paths = []
 
-    if sys.argv[len(sys.argv) - 1] == "echo":
-        echo = True
-        sys.argv.pop()  # Remove the last argument if it's 'echo'
+    # 'echo' and 'lazy' options can be given in any order at the end
+    while sys.argv[len(sys.argv) - 1] in ["echo", "lazy"]:
+        if sys.argv.pop() == "echo":    # Remove the last argument if it's an option
+            echo = True
+        else:
+            lazy = True
 
     # Checking or additional arguments
     if len(sys.argv) == 1:
@@ -97,7 +127,7 @@ if __name__ == "__main__":
             print(f"Save Dir: {save_dir}")
             print(f"FMU Paths: {fmu_paths}")
 
-    fmu = fmu_files.FMUWorkspace(fmu_paths, save_dir)
+    fmu = fmu_files.FMUWorkspace(fmu_paths, save_dir, lazy=lazy)
     session = API_code.APISession()
 
     """
@@ -128,6 +158,7 @@ if __name__ == "__main__":
             print("python run.py <save_dir> <FMU1> <FMU2> ...      -                                run with specified save directory and fmus")
             print("")
             print("add echo option at the end to echo commands")
+            print("add lazy option at the end to only load FMUs with pyFMI when running (faster startup with large FMUs)")
             print("")
             print("Examples: ")
             print("python run.py /path/to/save_dir")
@@ -144,6 +175,7 @@ if __name__ == "__main__":
             print("")
             print("Commands for running and viewing results: ")
             print("run :                                                                                                            run simulation or real-time FMUs")
+            print("resume <run_dir> :                                                                   continue a failed python master run from its last checkpoint")
             print("name-res <old_name> <new_name> :                                                                      rename a result from the default 'result_#'")
             print("view-res <result_name/result_index> :                                                  view result via result_name or index, array of all outputs")
             print("view-res <result_name/result_index> <FMU> <variables> :                  view result via result_name or index, array of specific output variables")
@@ -162,6 +194,17 @@ if __name__ == "__main__":
             print("set-name <fmu_name> <new_name> :                                                                                        set a new name for an FMU")
             print("save-directory <dirPath> :                                                                                    set new save results directory path")
             print("current-setup :                                                                                               prints your current workspace setup")
+            print("result-format <csv/binary/binary-async> :                                                                 set result file format of the next runs")
+            print("master <pyfmi/python> :                                                                     run with pyFMI's master or the built-in Python master")
+            print("isolate <fmu_name> <on/off> :                                           run an FMU in its own worker process so its crashes don't end the session")
+            print("restart <fmu_name> :                                                                     load an FMU again, e.g. after its worker process crashed")
+            print("checkpoint-every <T> :                                                           checkpoint python master runs every T seconds of simulation time")
+            print("warmup <T> :                                                                           step python master runs T seconds before recording results")
+            print("snapshot-cache <on/off> <max_MB> :                                reuse the initialized (and warmed-up) state of earlier runs with the same setup")
+            print("record <fmu_name> <var_name/pattern> ... :                                                                only record these variables of fmu_name")
+            print("record <fmu_name> :                                                                                             record every variable of fmu_name")
+            print("record-every <N> <T>s :                               record every N steps and/or at most once every T seconds (either one alone keeps the other)")
+            print("record-every <off/steps off/seconds off> :                                       record every step again, or clear only the step or time interval")
             print("")
             # adding and deleting commands
             print("add-FMU <fmu_path> :                                                                                            add an FMU to current list of FMUs")
@@ -179,6 +222,8 @@ if __name__ == "__main__":
             print("Altering data commands:")
             print("add-data <fmu_name> <data_path> :                                                        add data to input rather than connection to another model")
             print("remove-data <fmu_name> <input_name> :                                                                                       remove data from input")      
+            print("input-fill <hold/linear> :                                                           fill data between its time points by holding or interpolating")
+            print("input-stream <on/off> :                                                                  read data files chunk by chunk while running (large data)")
             print("")
             print("")
             break_point = input("Press any enter to continue. Enter 'done' to quit the help menu. ")
@@ -190,6 +235,8 @@ if __name__ == "__main__":
             print("Linking commands:")
             print("link <fmu_name> <output_name> <fmu_name> <intputName> :                                                  link an input and output for variable name")
             print("link <fmu_name> <outputIndex> <fmu_name> <inputIndex> :                                                  link an output and input by variable index")
+            print("link-match <from_fmu> <to_fmu> <exact/glob/regex> [output_pattern] [input_pattern] :                        link every matching output to its input")
+            print("link-rules <rules_path> :                                                                                 link with every rule of a json rules file")
             print("")
             print("Unlinking commands:")
             print("unlink <fmu_name> :                                                                                       removes all connections/links to fmu_name")
@@ -215,8 +262,11 @@ if __name__ == "__main__":
             print("list :                                                                                                                               list all FMUs")
             print("list-links :                                                                                                           list all links between FMUs")
             print("list-links <fmu_name> :                                                                                           list all links for a certain FMU")
+            print("list-order :                                                          list the execution order, algebraic loops and FMUs that can step in parallel")
             print("list-inputs <fmu_name> :                                                                                        list all inputs for a specific FMU")
             print("list-outputs <fmu_name> :                                                                                      list all outputs for a specific FMU")
+            print("list-vars <fmu_name> [filters] :                                                      list every variable with its causality, variability and type")
+            print("  filters: <prefix> prefix= contains= regex= causality= variability= type= page= page-size=                         (list-inputs/list-outputs too)")
             print("list-suppressed <fmu_name> :                                                                                            list all suppressed inputs")
             print("list-res :                                                                                              list all result names and result variables")
             print("")
@@ -235,6 +285,7 @@ if __name__ == "__main__":
             if (echo):
                 print("exit")
             print("Exiting the program.")
+            fmu.close_workers()
             break
         elif (ret == "run"):
             if (echo):
@@ -348,6 +399,130 @@ if __name__ == "__main__":
                     print(f"Save directory changed to: {new_dir}")
             else:
                 print("No new directory path was provided. Please provide new directory path in command call.")
+        elif (ret == "result-format"):
+            if (echo):
+                print("result-format")
+
+            if len(retString.split()) > 1:
+                if fmu.set_result_format(retString.split()[1].lower()):
+                    print(f"Results of the next runs will be saved as: {fmu.result_format}")
+            else:
+                print(f"Results are saved as: {fmu.result_format}. To change it, type 'result-format <csv/binary/binary-async>'")
+        elif (ret == "master"):
+            if (echo):
+                print("master")
+
+            if len(retString.split()) > 1:
+                if fmu.set_master_type(retString.split()[1].lower()):
+                    print(f"The next runs will use the {fmu.master_type} master.")
+            else:
+                print(f"Runs use the {fmu.master_type} master. To change it, type 'master <pyfmi/python>'")
+        elif (ret == "isolate"):
+            if (echo):
+                print("isolate")
+
+            args = retString.split()[1:]
+            if len(args) == 0 or (len(args) > 1 and args[1].lower() not in ["on", "off"]):
+                print("Use 'isolate <fmu_name>' or 'isolate <fmu_name> off'")
+            elif fmu.isolate_fmu(args[0], len(args) == 1 or args[1].lower() == "on"):
+                state = "its own worker process" if fmu.fmu_objects[args[0]].isolated else "this process"
+                print(f"FMU {args[0]} now runs in {state}.")
+        elif (ret == "restart"):
+            if (echo):
+                print("restart")
+
+            if len(retString.split()) > 1:
+                if fmu.restart_fmu(retString.split()[1]):
+                    print(f"FMU {retString.split()[1]} loaded again.")
+            else:
+                print("No FMU name provided. Please use 'restart <fmu_name>'")
+        elif (ret == "record"):
+            if (echo):
+                print("record")
+
+            if len(retString.split()) > 1:
+                fmu.set_recording(retString.split()[1], retString.split()[2:])
+            else:
+                print("No FMU name provided. Please use 'record <fmu_name> <var_name/pattern> ...'")
+        elif (ret == "record-every"):
+            if (echo):
+                print("record-every")
+
+            args = [arg.lower() for arg in retString.split()[1:]]
+            if args in [["off"], ["steps", "off"], ["seconds", "off"]]:
+                fmu.clear_record_interval(steps=args[0] != "seconds", seconds=args[0] != "steps")
+            elif len(args):
+                # only the intervals given are changed, "record-every 6" keeps a time interval set before
+                every_steps = None
+                every_seconds = None
+                try:
+                    for arg in args:
+                        if arg.endswith("s"):
+                            every_seconds = float(arg[:-1])
+                        else:
+                            every_steps = int(arg)
+                except ValueError:
+                    print("Invalid interval. Please use 'record-every <N>' for steps, 'record-every <T>s' for seconds or 'record-every off'.")
+                    continue
+                fmu.set_record_interval(every_steps, every_seconds)
+
+            if fmu.record_every_seconds is None:
+                print(f"Recording every {fmu.record_every_steps} step(s).")
+            else:
+                print(f"Recording every {fmu.record_every_steps} step(s), at most once every {fmu.record_every_seconds} seconds.")
+        elif (ret == "checkpoint-every"):
+            if (echo):
+                print("checkpoint-every")
+
+            if len(retString.split()) > 1:
+                try:
+                    seconds = float(retString.split()[1].lower().rstrip("s"))
+                except ValueError:
+                    print("Invalid interval. Please use 'checkpoint-every <T>' with T in seconds of simulation time.")
+                    continue
+                if fmu.set_checkpoint_every(seconds):
+                    print(f"Python master runs are checkpointed every {seconds} seconds." if seconds else "Checkpoints are off.")
+            else:
+                print(f"Checkpoint interval: {fmu.checkpoint_every} seconds (0 is off). To change it, type 'checkpoint-every <T>'")
+        elif (ret == "warmup"):
+            if (echo):
+                print("warmup")
+
+            if len(retString.split()) > 1:
+                try:
+                    seconds = float(retString.split()[1].lower().rstrip("s"))
+                except ValueError:
+                    print("Invalid warm-up time. Please use 'warmup <T>' with T in seconds of simulation time.")
+                    continue
+                if fmu.set_warmup_time(seconds):
+                    print(f"Python master runs warm up for {seconds} seconds before recording.")
+            else:
+                print(f"Warm-up time: {fmu.warmup_time} seconds. To change it, type 'warmup <T>'")
+        elif (ret == "snapshot-cache"):
+            if (echo):
+                print("snapshot-cache")
+
+            args = retString.split()[1:]
+            if len(args) == 0:
+                state = "on" if fmu.snapshot_cache else "off"
+                print(f"Snapshot cache is {state}, up to {fmu.snapshot_cache_bytes // (1024 * 1024)} MB. To change it, type 'snapshot-cache <on/off> <max_MB>'")
+                continue
+            if args[0].lower() not in ["on", "off"]:
+                print("Use 'snapshot-cache <on/off>' or 'snapshot-cache on <max_MB>'")
+                continue
+            try:
+                max_mb = float(args[1]) if len(args) > 1 else None
+            except ValueError:
+                print("Invalid size. Please give the cache size in MB.")
+                continue
+            if fmu.set_snapshot_cache(args[0].lower() == "on", max_mb):
+                print(f"Snapshot cache is {args[0].lower()}.")
+        elif (ret == "resume"):
+            if (echo):
+                print("resume")
+
+            target = retString.split()[1] if len(retString.split()) > 1 else None
+            fmu.resume_sim(target)
         elif (ret == "current-setup"):
             if (echo):
                 print("current-setup")
@@ -419,7 +594,7 @@ if __name__ == "__main__":
                 print("add-data")
             
             if len(retString.split()) > 2:
-                is_seconds = input("CSV files must have a time column labeled 'time', with time in increasing increments in SECONDS. Continue? [y/n] ")
+                is_seconds = input("Data files (.csv, .npy, .npz, .feather, .parquet or a .json raw data schema) must have a time column labeled 'time', with time in increasing increments in SECONDS. Continue? [y/n] ")
                 while is_seconds.lower() not in ['y', 'n']:
                     is_seconds = input("Invalid input. Please enter 'y' or 'n': ")
                 
@@ -447,6 +622,24 @@ if __name__ == "__main__":
                 fmu.remove_data(fmu_name, input_name)
             else:
                 print("Not enough arguments provided. Please provide FMU name and input name")
+        elif (ret == "input-fill"):
+            if echo:
+                print("input-fill")
+
+            if len(retString.split()) > 1:
+                if fmu.set_input_fill(retString.split()[1].lower()):
+                    print(f"Input data of the next runs will be filled with: {fmu.input_fill}")
+            else:
+                print(f"Input data is filled with: {fmu.input_fill}. To change it, type 'input-fill <hold/linear>'")
+        elif (ret == "input-stream"):
+            if echo:
+                print("input-stream")
+
+            if len(retString.split()) > 1 and retString.split()[1].lower() in ["on", "off"]:
+                fmu.set_input_streaming(retString.split()[1].lower() == "on")
+                print(f"Input data streaming is {'on' if fmu.stream_inputs else 'off'}.")
+            else:
+                print(f"Input data streaming is {'on' if fmu.stream_inputs else 'off'}. To change it, type 'input-stream <on/off>'")
         elif (ret == "link"):
             if (echo):
                 print("link")
@@ -470,6 +663,35 @@ if __name__ == "__main__":
                 fmu.link_input_output(fmu1, output_name, fmu2, input_name)
             else:
                 print("Not enough arguments provided. Please provide FMU names and input/output names to link.")
+        elif (ret == "link-match"):
+            if (echo):
+                print("link-match")
+
+            args = retString.split()
+            if len(args) > 3:
+                rule = {"from": args[1], "to": args[2], "match": args[3].lower()}
+                if len(args) > 4:
+                    rule["outputs"] = args[4]
+                if len(args) > 5:
+                    rule["inputs"] = args[5]
+                fmu.link_by_rules([rule])
+            else:
+                print("Not enough arguments provided. Please provide both FMU names and the match type (exact/glob/regex).")
+        elif (ret == "link-rules"):
+            if (echo):
+                print("link-rules")
+
+            if len(retString.split()) > 1:
+                rules_path = retString.split()[1]
+                try:
+                    with open(rules_path, "r") as file:
+                        rules = json.load(file)
+                except (OSError, ValueError) as e:
+                    print(f"Error: could not read rules file {rules_path}: {e}")
+                    continue
+                fmu.link_by_rules(rules if isinstance(rules, list) else [rules])
+            else:
+                print("Not enough arguments provided. Please provide the path to a rules file.")
         elif (ret == "unlink"):
             if (echo):
                 print("unlink")
@@ -497,6 +719,7 @@ if __name__ == "__main__":
                     print("Input or Output string is incorrectly formatted. Please use the following format:")
                     print("input==<input_name> or output==<output_name>")
             elif len(retString.split()) > 1:
+                fmu1 = retString.split()[1]
                 fmu.unlink_input_output(fmu1)
             else:
                 print("Not enough arguments. Please input at least fmu_name.")
@@ -538,7 +761,10 @@ if __name__ == "__main__":
             print("Listing inputs for FMUs:")
             if len(retString.split()) > 1:
                 specificFmu = retString.split()[1]  # Get the FMU name from the input
-                fmu.list_inputs(specificFmu)
+                search = parse_search_options(retString.split()[2:])
+                if search is not None:
+                    search.pop("causality", None)
+                    fmu.list_inputs(specificFmu, **search)
             else:
                 print("No FMU specified. Printing all inputs for all FMUs imported.")
                 for fmu_name in fmu.fmu_objects.keys():
@@ -550,11 +776,24 @@ if __name__ == "__main__":
             print("Listing outputs for FMUs:")
             if len(retString.split()) > 1:
                 specificFmu = retString.split()[1]
-                fmu.list_outputs(specificFmu)
+                search = parse_search_options(retString.split()[2:])
+                if search is not None:
+                    search.pop("causality", None)
+                    fmu.list_outputs(specificFmu, **search)
             else:
                 print("No FMU specified. Printing all outputs for all FMUs imported.")
                 for fmu_name in fmu.fmu_objects.keys():
                     fmu.list_outputs(fmu_name)
+        elif (ret == "list-vars"):
+            if (echo):
+                print("list-vars")
+
+            if len(retString.split()) > 1:
+                search = parse_search_options(retString.split()[2:])
+                if search is not None:
+                    fmu.list_variables(retString.split()[1], **search)
+            else:
+                print("Not enough arguments. Please input at least fmu_name")
         elif (ret == "list-links"):
             if echo:
                 print("list-links")
@@ -566,6 +805,11 @@ if __name__ == "__main__":
             else:
                 print("No FMU specified. Listing all links.")
                 fmu.list_links()
+        elif (ret == "list-order"):
+            if echo:
+                print("list-order")
+
+            fmu.list_order()
         elif (ret == "list-suppressed"):
             if echo:
                 print("list-suppressed")
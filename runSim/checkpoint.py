@@ -0,0 +1,143 @@
+import os
+import json
+import shutil
+import pickle
+import hashlib
+import numpy as np
+from fmu_cache import load_cached_bytes, save_cached_bytes
+
+"""
+Checkpoints of Python master runs, so a failed run can be resumed instead of simulated again from the start.
+
+A checkpoint is kept in the "checkpoint" directory of the run directory:
+checkpoint.json         time, macro step, FMUs, step sizes and how far every result file was written
+<fmu_name>.<n>.state    the FMU's serialized FMI 2.0 state (get_fmu_state + serialize_fmu_state)
+coupling.<n>.npz        the master's coupling buffers
+The state files of checkpoint n are written first and checkpoint.json is replaced last, so a crash while
+writing a checkpoint leaves the previous one usable.
+
+Snapshots are the same states taken right after initialization (or after a warm-up), kept in the shared
+disk cache (fmu_cache.py) so later runs with the same FMUs, parameters, start time and inputs skip them.
+"""
+CHECKPOINT_FORMAT = "cosim-checkpoint"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_DIR = "checkpoint"
+CHECKPOINT_FILE = "checkpoint.json"
+
+# cache kind of the snapshots, and the default size of all of them together (least recently used go first)
+SNAPSHOT_CACHE = "snapshots"
+DEFAULT_SNAPSHOT_CACHE_BYTES = 4 * 1024 ** 3
+
+
+def get_checkpoint_dir(run_dir):
+    return os.path.join(run_dir, CHECKPOINT_DIR)
+
+
+def clear_checkpoint(checkpoint_dir):
+    """
+    Removes the checkpoint of a run directory, its result files are about to be written again.
+    """
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+
+def get_serialized_state(model):
+    """
+    Returns the serialized FMU state of a pyFMI model (whatever pyFMI's serialize_fmu_state returns).
+    """
+    state = model.get_fmu_state()
+    try:
+        return model.serialize_fmu_state(state)
+    finally:
+        model.free_fmu_state(state)
+
+
+def set_serialized_state(model, serialized_state):
+    state = model.deserialize_fmu_state(serialized_state)
+    try:
+        model.set_fmu_state(state)
+    finally:
+        model.free_fmu_state(state)
+
+
+def write_checkpoint(checkpoint_dir, info, states, arrays):
+    """
+    Writes checkpoint number info["number"]: info (json-ready dict), states ({"fmu_name" : serialized state})
+    and arrays ({"name" : np.array}). The files of the previous checkpoint are removed once it's written.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    number = info["number"]
+    previous = read_checkpoint_info(checkpoint_dir) if os.path.exists(os.path.join(checkpoint_dir, CHECKPOINT_FILE)) else None
+
+    info = dict(info, format=CHECKPOINT_FORMAT, version=CHECKPOINT_VERSION, states={}, coupling=f"coupling.{number}.npz")
+    for fmu_name, state in states.items():
+        info["states"][fmu_name] = f"{fmu_name}.{number}.state"
+        with open(os.path.join(checkpoint_dir, info["states"][fmu_name]), "wb") as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    np.savez(os.path.join(checkpoint_dir, info["coupling"]), **arrays)
+
+    temp_path = os.path.join(checkpoint_dir, CHECKPOINT_FILE + ".tmp")
+    with open(temp_path, "w") as file:
+        json.dump(info, file)
+    os.replace(temp_path, os.path.join(checkpoint_dir, CHECKPOINT_FILE))
+
+    if previous is not None and previous["number"] != number:
+        for file_name in list(previous["states"].values()) + [previous["coupling"]]:
+            try:
+                os.remove(os.path.join(checkpoint_dir, file_name))
+            except OSError:
+                pass
+
+
+def read_checkpoint_info(checkpoint_dir):
+    """
+    Returns the checkpoint.json of checkpoint_dir. Raises OSError if there is none, ValueError if it isn't a checkpoint.
+    """
+    with open(os.path.join(checkpoint_dir, CHECKPOINT_FILE)) as file:
+        try:
+            info = json.load(file)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{checkpoint_dir} has a broken checkpoint: {e}")
+    if info.get("format") != CHECKPOINT_FORMAT or info.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{checkpoint_dir} has no checkpoint this version can read.")
+    return info
+
+
+def read_checkpoint(checkpoint_dir):
+    """
+    Returns (info, {"fmu_name" : serialized state}, {"name" : np.array}) of the checkpoint in checkpoint_dir.
+    Raises OSError or ValueError like read_checkpoint_info.
+    """
+    info = read_checkpoint_info(checkpoint_dir)
+    states = {}
+    for fmu_name, file_name in info["states"].items():
+        with open(os.path.join(checkpoint_dir, file_name), "rb") as file:
+            states[fmu_name] = pickle.load(file)
+    with np.load(os.path.join(checkpoint_dir, info["coupling"])) as data:
+        arrays = {name: data[name] for name in data.files}
+    return info, states, arrays
+
+
+def snapshot_key(context):
+    """
+    Returns the cache key of a snapshot: the sha256 of context (json-ready, see runSim.get_snapshot_context).
+    """
+    text = json.dumps([CHECKPOINT_VERSION, context], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def load_snapshot(key):
+    """
+    Returns the cached snapshot {"time", "tick", "states", "arrays"} of key, or None.
+    """
+    data = load_cached_bytes(SNAPSHOT_CACHE, key)
+    if data is None:
+        return None
+    try:
+        return pickle.loads(data)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+        print(f"Warning: snapshot {key} can't be read, ignoring it: {e}")
+        return None
+
+
+def save_snapshot(key, snapshot, max_bytes = DEFAULT_SNAPSHOT_CACHE_BYTES):
+    return save_cached_bytes(SNAPSHOT_CACHE, key, pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL), max_bytes)
@@ -0,0 +1,155 @@
+"""
+Analysis of the coupling between FMUs, done before every run.
+
+FMU graph:       an edge A -> B for every link from an output of A to an input of B.
+                 Its strongly connected components are FMUs that exchange data both ways, the
+                 components in topological order give the execution order.
+Variable graph:  output -> linked input for every link, and input -> output inside an FMU when the output
+                 directly depends on the input (ModelStructure). A cycle here is an algebraic loop: the outputs
+                 of that cycle can't be computed one after the other, they need a fixed-point iteration.
+"""
+
+
+def strongly_connected_components(nodes, edges):
+    """
+    Tarjan's algorithm without recursion (large variable graphs would hit the recursion limit).
+    nodes is a list, edges is {node : [node, ...]}. Returns the components as lists, in topological order
+    (every edge between components goes from an earlier component to a later one).
+    """
+    index = {}                              # {node : visiting order}
+    low = {}                                # {node : lowest visiting order reachable}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+
+    # roots are visited last to first, so unrelated nodes keep their order once the components are reversed
+    for root in reversed(nodes):
+        if root in index:
+            continue
+        work = [(root, iter(edges.get(root, ())))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(edges.get(child, ()))))
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    # Tarjan finds every component after the components it leads to
+    components.reverse()
+    return components
+
+
+def is_cycle(component, edges):
+    return len(component) > 1 or component[0] in edges.get(component[0], ())
+
+
+class CouplingAnalysis:
+    """
+    Result of analyze_coupling.
+    """
+    order = []                  # ["fmu_name", ...] execution order, every FMU after the FMUs it gets data from (outside of loops)
+
+    levels = []                 # [["fmu_name", ...], ...] FMUs of one level have no links between them and can step in parallel
+
+    components = []             # [["fmu_name", ...], ...] FMUs exchanging data both ways, in execution order
+
+    algebraic_loops = []        # [[("fmu_name", "variable_name"), ...], ...] variables of every algebraic loop
+
+    def __init__(self, order, levels, components, algebraic_loops):
+        self.order = order
+        self.levels = levels
+        self.components = components
+        self.algebraic_loops = algebraic_loops
+
+    def has_algebraic_loops(self):
+        return len(self.algebraic_loops) > 0
+
+    def get_loop_fmus(self):
+        """
+        Returns the set of FMU names taking part in an algebraic loop.
+        """
+        return {fmu_name for loop in self.algebraic_loops for fmu_name, variable_name in loop}
+
+    def print_summary(self):
+        print(f"Execution order: {' -> '.join(self.order)}")
+        for component in self.components:
+            if len(component) > 1:
+                print(f"Coupled both ways: {component}")
+        for loop in self.algebraic_loops:
+            print("Warning: algebraic loop through direct feedthrough between:")
+            print("    " + ", ".join(f"({fmu_name}) {variable_name}" for fmu_name, variable_name in loop))
+
+
+def analyze_coupling(fmu_objects, connections):
+    """
+    Analyzes the links of connections (ConnectionGraph) between fmu_objects ({"fmu_name" : FMUObject}).
+    Returns a CouplingAnalysis.
+    """
+    fmu_names = list(fmu_objects)
+
+    fmu_edges = {}                          # {"fmu_name" : ["fmu_name", ...]}
+    variable_edges = {}                     # {("fmu_name", "variable_name") : [("fmu_name", "variable_name"), ...]}
+    for out_fmu, out_name, in_fmu, in_name in connections:
+        if out_fmu not in fmu_objects or in_fmu not in fmu_objects:
+            continue
+        targets = fmu_edges.setdefault(out_fmu, [])
+        if in_fmu not in targets:
+            targets.append(in_fmu)
+        variable_edges.setdefault((out_fmu, out_name), []).append((in_fmu, in_name))
+
+    # feedthrough edges are only needed for the outputs that are linked
+    linked_inputs = {(in_fmu, in_name) for out_fmu, out_name, in_fmu, in_name in connections}
+    for out_fmu, out_name in list(variable_edges):
+        for in_name in fmu_objects[out_fmu].metadata.get_feedthrough(out_name):
+            if (out_fmu, in_name) in linked_inputs:
+                variable_edges.setdefault((out_fmu, in_name), []).append((out_fmu, out_name))
+
+    components = strongly_connected_components(fmu_names, fmu_edges)
+
+    # level of a component: one more than the highest level of the components it gets data from
+    component_of = {fmu_name: position for position, component in enumerate(components) for fmu_name in component}
+    component_levels = [0] * len(components)
+    for position, component in enumerate(components):
+        for fmu_name in component:
+            for target in fmu_edges.get(fmu_name, ()):
+                target_position = component_of[target]
+                if target_position != position:
+                    component_levels[target_position] = max(component_levels[target_position], component_levels[position] + 1)
+
+    levels = [[] for level in range(max(component_levels, default=-1) + 1)]
+    for position, component in enumerate(components):
+        levels[component_levels[position]].extend(component)
+
+    order = [fmu_name for component in components for fmu_name in sorted(component, key=fmu_names.index)]
+
+    variables = list(variable_edges)
+    algebraic_loops = [component for component in strongly_connected_components(variables, variable_edges)
+                       if is_cycle(component, variable_edges)]
+
+    return CouplingAnalysis(order, levels, components, algebraic_loops)
@@ -0,0 +1,434 @@
+import os
+from collections import OrderedDict
+import numpy as np
+from fmu_cache import file_hash
+from runSim.input_formats import read_data_columns, read_data_file, get_data_files, iter_data_chunks, is_mapped
+
+"""
+Input data of the FMUs: parsing data files once into an InputStore, and aligning them for the Master input object.
+Very long data files can be streamed instead (StreamingInput), the Master input is then a function of time.
+
+Every data source is a (times, values) pair: times is a 1D array and values is a (rows, columns) array.
+Sources are aligned on the union of their time points and written into one contiguous float64 matrix
+shaped (grid rows, 1 + columns), time first, which is the layout pyFMI's Master expects for input.
+"""
+# "hold" keeps the last value until the next time point of the source (zero order hold), the aligned matrix then
+# repeats the time point of every change (see hold_steps) so the Master's linear interpolation still holds it
+# "linear" interpolates between the time points of the source
+# before the first and after the last time point of a source both rules hold the nearest value
+FILL_METHODS = ["hold", "linear"]
+
+# rows read at once from a data file by the streaming input, the memory used per file stays at about this many rows
+DEFAULT_CHUNK_ROWS = 8192
+
+
+def fill_missing(values):
+    """
+    Replaces NaNs (empty csv cells) in every column with the previous value of that column,
+    leading NaNs take the first value of the column. Columns without any value stay NaN.
+    """
+    missing = np.isnan(values)
+    if not missing.any():
+        return values
+
+    rows = np.arange(values.shape[0])[:, None]
+    columns = np.arange(values.shape[1])[None, :]
+
+    # index of the last valid row at or before each row, forward fill
+    last_valid = np.maximum.accumulate(np.where(missing, 0, rows), axis=0)
+    filled = values[last_valid, columns]
+
+    # rows before the first valid value of a column take that first value
+    first_valid = np.argmax(~missing, axis=0)
+    leading = rows < first_valid[None, :]
+    filled = np.where(leading, values[first_valid, columns[0]][None, :], filled)
+    return filled
+
+
+def sort_source(times, values):
+    """
+    Returns the source as float64 arrays sorted by time (stable, so repeated time points keep their file order).
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64).reshape(len(times), -1)
+    if len(times) > 1 and np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind="stable")
+        times, values = times[order], values[order]
+    return times, values
+
+
+def union_time_grid(sources):
+    """
+    Returns the sorted unique time points of every source.
+    Sources sharing the same time points (usually every file of one export) only enter the sort once.
+    """
+    distinct = []
+    for times, values in sources:
+        if not any(len(times) == len(seen) and np.array_equal(times, seen) for seen in distinct):
+            distinct.append(times)
+    if len(distinct) == 1:
+        return np.unique(distinct[0])
+    return np.unique(np.concatenate(distinct))
+
+
+def grid_index(grid, times):
+    """
+    Returns, for every grid point, the last row of times at or before it (-1 before the first row).
+    """
+    return np.searchsorted(times, grid, side="right") - 1
+
+
+def align_source(out, grid, times, values, fill = "hold", index = None):
+    """
+    Writes one source, aligned on grid, into out (a (len(grid), columns) view of the master matrix).
+    index is the source's grid_index, sources sharing their time points can share it.
+    """
+    if len(times) == len(grid) and index is None:
+        out[:] = values                                                 # the source already is on the grid
+        return
+    if len(times) == 1:
+        out[:] = values[0]
+        return
+
+    if index is None:
+        index = grid_index(grid, times)
+    if fill == "hold":
+        # rows before the first time point use row 0
+        out[:] = values[np.clip(index, 0, len(times) - 1)]
+        return
+
+    index = np.clip(index, 0, len(times) - 2)
+    t0 = times[index]
+    dt = times[index + 1] - t0
+    # repeated time points (dt == 0) jump straight to the later value
+    weight = np.divide(grid - t0, dt, out=np.ones_like(grid), where=dt > 0)
+    np.clip(weight, 0.0, 1.0, out=weight)
+
+    v0 = values[index]
+    block = values[index + 1] - v0
+    block *= weight[:, None]
+    block += v0
+    out[:] = block
+
+
+def hold_steps(matrix):
+    """
+    Returns the held matrix as steps: every row whose values change is preceded by a row at the same time
+    carrying the previous values. Interpolating it linearly (pyFMI's Master, TableInput) then holds the
+    previous values up to each time point and takes the new ones from it on.
+    """
+    if len(matrix) < 2:
+        return matrix
+    before, after = matrix[:-1, 1:], matrix[1:, 1:]
+    same = (before == after) | (np.isnan(before) & np.isnan(after))
+    changed = np.flatnonzero(~same.all(axis=1)) + 1
+    if len(changed) == 0:
+        return matrix
+
+    steps = matrix[changed - 1]
+    steps[:, 0] = matrix[changed, 0]
+    return np.insert(matrix, changed, steps, axis=0)
+
+
+def linear_steps(matrix, sources):
+    """
+    Returns the linearly filled matrix with the steps of the sources kept: a source repeating a time point
+    jumps there, so each such time point gets a row before its grid row with the values the sources reach it with.
+    """
+    steps = np.unique(np.concatenate([times[1:][times[1:] == times[:-1]] for times, values in sources]))
+    if len(steps) == 0:
+        return matrix
+
+    left = np.empty((len(steps), matrix.shape[1]), dtype=np.float64)
+    left[:, 0] = steps
+    column = 1
+    for times, values in sources:
+        stop = column + values.shape[1]
+        # the row before the first row at each step, instead of the last row at it
+        index = np.searchsorted(times, steps, side="left") - 1
+        align_source(left[:, column:stop], steps, times, values, "linear", index)
+        left[index < 0, column:stop] = values[0]
+        column = stop
+    return np.insert(matrix, np.searchsorted(matrix[:, 0], steps), left, axis=0)
+
+
+def align_sources(sources, fill = "hold"):
+    """
+    Aligns every (times, values) source on the union time grid.
+    Returns the (rows, 1 + columns) float64 matrix with time in column 0, columns in source order, with the
+    steps of hold_steps ("hold") or linear_steps ("linear") added, so it interpolates like the sources.
+    Raises ValueError for an unknown fill or an empty source.
+    """
+    if fill not in FILL_METHODS:
+        raise ValueError(f"Input fill '{fill}' doesn't exist, options are: {FILL_METHODS}")
+
+    sorted_sources = []
+    for times, values in sources:
+        if len(times) == 0:
+            raise ValueError("An input data source has no rows.")
+        times, values = sort_source(times, values)
+        sorted_sources.append((times, fill_missing(values)))
+
+    grid = union_time_grid(sorted_sources)
+    n_columns = sum(values.shape[1] for times, values in sorted_sources)
+
+    matrix = np.empty((len(grid), 1 + n_columns), dtype=np.float64)
+    matrix[:, 0] = grid
+    column = 1
+    indexes = []                                                        # [(times, grid_index)] of the time points seen so far
+    for times, values in sorted_sources:
+        stop = column + values.shape[1]
+        index = None
+        # a source on exactly the grid's time points is copied as is, otherwise the search is done once per distinct times
+        if len(times) != len(grid) or not np.array_equal(times, grid):
+            for seen, seen_index in indexes:
+                if len(seen) == len(times) and np.array_equal(seen, times):
+                    index = seen_index
+                    break
+            else:
+                index = grid_index(grid, times)
+                indexes.append((times, index))
+        align_source(matrix[:, column:stop], grid, times, values, fill, index)
+        column = stop
+
+    if fill == "hold":
+        return hold_steps(matrix)
+    return linear_steps(matrix, sorted_sources)
+
+
+class InputSource:
+    """
+    One data file of an FMU.
+    inputs is the set of columns this file currently gives to the FMU.
+    With stream = True only the column names are read, the data is parsed by the first run that needs it in memory.
+    """
+    def __init__(self, data_path, stream = False):
+        self.data_path = data_path
+        self.inputs = set()
+        self.times = None
+        self.values = None
+        if stream:
+            self.columns = read_data_columns(data_path)
+            self.column_index = {name: index for index, name in enumerate(self.columns)}
+        else:
+            self.load()
+
+    def get_stamp(self):
+        # (mtime, size) of every file the data is read from, a sidecar schema and its data file both count
+        stamp = []
+        for path in get_data_files(self.data_path):
+            stat = os.stat(path)
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+        return stamp
+
+    def get_hash(self):
+        return [file_hash(path) for path in get_data_files(self.data_path)]
+
+    def load(self):
+        self.stamp = self.get_stamp()
+        self.columns, self.times, self.values = read_data_file(self.data_path)
+        self.column_index = {name: index for index, name in enumerate(self.columns)}
+        # memory-mapped files are cheaper to map again than to hash, so they are never hashed
+        self.file_hash = None if is_mapped(self.data_path) else self.get_hash()
+
+    def refresh(self):
+        """
+        Re-parses the file if its content changed since it was loaded (or it was never loaded), returns True if it was parsed.
+        A new mtime with the same content hash (a file that was only touched or copied over) isn't re-parsed.
+        """
+        if self.values is None:
+            self.load()
+            return True
+        stamp = self.get_stamp()
+        if stamp == self.stamp:
+            return False
+        if self.file_hash is not None and self.get_hash() == self.file_hash:
+            self.stamp = stamp
+            return False
+        self.load()
+        return True
+
+    def get_header(self):
+        """
+        Returns the columns given to the FMU in file order.
+        Raises ValueError if one of them isn't in the file anymore.
+        """
+        missing = [name for name in self.inputs if name not in self.column_index]
+        if missing:
+            raise ValueError(f"{missing} are no longer columns of {self.data_path}")
+        return [name for name in self.columns if name in self.inputs]
+
+    def get_source(self):
+        """
+        Returns (header, times, values) of the columns given to the FMU.
+        """
+        header = self.get_header()
+        if len(header) == len(self.columns):
+            return header, self.times, self.values
+        return header, self.times, self.values[:, [self.column_index[name] for name in header]]
+
+    def get_stream(self, fill = "hold", chunk_rows = DEFAULT_CHUNK_ROWS):
+        """
+        Returns (header, ChunkedSourceReader) reading the columns given to the FMU straight from the file.
+        """
+        self.columns = read_data_columns(self.data_path)
+        self.column_index = {name: index for index, name in enumerate(self.columns)}
+        header = self.get_header()
+        return header, ChunkedSourceReader(self.data_path, header, fill, chunk_rows)
+
+
+class ChunkedSourceReader:
+    """
+    Reads one data file in chunks of chunk_rows rows and keeps a sliding window of it in memory:
+    the last row of the previous chunk and the current chunk, so every time inside the window has
+    the rows before and after it. value_at moves the window forward, which is all a run ever needs.
+    Time must be increasing inside the file.
+    """
+    def __init__(self, data_path, header, fill = "hold", chunk_rows = DEFAULT_CHUNK_ROWS):
+        self.data_path = data_path
+        self.header = header
+        self.fill = fill
+        self.chunk_rows = max(2, int(chunk_rows))
+        self.value = np.empty(len(header), dtype=np.float64)
+        self.restart()
+
+    def restart(self):
+        self.chunks = iter_data_chunks(self.data_path, self.header, self.chunk_rows)
+        self.times = np.empty(0, dtype=np.float64)
+        self.values = np.empty((0, len(self.header)), dtype=np.float64)
+        self.done = False
+        self.next_chunk()
+        if len(self.times) == 0:
+            raise ValueError(f"{self.data_path} has no rows.")
+        self.at_start = True                                            # the window still holds the first row of the file
+
+    def next_chunk(self):
+        """
+        Slides the window to the next chunk, keeping the last row of the current one. Returns False at the end of the file.
+        """
+        try:
+            times, values = next(self.chunks)
+        except StopIteration:
+            self.done = True
+            return False
+
+        if len(self.times):
+            times = np.concatenate((self.times[-1:], times))
+            values = np.concatenate((self.values[-1:], values))
+        if np.any(times[1:] < times[:-1]):
+            raise ValueError(f"time of {self.data_path} must be increasing to stream it.")
+
+        self.times = times
+        self.values = fill_missing(values)
+        self.at_start = False
+        return True
+
+    def value_at(self, time):
+        """
+        Returns the (filled) values of the header's columns at time.
+        """
+        if time < self.times[0] and not self.at_start:
+            self.restart()                                              # only happens if a run goes back in time
+        # at the last time of the window the next chunk may repeat it (a step), its last row is the value there
+        while time >= self.times[-1] and not self.done:
+            self.next_chunk()
+
+        times = self.times
+        index = np.searchsorted(times, time, side="right") - 1
+        if index < 0:
+            self.value[:] = self.values[0]
+        elif index >= len(times) - 1 or self.fill == "hold":
+            self.value[:] = self.values[index]
+        else:
+            dt = times[index + 1] - times[index]
+            weight = (time - times[index]) / dt if dt > 0 else 1.0
+            self.value[:] = self.values[index] + weight * (self.values[index + 1] - self.values[index])
+        return self.value
+
+
+class InputStore:
+    """
+    Parsed input data of one FMU. Every data file is parsed once when it is added,
+    runs only re-parse files whose content changed.
+    """
+    def __init__(self):
+        self.sources = OrderedDict()        # {"data_path" : InputSource} in the order the files were added
+        self.owners = {}                    # {"input_name" : "data_path"} the file giving each input
+
+    def load(self, data_path, stream = False):
+        """
+        Parses data_path (again if it was added before), returns its InputSource.
+        With stream = True only its column names are read (see InputSource).
+        Raises ValueError or OSError if the file can't be read.
+        """
+        source = InputSource(data_path, stream)
+        if data_path in self.sources:
+            source.inputs = self.sources[data_path].inputs
+            self.sources[data_path] = source
+        return source
+
+    def add(self, source, input_names):
+        """
+        Gives input_names to the FMU from an already loaded source, overriding the file that gave them before.
+        """
+        if not input_names:
+            return
+        self.sources.setdefault(source.data_path, source)
+        for input_name in input_names:
+            self.remove(input_name)
+            self.owners[input_name] = source.data_path
+            source.inputs.add(input_name)
+
+    def remove(self, input_name):
+        """
+        Stops giving input_name from data, a file that gives nothing anymore is dropped.
+        Returns the path of the file that gave it, None if no file did.
+        """
+        data_path = self.owners.pop(input_name, None)
+        if data_path is not None:
+            source = self.sources[data_path]
+            source.inputs.discard(input_name)
+            if not source.inputs:
+                del self.sources[data_path]
+        return data_path
+
+    def get_streams(self, fill = "hold", chunk_rows = DEFAULT_CHUNK_ROWS):
+        """
+        Returns [(header, ChunkedSourceReader), ...] for every file, nothing but the first chunk is read.
+        Raises ValueError or OSError if a file can't be read anymore.
+        """
+        return [source.get_stream(fill, chunk_rows) for source in self.sources.values()]
+
+    def get_paths(self):
+        return list(self.sources.keys())
+
+    def get_sources(self):
+        """
+        Returns [(header, times, values), ...] for every file, re-parsing the files that changed on disk.
+        Raises ValueError or OSError if a file can't be read anymore.
+        """
+        sources = []
+        for source in self.sources.values():
+            source.refresh()
+            sources.append(source.get_source())
+        return sources
+
+
+class StreamingInput:
+    """
+    Callable Master input: returns the value of every input at time t, read from ChunkedSourceReaders.
+    Memory doesn't grow with the length of the data files, only chunk_rows rows per file are kept.
+    """
+    def __init__(self, readers):
+        self.readers = readers
+        self.slices = []
+        start = 0
+        for reader in readers:
+            self.slices.append(slice(start, start + len(reader.header)))
+            start += len(reader.header)
+        self.value = np.empty(start, dtype=np.float64)
+
+    def __call__(self, time):
+        for reader, columns in zip(self.readers, self.slices):
+            self.value[columns] = reader.value_at(time)
+        return self.value.copy()
@@ -0,0 +1,321 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from numpy.lib import recfunctions
+from runSim.result_store import RESULT_FORMAT
+
+# Feather and Parquet inputs need pyarrow, every other format works without it
+try:
+    import pyarrow
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+    ipc = None
+    parquet = None
+
+"""
+Readers for every data file format accepted by add-data. Every format follows the same contract as csv:
+a column named 'time' (seconds, increasing) and one column per input, read as float64.
+
+.csv                text, parsed with pandas
+.npy                structured array, one field per column (memory-mapped)
+.npz                one 1D array per column, keyed by column name
+.feather/.parquet   one column per column (needs pyarrow). Feather files are memory-mapped and their columns
+                    taken as views of the mapped record batches, see read_feather. Parquet is encoded, it
+                    is decoded batch by batch.
+.json               sidecar schema of a raw binary file (memory-mapped), or a co-sim binary result:
+                    {"format" : "raw", "columns" : ["time", "input_name", ...], "data" : "data.bin",
+                     "dtype" : "float64", "layout" : "rows", "offset" : 0}
+                    "data" is relative to the schema, "layout" is "rows" (row after row) or "columns"
+                    (column after column), "dtype"/"layout"/"offset" are optional. "data" may also be a plain 2D .npy.
+Memory-mapped formats are not copied when they are loaded, only the pages a run reads are loaded from disk.
+Streamed (iter_data_chunks), every format but .npz holds at most one chunk in memory: npz members are zip
+entries, they can only be read whole.
+"""
+DATA_FORMATS = [".csv", ".npy", ".npz", ".feather", ".parquet", ".json"]
+
+RAW_FORMAT = "raw"
+
+# formats read as views of the file, loading them again costs next to nothing
+MAPPED_FORMATS = [".npy", ".feather", ".json"]
+
+
+def get_format(data_path):
+    """
+    Returns the extension of data_path, raises ValueError if it isn't an accepted data format.
+    """
+    extension = os.path.splitext(data_path)[1].lower()
+    if extension not in DATA_FORMATS:
+        raise ValueError(f"The file {data_path} is not a supported data format, options are: {DATA_FORMATS}")
+    if extension in [".feather", ".parquet"] and pyarrow is None:
+        raise ValueError(f"Reading {extension} files needs pyarrow. Install it or convert {data_path} to another format.")
+    return extension
+
+
+def check_time_column(data_path, columns):
+    if 'time' not in columns:
+        raise ValueError(f"'time' is a necessary column inside of your data file {data_path}. Please input it as a column.")
+
+
+def load_schema(schema_path):
+    """
+    Returns (schema, data file path) of a .json data file.
+    """
+    with open(schema_path, "r") as file:
+        schema = json.load(file)
+    if schema.get("format") not in [RAW_FORMAT, RESULT_FORMAT] or "data" not in schema or "columns" not in schema:
+        raise ValueError(f"{schema_path} is not a raw data schema or co-sim binary result.")
+    return schema, os.path.join(os.path.dirname(os.path.abspath(schema_path)), schema["data"])
+
+
+def is_mapped(data_path):
+    return get_format(data_path) in MAPPED_FORMATS
+
+
+def get_data_files(data_path):
+    """
+    Returns every file the data of data_path is read from (the schema and its data file for .json).
+    """
+    if get_format(data_path) == ".json":
+        return [data_path, load_schema(data_path)[1]]
+    return [data_path]
+
+
+def read_data_columns(data_path):
+    """
+    Returns the column names other than 'time' of a data file without reading its data.
+    Raises ValueError if the file has no 'time' column.
+    """
+    extension = get_format(data_path)
+    if extension == ".csv":
+        columns = list(pd.read_csv(data_path, nrows=0).columns)
+    elif extension == ".npy":
+        columns = list(np.load(data_path, mmap_mode="r").dtype.names or [])
+    elif extension == ".npz":
+        with np.load(data_path) as npz:
+            columns = list(npz.files)
+    elif extension == ".feather":
+        columns = open_feather(data_path)[1].schema.names
+    elif extension == ".parquet":
+        columns = parquet.read_schema(data_path).names
+    else:
+        columns = list(load_schema(data_path)[0]["columns"])
+
+    check_time_column(data_path, columns)
+    return [name for name in columns if name != 'time']
+
+
+def split_time(data_path, columns, matrix):
+    """
+    Splits a (rows, columns) matrix into (columns other than 'time', times, values), as views when possible.
+    """
+    check_time_column(data_path, columns)
+    time_index = columns.index('time')
+    value_columns = [name for name in columns if name != 'time']
+
+    if time_index == 0:
+        values = matrix[:, 1:]
+    elif time_index == len(columns) - 1:
+        values = matrix[:, :-1]
+    else:
+        values = matrix[:, [index for index in range(len(columns)) if index != time_index]]
+    return value_columns, matrix[:, time_index], values
+
+
+def open_raw(data_path, schema):
+    """
+    Memory-maps the data file of a raw or co-sim result schema as a (rows, columns) matrix (a view for both layouts).
+    """
+    n_columns = len(schema["columns"])
+    data_file = os.path.join(os.path.dirname(os.path.abspath(data_path)), schema["data"])
+    # co-sim binary results are always (columns, rows) float64 .npy files
+    layout = "columns" if schema["format"] == RESULT_FORMAT else schema.get("layout", "rows")
+    if layout not in ["rows", "columns"]:
+        raise ValueError(f"{data_path} has an unknown layout '{layout}', options are: ['rows', 'columns']")
+
+    if os.path.splitext(data_file)[1].lower() == ".npy":
+        matrix = np.load(data_file, mmap_mode="r")
+        if matrix.ndim != 2:
+            raise ValueError(f"{data_file} must be a 2D array.")
+    else:
+        dtype = np.dtype(schema.get("dtype", "float64"))
+        offset = int(schema.get("offset", 0))
+        rows = (os.path.getsize(data_file) - offset) // (dtype.itemsize * n_columns)
+        shape = (rows, n_columns) if layout == "rows" else (n_columns, rows)
+        matrix = np.memmap(data_file, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+    if layout == "columns":
+        matrix = matrix.T
+    if matrix.shape[1] != n_columns:
+        raise ValueError(f"{data_file} has {matrix.shape[1]} columns, its schema names {n_columns}.")
+    return matrix
+
+
+def open_feather(data_path):
+    """
+    Memory-maps a Feather (Arrow IPC) file, returns (mapped file buffer, RecordBatchFileReader).
+    Record batches of uncompressed files are slices of the mapped buffer, nothing is read until it is used.
+    """
+    file_buffer = pyarrow.memory_map(data_path, "r").read_buffer()
+    return file_buffer, ipc.open_file(file_buffer)
+
+
+def batch_columns(batch, names):
+    """
+    Returns the columns names of a record batch as 1D float64 arrays, views of the batch for float64 columns
+    without nulls, converted copies for the others.
+    """
+    arrays = []
+    for name in names:
+        column = batch.column(name)
+        if column.type == pyarrow.float64() and column.null_count == 0:
+            arrays.append(column.to_numpy(zero_copy_only=True))
+        else:
+            arrays.append(column.to_numpy(zero_copy_only=False).astype(np.float64))
+    return arrays
+
+
+def stack_chunk(arrays, start = 0, stop = None):
+    """
+    Returns (times, values) of rows start:stop of the 1D arrays ['time', column, ...], both new arrays.
+    """
+    times = np.array(arrays[0][start:stop], dtype=np.float64)
+    values = np.empty((len(times), len(arrays) - 1), dtype=np.float64)
+    for index, array in enumerate(arrays[1:]):
+        values[:, index] = array[start:stop]
+    return times, values
+
+
+def columns_view(arrays, file_buffer):
+    """
+    Returns a (rows, columns) view over the 1D float64 arrays when they lie evenly spaced inside file_buffer,
+    like the columns of one uncompressed Arrow record batch without nulls do. Returns None otherwise.
+    """
+    if len(arrays) < 2 or len(arrays[0]) == 0:
+        return None
+    rows = len(arrays[0])
+    if any(array.dtype != np.float64 or len(array) != rows or array.strides != (8,) for array in arrays):
+        return None
+    addresses = [array.ctypes.data for array in arrays]
+    stride = addresses[1] - addresses[0]
+    if stride < rows * 8 or any(address - addresses[0] != index * stride for index, address in enumerate(addresses)):
+        return None
+    if addresses[0] < file_buffer.address or addresses[-1] + rows * 8 > file_buffer.address + file_buffer.size:
+        return None
+    return np.lib.stride_tricks.as_strided(arrays[0], shape=(rows, len(arrays)), strides=(8, stride), writeable=False)
+
+
+def read_feather(data_path):
+    """
+    Returns (columns, (rows, columns) matrix) of a Feather file. The matrix is a view of the mapped file when it
+    has one uncompressed record batch of float64 columns without nulls, otherwise the columns are stacked into
+    a new array.
+    """
+    file_buffer, reader = open_feather(data_path)
+    columns = reader.schema.names
+    blocks = []
+    for index in range(reader.num_record_batches):
+        arrays = batch_columns(reader.get_batch(index), columns)
+        view = columns_view(arrays, file_buffer) if reader.num_record_batches == 1 else None
+        blocks.append(view if view is not None else np.column_stack(arrays))
+    if len(blocks) == 1:
+        return columns, blocks[0]
+    return columns, np.concatenate(blocks) if blocks else np.empty((0, len(columns)), dtype=np.float64)
+
+
+def read_data_file(data_path):
+    """
+    Reads a data file into (columns, times, values): the column names other than 'time',
+    the time column and a float64 (rows, columns) array. Memory-mapped formats return views of the file.
+    Raises ValueError if the file has no 'time' column or non numeric data.
+    """
+    extension = get_format(data_path)
+    try:
+        if extension == ".csv":
+            df = pd.read_csv(data_path)
+            columns = list(df.columns)
+            check_time_column(data_path, columns)
+            value_columns = [name for name in columns if name != 'time']
+            return value_columns, df['time'].to_numpy(dtype=np.float64), np.ascontiguousarray(df[value_columns].to_numpy(dtype=np.float64))
+
+        if extension == ".npy":
+            array = np.load(data_path, mmap_mode="r")
+            columns = list(array.dtype.names or [])
+            check_time_column(data_path, columns)
+            # a view when every field is float64, a copy otherwise
+            matrix = recfunctions.structured_to_unstructured(array, dtype=np.float64, copy=False)
+            columns, times, values = split_time(data_path, columns, matrix)
+
+        elif extension == ".npz":
+            with np.load(data_path) as npz:
+                columns = list(npz.files)
+                check_time_column(data_path, columns)
+                value_columns = [name for name in columns if name != 'time']
+                times = np.asarray(npz['time'], dtype=np.float64).ravel()
+                values = np.empty((len(times), len(value_columns)), dtype=np.float64)
+                for index, name in enumerate(value_columns):
+                    values[:, index] = npz[name].ravel()
+            columns = value_columns
+
+        elif extension == ".feather":
+            columns, matrix = read_feather(data_path)
+            columns, times, values = split_time(data_path, columns, matrix)
+
+        elif extension == ".parquet":
+            table = parquet.read_table(data_path, memory_map=True)
+            columns = table.column_names
+            check_time_column(data_path, columns)
+            blocks = [np.column_stack(batch_columns(batch, columns)) for batch in table.to_batches()]
+            matrix = np.concatenate(blocks) if blocks else np.empty((0, len(columns)), dtype=np.float64)
+            columns, times, values = split_time(data_path, columns, matrix)
+
+        else:
+            schema, data_file = load_schema(data_path)
+            columns, times, values = split_time(data_path, list(schema["columns"]), open_raw(data_path, schema))
+
+        return columns, np.asarray(times, dtype=np.float64), np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError, KeyError) as e:
+        raise ValueError(f"{data_path} can't be read as input data: {e}")
+
+
+def iter_data_chunks(data_path, header, chunk_rows):
+    """
+    Yields (times, values) of the header's columns, chunk_rows rows at a time. Only .npz files are read whole,
+    csv and Parquet are parsed chunk by chunk, the other formats are memory-mapped and only a chunk is copied.
+    """
+    extension = get_format(data_path)
+    if extension == ".csv":
+        for chunk in pd.read_csv(data_path, usecols=['time'] + header, chunksize=chunk_rows):
+            yield chunk['time'].to_numpy(dtype=np.float64), chunk[header].to_numpy(dtype=np.float64)
+        return
+
+    if extension == ".parquet":
+        for batch in parquet.ParquetFile(data_path).iter_batches(batch_size=chunk_rows, columns=['time'] + header):
+            yield stack_chunk(batch_columns(batch, ['time'] + header))
+        return
+
+    if extension == ".feather":
+        # record batches are views of the mapped file, only the rows of a chunk are stacked
+        file_buffer, reader = open_feather(data_path)
+        for index in range(reader.num_record_batches):
+            arrays = batch_columns(reader.get_batch(index), ['time'] + header)
+            for start in range(0, len(arrays[0]), chunk_rows):
+                yield stack_chunk(arrays, start, start + chunk_rows)
+        return
+
+    if extension == ".npy":
+        array = np.load(data_path, mmap_mode="r")
+        check_time_column(data_path, list(array.dtype.names or []))
+        for start in range(0, len(array), chunk_rows):
+            chunk = array[start:start + chunk_rows]
+            yield stack_chunk([chunk['time']] + [chunk[name] for name in header])
+        return
+
+    columns, times, values = read_data_file(data_path)
+    column_index = {name: index for index, name in enumerate(columns)}
+    value_indexes = [column_index[name] for name in header]
+    for start in range(0, len(times), chunk_rows):
+        stop = start + chunk_rows
+        yield np.asarray(times[start:stop]), np.asarray(values[start:stop, value_indexes])
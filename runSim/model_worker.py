@@ -0,0 +1,276 @@
+import functools
+import multiprocessing
+import numpy as np
+from multiprocessing import shared_memory
+from collections import OrderedDict
+from pyfmi import exceptions
+from runSim.checkpoint import get_serialized_state, set_serialized_state
+
+"""
+FMUs in worker processes. Every worker loads its own copy of one FMU with pyFMI and runs the calls
+sent to it, so models that hold the GIL while stepping still step at the same time, and an FMU that
+crashes only takes its worker down.
+
+Values don't go through the pipe: the first get/set of an array of value references lays out a shared
+memory region with one slot per value reference and gives it a number, after that the worker reads the FMU
+into it (or sets the FMU from it) and only the region's number is sent per call. Callers that get/set the
+same value references every step keep the SharedRegion (see bind_values) so nothing is looked up per call.
+"""
+# getter/setter -> dtype of its shared memory slots
+SHARED_TYPES = {
+    "get_real": np.float64, "set_real": np.float64,
+    "get_integer": np.int32, "set_integer": np.int32,
+    "get_boolean": np.bool_, "set_boolean": np.bool_,
+}
+
+
+class VariableInfo:
+    """
+    Picklable stand-in for pyFMI's ScalarVariable2, with what the result handlers read.
+    """
+    def __init__(self, value_reference, type, causality):
+        self.value_reference = value_reference
+        self.type = type
+        self.causality = causality
+
+
+def create_region(count, dtype):
+    """
+    Returns (SharedMemory, array view) with count slots of dtype.
+    """
+    memory = shared_memory.SharedMemory(create=True, size=max(1, count * np.dtype(dtype).itemsize))
+    return memory, np.ndarray((count,), dtype=dtype, buffer=memory.buf)
+
+
+def run_worker(fmu_path, connection):
+    """
+    Worker process: loads fmu_path and answers (method, args, kwargs) messages with ("ok", result) or ("error", message).
+    "share" attaches a shared memory region, "read"/"write" get the FMU into it or set the FMU from it.
+    """
+    try:
+        from pyfmi import load_fmu
+        model = load_fmu(fmu_path, kind='CS', log_level=7)
+    except Exception as e:
+        connection.send(("error", f"{type(e).__name__}: {e}"))
+        connection.close()
+        return
+    connection.send(("ok", None))
+
+    regions = {}                            # {region id : (SharedMemory, array view, "method", vr array)}
+    while True:
+        try:
+            method, args, kwargs = connection.recv()
+        except EOFError:
+            break
+        if method == "close":
+            connection.send(("ok", None))
+            break
+        try:
+            result = None
+            if method == "read":
+                memory, values, getter, vrs = regions[args[0]]
+                values[:] = getattr(model, getter)(vrs)
+            elif method == "write":
+                memory, values, setter, vrs = regions[args[0]]
+                getattr(model, setter)(vrs, values)
+            elif method == "share":
+                region_id, name, exchange, vrs = args
+                memory = shared_memory.SharedMemory(name=name)
+                regions[region_id] = (memory, np.ndarray((len(vrs),), dtype=SHARED_TYPES[exchange], buffer=memory.buf), exchange, vrs)
+            elif method == "get_serialized_state":
+                result = get_serialized_state(model)
+            elif method == "set_serialized_state":
+                set_serialized_state(model, *args)
+            elif method == "time":
+                result = model.time
+            elif method == "set_time":
+                model.time = args[0]
+            elif method == "get_model_variables":
+                result = OrderedDict((name, VariableInfo(variable.value_reference, variable.type, variable.causality))
+                                     for name, variable in model.get_model_variables(*args, **kwargs).items())
+            else:
+                result = getattr(model, method)(*args, **kwargs)
+            connection.send(("ok", result))
+        except Exception as e:
+            connection.send(("error", f"{type(e).__name__}: {e}"))
+    # the array views have to be gone before their memory can be closed
+    values = None
+    memories = [region[0] for region in regions.values()]
+    regions.clear()
+    for memory in memories:
+        memory.close()
+    connection.close()
+
+
+class SharedRegion:
+    """
+    Shared memory slots of one getter/setter and array of value references of a ModelProcess (see
+    ModelProcess.get_region). get/set only send the region's id to the worker. Unusable once the worker is closed.
+    """
+    def __init__(self, process, region_id, memory, values):
+        self.process = process
+        self.region_id = region_id
+        self.memory = memory
+        self.values = values
+
+    def get(self):
+        self.process.call("read", self.region_id)
+        return self.values.copy()
+
+    def set(self, values):
+        self.values[:] = values
+        self.process.call("write", self.region_id)
+
+
+def bind_values(model, method, vrs):
+    """
+    Returns method ("get_real", "set_real"...) of model with vrs bound: the SharedRegion's get/set for
+    a ModelProcess, the pyFMI method itself otherwise. Getters are called without arguments, setters with the values.
+    """
+    if isinstance(model, ModelProcess):
+        region = model.get_region(method, vrs)
+        return region.get if method.startswith("get") else region.set
+    return functools.partial(getattr(model, method), vrs)
+
+
+class ModelProcess:
+    """
+    Proxy of a pyFMI model running in its own worker process, any model method can be called on it.
+    start() sends a call without waiting, result() waits for the answer, so many workers can step at once.
+    get_/set_real, _integer and _boolean go through shared memory (see the top of this module).
+    Raises FMUException when the worker reports an error or stops.
+    """
+    def __init__(self, fmu_path, name):
+        self.fmu_path = fmu_path
+        self.name = name
+        self.regions = {}                   # {(method, vr bytes) : SharedRegion}
+        self.start_worker()
+
+    def start_worker(self):
+        context = multiprocessing.get_context("spawn")
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=run_worker, args=(self.fmu_path, child_connection), name=f"fmu-{self.name}", daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.pending = 1                    # the worker answers once the FMU is loaded
+
+    def start(self, method, *args, **kwargs):
+        self.connection.send((method, args, kwargs))
+        self.pending += 1
+
+    def result(self):
+        try:
+            status, value = self.connection.recv()
+        except (EOFError, OSError):
+            self.process.join(timeout=1)
+            self.pending = 0
+            raise exceptions.FMUException(f"The worker process of '{self.name}' stopped (exit code {self.process.exitcode}).")
+        self.pending -= 1
+        if status == "error":
+            raise exceptions.FMUException(f"{self.name}: {value}")
+        return value
+
+    def call(self, method, *args, **kwargs):
+        self.start(method, *args, **kwargs)
+        return self.result()
+
+    def wait_ready(self):
+        while self.pending:
+            self.result()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def restart(self):
+        """
+        Replaces the worker (crashed or not) with a new one that loads the FMU again.
+        """
+        self.close()
+        self.start_worker()
+        self.wait_ready()
+
+    def get_region(self, method, vrs):
+        """
+        Returns the SharedRegion of method and vrs, laid out on first use.
+        """
+        vrs = np.asarray(vrs, dtype=np.uint32).reshape(-1)
+        key = (method, vrs.tobytes())
+        if key not in self.regions:
+            region_id = len(self.regions)
+            memory, values = create_region(len(vrs), SHARED_TYPES[method])
+            try:
+                self.call("share", region_id, memory.name, method, vrs)
+            except exceptions.FMUException:
+                del values
+                memory.close()
+                memory.unlink()
+                raise
+            self.regions[key] = SharedRegion(self, region_id, memory, values)
+        return self.regions[key]
+
+    def get_shared(self, method, vrs):
+        return self.get_region(method, vrs).get()
+
+    def set_shared(self, method, vrs, values):
+        self.get_region(method, vrs).set(values)
+
+    def get_real(self, vrs):
+        return self.get_shared("get_real", vrs)
+
+    def get_integer(self, vrs):
+        return self.get_shared("get_integer", vrs)
+
+    def get_boolean(self, vrs):
+        return self.get_shared("get_boolean", vrs)
+
+    def set_real(self, vrs, values):
+        self.set_shared("set_real", vrs, values)
+
+    def set_integer(self, vrs, values):
+        self.set_shared("set_integer", vrs, values)
+
+    def set_boolean(self, vrs, values):
+        self.set_shared("set_boolean", vrs, values)
+
+    def get_serialized_state(self):
+        return self.call("get_serialized_state")
+
+    def set_serialized_state(self, serialized_state):
+        self.call("set_serialized_state", serialized_state)
+
+    @property
+    def time(self):
+        return self.call("time")
+
+    @time.setter
+    def time(self, time):
+        self.call("set_time", time)
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.call(method, *args, **kwargs)
+
+    def close(self):
+        """
+        Stops the worker, killing it if it doesn't stop by itself, and frees the shared memory.
+        """
+        if self.process.is_alive():
+            try:
+                self.start("close")
+                while self.pending:
+                    self.result()
+            except (exceptions.FMUException, OSError):
+                pass
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+        # the array views have to be gone before their memory can be closed, bound regions may still be referenced
+        regions = list(self.regions.values())
+        self.regions = {}
+        for region in regions:
+            region.values = None
+            region.memory.close()
+            region.memory.unlink()
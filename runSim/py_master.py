@@ -0,0 +1,632 @@
+import os
+import math
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from pyfmi import exceptions
+from runSim.result_store import CSVResultHandler, RecordingFilter
+from runSim.model_worker import ModelProcess, bind_values
+from runSim.checkpoint import get_serialized_state, set_serialized_state, write_checkpoint, read_checkpoint
+from runSim.checkpoint import snapshot_key, load_snapshot, save_snapshot, DEFAULT_SNAPSHOT_CACHE_BYTES
+
+"""
+Co-simulation master written in Python, an alternative to pyFMI's Master with the same contracts:
+the same connections, the same input object (header, matrix or function of time) and the same
+result_handling options ("csv" with result_file_name, "custom" with result_handler).
+
+Every macro step is a Jacobi step: all models step from t to t + h, then every linked output is read
+and written to its inputs. The exchange is planned once when the master is built: value references are
+grouped per model and per type, so a step does one get and one set call per model and type. At the start of
+a run the plans are bound to the runners (bind_values), workers then get only their shared memory region's id.
+
+Multi-rate: a model with a step size of n macro steps only steps every n-th macro step, from t to t + n * h.
+Its outputs are then ahead of the other models, they see them held at its last communication point
+or interpolated between its last two (coupling_interpolation "hold" or "linear").
+
+The models of a Jacobi step don't depend on each other, so they can step at the same time (option execution):
+"serial"     one after the other
+"threads"    in a thread pool, fast when the FMUs release the GIL while stepping
+"processes"  every model in its own worker process (runSim.model_worker) with its own copy of the FMU
+Isolated FMUs (FMUObject.isolated) are already in a worker process and always step at the same time as the others.
+
+Checkpoints: with checkpoint_interval (seconds of simulation time) and checkpoint_dir, the FMU states, coupling
+buffers and result file sizes are saved every checkpoint_interval (see runSim/checkpoint.py), at macro steps
+where every model is at the same time. A run with option resume (a checkpoint directory) continues from there.
+
+Snapshots: with snapshot_context (what the run's initial state depends on, see runSim.get_snapshot_context) the
+states right after initialization, or after warmup_time seconds stepped without recording, are cached on disk.
+A later run with the same context and options restores them instead of initializing and warming up again.
+"""
+# FMI type of a variable -> (getter, setter) of the pyFMI model
+EXCHANGE_TYPES = {
+    "Real": ("get_real", "set_real"),
+    "Integer": ("get_integer", "set_integer"),
+    "Enumeration": ("get_integer", "set_integer"),
+    "Boolean": ("get_boolean", "set_boolean"),
+}
+
+# how the outputs of slower models are seen between their communication points (multi-rate runs)
+COUPLING_INTERPOLATIONS = ["hold", "linear"]
+
+# during initialization, coupled outputs are exchanged at most this many times to settle algebraic loops
+DEFAULT_LOOP_ITERATIONS = 10
+
+# how the models of one macro step are stepped
+EXECUTION_MODES = ["serial", "threads", "processes"]
+
+
+class TableInput:
+    """
+    Input function of a (rows, 1 + inputs) matrix with time in column 0, interpolated linearly like pyFMI's
+    Master does and held constant before the first and after the last time point.
+    """
+    def __init__(self, matrix):
+        self.times = np.ascontiguousarray(matrix[:, 0])
+        self.values = matrix[:, 1:]
+
+    def __call__(self, time):
+        index = int(np.searchsorted(self.times, time, side="right"))
+        if index == 0:
+            return self.values[0]
+        if index >= len(self.times):
+            return self.values[-1]
+        t0, t1 = self.times[index - 1], self.times[index]
+        weight = (time - t0) / (t1 - t0)
+        return self.values[index - 1] + weight * (self.values[index] - self.values[index - 1])
+
+
+def group_by_type(model_variables, index, fmu_obj, slots, names):
+    """
+    Adds names (with their buffer slots) of fmu_obj, the model at index, to model_variables ({(index, "type") : ([vr, ...], [slot, ...])}).
+    Raises ValueError for variables that can't be exchanged.
+    """
+    catalog = fmu_obj.metadata.get_catalog()
+    for slot, name in zip(slots, names):
+        attributes = catalog.get_attributes(name)
+        var_type = attributes["type"] if attributes is not None else ""
+        if var_type not in EXCHANGE_TYPES:
+            raise ValueError(f"'{name}' of '{fmu_obj.name}' is a {var_type or 'unknown'} variable, the Python master can't exchange it.")
+        vrs, model_slots = model_variables.setdefault((index, var_type), ([], []))
+        vrs.append(fmu_obj.metadata.get_value_reference(name))
+        model_slots.append(slot)
+
+
+def to_plan(model_variables):
+    """
+    Turns grouped variables into [("type", model index, vr array, slot array), ...].
+    """
+    return [(var_type, index, np.array(vrs, dtype=np.uint32), np.array(slots, dtype=np.intp))
+            for (index, var_type), (vrs, slots) in model_variables.items()]
+
+
+def plan_of(plan, index):
+    return [step for step in plan if step[1] == index]
+
+
+class PythonMaster:
+    """
+    Built from the FMUObjects in execution order and the workspace's ConnectionGraph.
+    coupling (CouplingAnalysis) is optional, with algebraic loops the initial exchange is repeated until it settles.
+    """
+    def __init__(self, fmu_objects, connections, coupling = None):
+        self.fmu_objects = fmu_objects
+        self.models = [fmu_obj.loaded_fmu for fmu_obj in fmu_objects]
+        self.runners = list(self.models)        # what is called for every model, a ModelProcess with "processes" execution
+        self.coupling = coupling
+        fmu_index = {fmu_obj.name: index for index, fmu_obj in enumerate(fmu_objects)}
+
+        # one buffer slot per linked output, an output feeding several inputs is only read once
+        slots = {}                              # {("fmu_name", "output_name") : slot}
+        outputs = {}                            # {(model index, "type") : ([vr, ...], [slot, ...])}
+        inputs = {}
+        for out_fmu, out_name, in_fmu, in_name in connections:
+            if out_fmu not in fmu_index or in_fmu not in fmu_index:
+                raise ValueError(f"Link ({out_fmu}) {out_name} -> ({in_fmu}) {in_name} has an FMU that isn't loaded.")
+            out_index, in_index = fmu_index[out_fmu], fmu_index[in_fmu]
+            if (out_fmu, out_name) not in slots:
+                slots[(out_fmu, out_name)] = len(slots)
+                group_by_type(outputs, out_index, fmu_objects[out_index], [slots[(out_fmu, out_name)]], [out_name])
+            group_by_type(inputs, in_index, fmu_objects[in_index], [slots[(out_fmu, out_name)]], [in_name])
+
+        # current and previous value of every slot, with the model time they were read at
+        self.buffer = np.zeros(len(slots), dtype=np.float64)
+        self.previous = np.zeros(len(slots), dtype=np.float64)
+        self.slot_times = np.zeros(len(slots), dtype=np.float64)
+        self.previous_times = np.zeros(len(slots), dtype=np.float64)
+        self.get_plan = to_plan(outputs)
+        self.set_plan = to_plan(inputs)
+
+        # [(set plan, get plan), ...] per model in execution order
+        self.model_plans = [(plan_of(self.set_plan, index), plan_of(self.get_plan, index)) for index in range(len(self.models))]
+
+        self.input_plans = [[] for model in self.models]
+        self.input_function = None
+
+    def bind_plan(self, plan, side):
+        """
+        Returns [("type", bound getter (side 0) or setter (side 1), slot/column array), ...] of plan on the runners.
+        """
+        return [(var_type, bind_values(self.runners[index], EXCHANGE_TYPES[var_type][side], vrs), slots)
+                for var_type, index, vrs, slots in plan]
+
+    def bind_plans(self):
+        """
+        Binds the plans to the runners of this run (see start_runners), done at the start of run.
+        """
+        self.bound_get_plan = self.bind_plan(self.get_plan, 0)
+        self.bound_model_plans = [(self.bind_plan(set_plan, 1), self.bind_plan(get_plan, 0)) for set_plan, get_plan in self.model_plans]
+        self.bound_input_plans = [self.bind_plan(plan, 1) for plan in self.input_plans]
+
+    def simulate_options(self):
+        return {
+            "step_size": 0.01,
+            "step_sizes": {},
+            "coupling_interpolation": "hold",
+            "initialize": True,
+            "result_handling": "csv",
+            "result_handler": {},
+            "result_file_name": {},
+            "filter": {},
+            "result_downsampling_factor": 1,
+            "loop_iterations": DEFAULT_LOOP_ITERATIONS,
+            "execution": "serial",
+            "num_workers": 0,
+            "parameters": {},
+            "checkpoint_interval": 0.0,
+            "checkpoint_dir": "",
+            "resume": "",
+            "warmup_time": 0.0,
+            "snapshot_context": None,
+            "snapshot_cache_bytes": DEFAULT_SNAPSHOT_CACHE_BYTES,
+        }
+
+    def set_input(self, input_object):
+        """
+        Plans how the input object (header [(model, "input_name"), ...], matrix or function of time) is set.
+        """
+        self.input_plans = [[] for model in self.models]
+        self.input_function = None
+        if input_object is None:
+            return
+
+        header, data = input_object
+        model_index = {id(model): index for index, model in enumerate(self.models)}
+        inputs = {}
+        for column, (model, input_name) in enumerate(header):
+            index = model_index[id(model)]
+            group_by_type(inputs, index, self.fmu_objects[index], [column], [input_name])
+        plan = to_plan(inputs)
+        self.input_plans = [plan_of(plan, index) for index in range(len(self.models))]
+        self.input_function = data if callable(data) else TableInput(np.asarray(data, dtype=np.float64))
+
+    def set_inputs(self, time, indexes):
+        """
+        Sets the input data at time of the models at indexes.
+        """
+        if self.input_function is None:
+            return
+        values = np.asarray(self.input_function(time), dtype=np.float64)
+        for index in indexes:
+            for var_type, setter, columns in self.bound_input_plans[index]:
+                setter(cast(values[columns], var_type))
+
+    def get_outputs(self, plan, time):
+        """
+        Reads the linked outputs of plan (bound, see bind_plan), read at the models' time.
+        """
+        for var_type, getter, slots in plan:
+            self.previous[slots] = self.buffer[slots]
+            self.previous_times[slots] = self.slot_times[slots]
+            self.buffer[slots] = getter()
+            self.slot_times[slots] = time
+
+    def set_coupled_inputs(self, plan, values):
+        for var_type, setter, slots in plan:
+            setter(cast(values[slots], var_type))
+
+    def get_coupled_values(self, time, interpolation = "hold"):
+        """
+        Returns the value of every slot at time. Slower models step ahead of time, between their
+        communication points their outputs are held ("hold") or interpolated ("linear").
+        """
+        if interpolation == "linear":
+            span = self.slot_times - self.previous_times
+            weight = np.divide(time - self.previous_times, span, out=np.ones_like(span), where=span > 0)
+            np.clip(weight, 0.0, 1.0, out=weight)
+            return self.previous + weight * (self.buffer - self.previous)
+        reached = self.slot_times <= time + 1e-9 * max(1.0, abs(time))
+        return np.where(reached, self.buffer, self.previous)
+
+    def exchange_in_order(self, time):
+        """
+        Sets the inputs and then reads the outputs of one model after the other in execution order,
+        so outputs with direct feedthrough already see the inputs set from the models before them.
+        """
+        for set_plan, get_plan in self.bound_model_plans:
+            self.set_coupled_inputs(set_plan, self.buffer)
+            self.get_outputs(get_plan, time)
+
+    def initialize(self, start_time, final_time, loop_iterations, stop_time_defined = True):
+        for runner in self.runners:
+            runner.setup_experiment(start_time=start_time, stop_time_defined=stop_time_defined, stop_time=final_time)
+            runner.enter_initialization_mode()
+
+        self.set_inputs(start_time, range(len(self.models)))
+        self.get_outputs(self.bound_get_plan, start_time)
+        iterations = loop_iterations if self.coupling is not None and self.coupling.has_algebraic_loops() else 1
+        for iteration in range(max(1, iterations)):
+            previous = self.buffer.copy()
+            self.exchange_in_order(start_time)
+            if iteration > 0 and np.allclose(previous, self.buffer, rtol=1e-10, atol=1e-12):
+                break
+
+        for runner in self.runners:
+            runner.exit_initialization_mode()
+
+    def get_rates(self, options):
+        """
+        Returns how many macro steps (options["step_size"]) every model's step lasts, from options["step_sizes"] ({model : step size}).
+        Raises ValueError if a step size isn't a whole multiple of the macro step.
+        """
+        step_size = options["step_size"]
+        rates = []
+        for fmu_obj, model in zip(self.fmu_objects, self.models):
+            model_step = options.get("step_sizes", {}).get(model, step_size)
+            rate = int(round(model_step / step_size))
+            if rate < 1 or abs(rate * step_size - model_step) > 1e-9 * model_step:
+                raise ValueError(f"The step size {model_step} of '{fmu_obj.name}' isn't a whole multiple of the macro step {step_size}.")
+            rates.append(rate)
+        return rates
+
+    def create_result_handlers(self, options):
+        """
+        Returns {model : result handler} following the result_handling option.
+        """
+        if options["result_handling"] == "custom":
+            return dict(options["result_handler"])
+        if options["result_handling"] != "csv":
+            raise ValueError(f"The Python master can't use result_handling '{options['result_handling']}', options are: ['csv', 'custom']")
+
+        handlers = {}
+        for model, runner in zip(self.models, self.runners):
+            result_path = options["result_file_name"].get(model)
+            if result_path is None:
+                continue
+            recording = RecordingFilter(options["filter"].get(model), options["result_downsampling_factor"])
+            handlers[model] = CSVResultHandler(runner, result_path, recording)
+        return handlers
+
+    def start_runners(self, options):
+        """
+        Prepares options["execution"]. Returns the thread pool of "threads" execution, None otherwise.
+        "processes" starts one worker per model, sets options["parameters"] ({model : {"name" : value}}) on them
+        and moves custom result handlers of the models to their workers.
+        Raises ValueError for an unknown execution, FMUException if a worker can't load its FMU.
+        """
+        execution = options.get("execution", "serial")
+        if execution not in EXECUTION_MODES:
+            raise ValueError(f"Execution '{execution}' doesn't exist, options are: {EXECUTION_MODES}")
+        num_workers = options.get("num_workers") or min(len(self.models), os.cpu_count() or 1)
+
+        if execution == "threads":
+            return ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="fmu-step")
+        if execution != "processes":
+            return None
+        if not options["initialize"]:
+            raise ValueError("Execution 'processes' loads new copies of the FMUs, they have to be initialized by the master.")
+
+        # isolated FMUs already run in a worker process
+        self.runners = [model if isinstance(model, ModelProcess) else ModelProcess(fmu_obj.fmu_path, fmu_obj.name)
+                        for fmu_obj, model in zip(self.fmu_objects, self.models)]
+        for runner in self.runners:
+            runner.wait_ready()
+        for model, runner in self.started_runners():
+            for name, value in options.get("parameters", {}).get(model, {}).items():
+                runner.set(name, value)
+            handler = options["result_handler"].get(model) if options["result_handling"] == "custom" else None
+            if handler is not None and getattr(handler, "model", None) is model:
+                handler.model = runner
+        return None
+
+    def started_runners(self):
+        """
+        Returns [(model, worker), ...] of the workers started by start_runners.
+        """
+        return [(model, runner) for model, runner in zip(self.models, self.runners) if runner is not model]
+
+    def stop_runners(self, options, pool):
+        if pool is not None:
+            pool.shutdown()
+        for model, runner in self.started_runners():
+            handler = options["result_handler"].get(model) if options["result_handling"] == "custom" else None
+            if handler is not None and getattr(handler, "model", None) is runner:
+                handler.model = model
+            runner.close()
+        self.runners = list(self.models)
+
+    def step_models(self, indexes, time, steps, pool):
+        """
+        Steps the models at indexes from time by steps. Models in worker processes all step at once,
+        the others too if there is a pool.
+        Raises FMUException if a model fails its step, once every model has finished.
+        """
+        statuses = {}
+        in_process = [(index, step) for index, step in zip(indexes, steps) if isinstance(self.runners[index], ModelProcess)]
+        in_place = [(index, step) for index, step in zip(indexes, steps) if not isinstance(self.runners[index], ModelProcess)]
+        for index, step in in_process:
+            self.runners[index].start("do_step", time, step, True)
+
+        if pool is not None and len(in_place) > 1:
+            futures = [(index, pool.submit(self.runners[index].do_step, time, step, True)) for index, step in in_place]
+            for index, future in futures:
+                try:
+                    statuses[index] = future.result()
+                except Exception as e:
+                    statuses[index] = e
+        else:
+            for index, step in in_place:
+                try:
+                    statuses[index] = self.runners[index].do_step(time, step, True)
+                except Exception as e:
+                    statuses[index] = e
+
+        for index, step in in_process:
+            try:
+                statuses[index] = self.runners[index].result()
+            except exceptions.FMUException as e:
+                statuses[index] = e
+
+        for index in indexes:
+            status = statuses[index]
+            if isinstance(status, Exception):
+                raise status
+            if status not in (0, 1, None):          # fmi2OK, fmi2Warning
+                raise exceptions.FMUException(f"do_step of '{self.fmu_objects[index].name}' failed at time {time} with status {status}.")
+
+    def get_unserializable(self):
+        return [fmu_obj.name for fmu_obj in self.fmu_objects if not fmu_obj.metadata.can_serialize_state()]
+
+    def get_checkpoint_interval(self, options, handlers):
+        """
+        Returns the seconds between checkpoints, 0 when checkpoints are off or can't be written.
+        """
+        interval = options.get("checkpoint_interval") or 0
+        if interval <= 0 or not options.get("checkpoint_dir"):
+            return 0
+        unsupported = self.get_unserializable()
+        if unsupported:
+            print(f"Warning: FMUs {unsupported} can't serialize their state, no checkpoints are written.")
+            return 0
+        if not all(hasattr(handler, "checkpoint") for handler in handlers.values()):
+            print("Warning: these result handlers can't be checkpointed, no checkpoints are written.")
+            return 0
+        return interval
+
+    def capture_states(self):
+        """
+        Returns ({"fmu_name" : serialized state}, {"name" : copy of a coupling buffer}).
+        """
+        states = {}
+        for fmu_obj, runner in zip(self.fmu_objects, self.runners):
+            states[fmu_obj.name] = runner.get_serialized_state() if isinstance(runner, ModelProcess) else get_serialized_state(runner)
+        arrays = {"buffer": self.buffer.copy(), "previous": self.previous.copy(),
+                  "slot_times": self.slot_times.copy(), "previous_times": self.previous_times.copy()}
+        return states, arrays
+
+    def restore_states(self, states, arrays, time):
+        for fmu_obj, runner in zip(self.fmu_objects, self.runners):
+            if isinstance(runner, ModelProcess):
+                runner.set_serialized_state(states[fmu_obj.name])
+            else:
+                set_serialized_state(runner, states[fmu_obj.name])
+            set_model_time(runner, time)
+        self.buffer[:] = arrays["buffer"]
+        self.previous[:] = arrays["previous"]
+        self.slot_times[:] = arrays["slot_times"]
+        self.previous_times[:] = arrays["previous_times"]
+
+    def save_checkpoint(self, options, handlers, number, time, tick, start_time, final_time, rates):
+        states, arrays = self.capture_states()
+        info = {
+            "number": number,
+            "time": time,
+            "tick": tick,
+            "start_time": start_time,
+            "final_time": final_time,
+            "step_size": options["step_size"],
+            "step_sizes": {fmu_obj.name: rate * options["step_size"] for fmu_obj, rate in zip(self.fmu_objects, rates)},
+            "results": {fmu_obj.name: handlers[model].checkpoint() for fmu_obj, model in zip(self.fmu_objects, self.models) if model in handlers},
+        }
+        write_checkpoint(options["checkpoint_dir"], info, states, arrays)
+        print(f"Checkpoint saved at time {time}.")
+
+    def get_warmup_ticks(self, options, rates):
+        """
+        Returns the macro steps of options["warmup_time"], rounded up to a step where every model is at the same time.
+        """
+        warmup_time = options.get("warmup_time") or 0
+        if warmup_time <= 0:
+            return 0
+        aligned = math.lcm(*rates)
+        ticks = math.ceil(warmup_time / options["step_size"] - 1e-9)
+        return -(-ticks // aligned) * aligned
+
+    def get_snapshot_key(self, options, start_time, rates, warmup_ticks):
+        """
+        Returns the snapshot cache key of this run, "" when there is no snapshot_context or the states can't be serialized.
+        """
+        if options.get("snapshot_context") is None:
+            return ""
+        unsupported = self.get_unserializable()
+        if unsupported:
+            print(f"Warning: FMUs {unsupported} can't serialize their state, their initialization can't be cached.")
+            return ""
+        return snapshot_key({
+            "context": options["snapshot_context"],
+            "fmus": [fmu_obj.name for fmu_obj in self.fmu_objects],
+            "start_time": start_time,
+            "step_size": options["step_size"],
+            "rates": rates,
+            "warmup_ticks": warmup_ticks,
+            "coupling_interpolation": options.get("coupling_interpolation", "hold"),
+            "loop_iterations": options.get("loop_iterations", DEFAULT_LOOP_ITERATIONS),
+            "stop_time_defined": False,
+        })
+
+    def cache_snapshot(self, key, options, time, tick):
+        states, arrays = self.capture_states()
+        snapshot = {"time": time, "tick": tick, "states": states, "arrays": arrays}
+        if save_snapshot(key, snapshot, options.get("snapshot_cache_bytes", DEFAULT_SNAPSHOT_CACHE_BYTES)):
+            print(f"State at time {time} saved to the snapshot cache.")
+
+    def load_checkpoint(self, options, handlers, rates):
+        """
+        Reads the checkpoint of options["resume"] and hands the result file sizes to the handlers.
+        Returns (info, states, arrays), raises ValueError if the checkpoint doesn't match this run.
+        """
+        try:
+            info, states, arrays = read_checkpoint(options["resume"])
+        except OSError as e:
+            raise ValueError(f"No checkpoint to resume from in {options['resume']}: {e}")
+        names = [fmu_obj.name for fmu_obj in self.fmu_objects]
+        step_sizes = {name: rate * options["step_size"] for name, rate in zip(names, rates)}
+        if sorted(info["states"]) != sorted(names) or any(abs(info["step_sizes"][name] - step_sizes[name]) > 1e-9 * step_sizes[name] for name in names):
+            raise ValueError(f"The checkpoint in {options['resume']} was written with other FMUs or step sizes.")
+        if len(arrays["buffer"]) != len(self.buffer):
+            raise ValueError(f"The checkpoint in {options['resume']} was written with other links.")
+
+        for fmu_obj, model in zip(self.fmu_objects, self.models):
+            if model not in handlers:
+                continue
+            if fmu_obj.name not in info["results"] or not hasattr(handlers[model], "resume"):
+                raise ValueError(f"The result of '{fmu_obj.name}' can't be continued from the checkpoint.")
+            handlers[model].resume(info["results"][fmu_obj.name])
+        return info, states, arrays
+
+    def simulate(self, start_time = 0.0, final_time = 1.0, input = None, options = None):
+        """
+        Runs from start_time to final_time in macro steps of options["step_size"] (the last step may be shorter).
+        Models with a larger step size in options["step_sizes"] only step (and are recorded) every few macro steps.
+        The models of a macro step are stepped following options["execution"] (see EXECUTION_MODES).
+        With options["resume"] the run continues from that checkpoint, start_time is then the start of the original run.
+        Raises FMUException if a model fails a step.
+        """
+        options = options if options is not None else self.simulate_options()
+        interpolation = options.get("coupling_interpolation", "hold")
+        if interpolation not in COUPLING_INTERPOLATIONS:
+            raise ValueError(f"Coupling interpolation '{interpolation}' doesn't exist, options are: {COUPLING_INTERPOLATIONS}")
+        rates = self.get_rates(options)
+        self.set_input(input)
+
+        pool = None
+        try:
+            pool = self.start_runners(options)
+            self.run(start_time, final_time, options, rates, interpolation, pool)
+        finally:
+            self.stop_runners(options, pool)
+
+    def run(self, start_time, final_time, options, rates, interpolation, pool):
+        """
+        The run of simulate, once the runners are started.
+        """
+        step_size = options["step_size"]
+        self.bind_plans()
+        handlers = self.create_result_handlers(options)
+        resume = self.load_checkpoint(options, handlers, rates) if options.get("resume") else None
+        warmup_ticks = self.get_warmup_ticks(options, rates)
+        cache_key = self.get_snapshot_key(options, start_time, rates, warmup_ticks) if resume is None else ""
+        snapshot = load_snapshot(cache_key) if cache_key else None
+        if snapshot is not None and len(snapshot["arrays"]["buffer"]) != len(self.buffer):
+            snapshot = None
+        for handler in handlers.values():
+            handler.set_options(options)
+            handler.simulation_start()
+
+        try:
+            # final_time isn't part of the snapshot key, so FMUs whose state is cached don't get a stop time
+            # a later run with a longer horizon would restore (the master stops the run at final_time itself)
+            stop_time_defined = not cache_key
+            if snapshot is not None:
+                # the snapshot replaces initialization and warm-up
+                for runner in self.runners:
+                    runner.setup_experiment(start_time=start_time, stop_time_defined=stop_time_defined, stop_time=final_time)
+                self.restore_states(snapshot["states"], snapshot["arrays"], snapshot["time"])
+                print(f"Restored the state at time {snapshot['time']} from the snapshot cache.")
+            elif options["initialize"]:
+                self.initialize(start_time, final_time, options.get("loop_iterations", DEFAULT_LOOP_ITERATIONS), stop_time_defined)
+            if resume is not None:
+                info, states, arrays = resume
+                self.restore_states(states, arrays, info["time"])
+            elif snapshot is None:
+                self.previous[:] = self.buffer
+                self.previous_times[:] = self.slot_times
+            for handler in handlers.values():
+                handler.initialize_complete()
+                # a resumed result already has this point, a warm-up is only recorded from its end on
+                if resume is None and (warmup_ticks == 0 or snapshot is not None):
+                    handler.integration_point()
+            if cache_key and snapshot is None and warmup_ticks == 0:
+                self.cache_snapshot(cache_key, options, start_time, 0)
+
+            # checkpoints are only written when every model is at the same time
+            checkpoint_interval = self.get_checkpoint_interval(options, handlers)
+            checkpoint_ticks = math.lcm(*rates)
+            checkpoint_number = info["number"] + 1 if resume is not None else 0
+
+            if resume is not None:
+                tick, time = info["tick"], info["time"]
+            elif snapshot is not None:
+                tick, time = snapshot["tick"], snapshot["time"]
+            else:
+                tick, time = 0, start_time
+            next_checkpoint = time + checkpoint_interval
+            # relative tolerance so the last step isn't a tiny leftover of floating point error
+            end_tolerance = 1e-9 * max(1.0, abs(final_time))
+            while time < final_time - end_tolerance:
+                due = [index for index, rate in enumerate(rates) if tick % rate == 0]
+                values = self.get_coupled_values(time, interpolation)
+                self.set_inputs(time, due)
+                for index in due:
+                    self.set_coupled_inputs(self.bound_model_plans[index][0], values)
+
+                steps = [min(rates[index] * step_size, final_time - time) for index in due]
+                self.step_models(due, time, steps, pool)
+
+                for index, step in zip(due, steps):
+                    end_time = time + step
+                    self.get_outputs(self.bound_model_plans[index][1], end_time)
+                    if self.models[index] in handlers and tick + rates[index] >= warmup_ticks:
+                        handlers[self.models[index]].integration_point()
+
+                tick += 1
+                time = min(start_time + tick * step_size, final_time)
+
+                if cache_key and snapshot is None and tick == warmup_ticks:
+                    self.cache_snapshot(cache_key, options, time, tick)
+
+                if checkpoint_interval and tick % checkpoint_ticks == 0 and next_checkpoint - end_tolerance <= time < final_time - end_tolerance:
+                    self.save_checkpoint(options, handlers, checkpoint_number, time, tick, start_time, final_time, rates)
+                    checkpoint_number += 1
+                    next_checkpoint = time + checkpoint_interval
+
+            for handler in handlers.values():
+                handler.simulation_end()
+        except Exception:
+            for handler in handlers.values():
+                handler.abort()
+            raise
+
+
+def set_model_time(model, time):
+    # pyFMI keeps its own copy of the model time, it doesn't follow a restored FMU state
+    try:
+        model.time = time
+    except (AttributeError, exceptions.FMUException):
+        pass
+
+
+def cast(values, var_type):
+    if var_type == "Real":
+        return values
+    if var_type == "Boolean":
+        return values != 0
+    return np.rint(values).astype(np.int32)
@@ -0,0 +1,444 @@
+import os
+import re
+import json
+import fnmatch
+import threading
+import numpy as np
+from pyfmi.common.io import ResultHandler
+from pyfmi.fmi import FMI2_REAL, FMI2_INTEGER, FMI2_BOOLEAN, FMI2_ENUMERATION
+from runSim.model_worker import bind_values
+
+"""
+Columnar binary result store.
+
+Each FMU's result is saved as two files:
+<name>_result.npy   float64 array shaped (columns, rows), so every variable is one contiguous block
+<name>_result.json  small schema {"format", "version", "columns", "rows", "data"}
+The .npy file can be memory-mapped, so reading one variable never loads the rest of the result.
+"""
+RESULT_FORMAT = "cosim-columnar"
+RESULT_FORMAT_VERSION = 1
+
+# columns are copied from the row file into the column file in blocks of this many columns
+TRANSPOSE_BLOCK = 256
+
+# default number of rows the asynchronous writer can hold before the stepping thread has to wait
+DEFAULT_BUFFER_ROWS = 4096
+
+# FMI2 type -> getter of the model
+GETTERS = {FMI2_REAL: "get_real", FMI2_INTEGER: "get_integer", FMI2_BOOLEAN: "get_boolean"}
+
+
+def is_binary_result(result_path):
+    return os.path.splitext(result_path)[1] == ".json"
+
+
+def load_schema(schema_path):
+    with open(schema_path, "r") as file:
+        schema = json.load(file)
+    if schema.get("format") != RESULT_FORMAT:
+        raise ValueError(f"{schema_path} is not a co-sim binary result.")
+    return schema
+
+
+def open_columns(schema_path):
+    """
+    Returns (schema, memory-mapped (columns, rows) array) of a binary result.
+    """
+    schema = load_schema(schema_path)
+    data_path = os.path.join(os.path.dirname(schema_path), schema["data"])
+    return schema, np.load(data_path, mmap_mode="r")
+
+
+class RecordingFilter:
+    """
+    Decides which variables and which communication points of a model are recorded.
+    patterns:      variable names or glob patterns ("zone*", "T?"), None records every variable
+    every_steps:   record every N-th communication point
+    every_seconds: record at most once every T seconds of simulation time
+    The first communication point is always recorded, and so is the last one (see BinaryResultHandler.simulation_end).
+    """
+    def __init__(self, patterns = None, every_steps = 1, every_seconds = None):
+        self.patterns = patterns
+        self.every_steps = max(1, int(every_steps or 1))
+        self.every_seconds = every_seconds
+        self.names = set()
+        self.regex = None
+        if patterns is not None:
+            self.names = {pattern for pattern in patterns if not any(char in pattern for char in "*?[")}
+            globs = [fnmatch.translate(pattern) for pattern in patterns if pattern not in self.names]
+            if globs:
+                self.regex = re.compile("|".join(globs))
+        self.reset()
+
+    def reset(self):
+        self.steps = 0
+        self.next_time = None
+
+    def is_decimated(self):
+        return self.every_steps > 1 or bool(self.every_seconds)
+
+    def select(self, names):
+        """
+        Returns the names (kept in order) that should be recorded.
+        """
+        if self.patterns is None:
+            return list(names)
+        return [name for name in names if name in self.names or (self.regex is not None and self.regex.match(name))]
+
+    def should_record(self, time):
+        """
+        Called once per communication point, returns True if this point is recorded.
+        """
+        step = self.steps
+        self.steps += 1
+        if step % self.every_steps != 0:
+            return False
+        if self.every_seconds:
+            # a small tolerance so floating point step times don't skip a point
+            if self.next_time is not None and time < self.next_time - 1e-9 * max(1.0, abs(time)):
+                return False
+            self.next_time = time + self.every_seconds
+        return True
+
+
+def open_result_file(file_path, mode, resume_offset = None, **kwargs):
+    """
+    Opens a result file for writing. With resume_offset (its size at a checkpoint) the file is cut there
+    and written on, rows written after the checkpoint are dropped.
+    """
+    if resume_offset is None:
+        return open(file_path, mode, **kwargs)
+    os.truncate(file_path, resume_offset)
+    return open(file_path, mode.replace("w", "a"), **kwargs)
+
+
+class RowWriter:
+    """
+    Writes float64 rows straight to the row file from the stepping thread.
+    """
+    def __init__(self, file_path, n_columns, resume_offset = None, rows = 0):
+        self.file = open_result_file(file_path, "wb", resume_offset, buffering=1024 * 1024)
+        self.row_bytes = n_columns * 8
+        self.rows = rows
+
+    def push(self, row):
+        self.file.write(row.tobytes())
+        self.rows += 1
+
+    def checkpoint(self):
+        """
+        Writes every pushed row to the file, returns the file's size.
+        """
+        self.file.flush()
+        return self.rows * self.row_bytes
+
+    def close(self):
+        self.file.close()
+
+
+class AsyncRowWriter:
+    """
+    Writes float64 rows to the row file from a background thread.
+    The stepping thread only copies each row into a preallocated ring buffer, the writer thread
+    drains the buffer in large batches. When the buffer is full push() waits (back-pressure).
+    Errors of the writer thread are raised on the next push() or on close().
+    """
+    def __init__(self, file_path, n_columns, buffer_rows = DEFAULT_BUFFER_ROWS, resume_offset = None, rows = 0):
+        self.file = open_result_file(file_path, "wb", resume_offset)
+        self.buffer = np.empty((buffer_rows, n_columns), dtype=np.float64)
+        self.row_bytes = n_columns * 8
+        self.capacity = buffer_rows
+        self.batch_rows = max(1, buffer_rows // 4)
+        self.head = rows                                                # rows pushed so far
+        self.tail = rows                                                # rows written so far
+        self.rows = rows
+        self.closed = False
+        self.flushing = False                                           # checkpoint() waits for every row to be written
+        self.error = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.drain, name="result-writer", daemon=True)
+        self.thread.start()
+
+    def push(self, row):
+        with self.condition:
+            while self.head - self.tail >= self.capacity and self.error is None:
+                self.condition.wait()
+            if self.error is not None:
+                raise RuntimeError(f"Result writer failed: {self.error}") from self.error
+
+            self.buffer[self.head % self.capacity] = row
+            self.head += 1
+            self.rows = self.head
+            if self.head - self.tail >= self.batch_rows:
+                self.condition.notify_all()
+
+    def drain(self):
+        try:
+            while True:
+                with self.condition:
+                    while self.head - self.tail < self.batch_rows and not self.closed and not (self.flushing and self.head > self.tail):
+                        self.condition.wait()
+                    start, stop = self.tail, self.head
+                    if start == stop and self.closed:
+                        break
+
+                # rows start..stop are only touched by this thread until tail moves past them
+                first, last = start % self.capacity, stop % self.capacity
+                if first < last:
+                    self.file.write(memoryview(self.buffer[first:last]))
+                else:                                                   # the batch wraps around the end of the buffer
+                    self.file.write(memoryview(self.buffer[first:]))
+                    self.file.write(memoryview(self.buffer[:last]))
+
+                with self.condition:
+                    self.tail = stop
+                    self.condition.notify_all()
+        except Exception as e:
+            with self.condition:
+                self.error = e
+                self.condition.notify_all()
+        finally:
+            self.file.close()
+
+    def checkpoint(self):
+        """
+        Waits until every pushed row is written to the file, returns the file's size.
+        """
+        with self.condition:
+            self.flushing = True
+            self.condition.notify_all()
+            while self.tail < self.head and self.error is None:
+                self.condition.wait()
+            self.flushing = False
+            if self.error is not None:
+                raise RuntimeError(f"Result writer failed: {self.error}") from self.error
+            self.file.flush()
+        return self.rows * self.row_bytes
+
+    def close(self):
+        """
+        Flushes every pushed row and stops the writer thread, raises the writer's error if it had one.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        if self.error is not None:
+            raise RuntimeError(f"Result writer failed: {self.error}") from self.error
+
+
+class BinaryResultHandler(ResultHandler):
+    """
+    pyFMI result handler that writes the columnar binary result of one model.
+    Rows are appended to a raw row file while simulating and transposed into columns at the end.
+    With async_write the rows are written by an AsyncRowWriter holding at most buffer_rows rows.
+    recording is a RecordingFilter choosing the recorded variables and communication points.
+    """
+    def __init__(self, model, result_path, recording = None, async_write = False, buffer_rows = DEFAULT_BUFFER_ROWS):
+        self.model = model
+        self.result_path = result_path                                  # <name>_result.json
+        self.recording = recording if recording is not None else RecordingFilter()
+        self.async_write = async_write
+        self.buffer_rows = buffer_rows
+        self.base_path = os.path.splitext(result_path)[0]
+        self.writer = None
+        self.columns = []
+        self.value_references = {}                                      # {FMI2 type : np.array of value references}
+        self.slices = {}                                                # {FMI2 type : slice of the row}
+        self.getters = []                                               # [(slice of the row, bound getter), ...], see bind_values
+        self.resume_state = None                                        # state of checkpoint() to continue from, see resume()
+
+    def set_options(self, options):
+        self.options = options
+
+    def simulation_start(self):
+        variables = self.model.get_model_variables()
+        self.recording.reset()
+        self.last_recorded_time = None
+
+        names = {FMI2_REAL: [], FMI2_INTEGER: [], FMI2_BOOLEAN: []}
+        value_references = {FMI2_REAL: [], FMI2_INTEGER: [], FMI2_BOOLEAN: []}
+        for name in self.recording.select(variables.keys()):
+            variable = variables[name]
+            var_type = FMI2_INTEGER if variable.type == FMI2_ENUMERATION else variable.type
+            if var_type in names:                                       # strings can't be stored as float64
+                names[var_type].append(name)
+                value_references[var_type].append(variable.value_reference)
+
+        self.columns = ["time"]
+        start = 1
+        for var_type in [FMI2_REAL, FMI2_INTEGER, FMI2_BOOLEAN]:
+            self.columns += names[var_type]
+            self.slices[var_type] = slice(start, start + len(names[var_type]))
+            self.value_references[var_type] = np.array(value_references[var_type], dtype=np.uint32)
+            start += len(names[var_type])
+        # bound once per run, a model in a worker process then reads into its shared memory region
+        self.getters = [(self.slices[var_type], bind_values(self.model, GETTERS[var_type], self.value_references[var_type]))
+                        for var_type in [FMI2_REAL, FMI2_INTEGER, FMI2_BOOLEAN] if len(self.value_references[var_type])]
+
+        self.row = np.empty(len(self.columns), dtype=np.float64)
+        if self.resume_state is not None:
+            if self.resume_state["columns"] != len(self.columns):
+                raise ValueError(f"{self.result_path} was recorded with other variables, it can't be resumed.")
+            self.recording.steps = self.resume_state["steps"]
+            self.recording.next_time = self.resume_state["next_time"]
+            self.last_recorded_time = self.resume_state["last_recorded_time"]
+        self.writer = self.open_writer()
+
+    def open_writer(self):
+        resume = self.resume_state or {}
+        if self.async_write:
+            return AsyncRowWriter(self.base_path + ".rows", len(self.columns), self.buffer_rows, resume.get("offset"), resume.get("rows", 0))
+        return RowWriter(self.base_path + ".rows", len(self.columns), resume.get("offset"), resume.get("rows", 0))
+
+    def checkpoint(self):
+        """
+        Writes every recorded row to disk, returns what resume() needs to continue the result from here.
+        """
+        return {
+            "offset": self.writer.checkpoint(),
+            "rows": self.writer.rows,
+            "columns": len(self.columns),
+            "steps": self.recording.steps,
+            "next_time": self.recording.next_time,
+            "last_recorded_time": self.last_recorded_time,
+        }
+
+    def resume(self, state):
+        """
+        The next simulation_start continues the result written up to state (see checkpoint) instead of starting over.
+        """
+        self.resume_state = state
+
+    def initialize_complete(self):
+        pass
+
+    def read_row(self):
+        """
+        Fills self.row with the model's current time and values.
+        """
+        row = self.row
+        row[0] = self.model.time
+        for columns, getter in self.getters:
+            row[columns] = getter()
+        return row
+
+    def integration_point(self, solver = None):
+        time = self.model.time
+        if not self.recording.should_record(time):
+            return
+        self.writer.push(self.read_row())
+        self.last_recorded_time = time
+
+    def simulation_end(self):
+        """
+        Flushes the rows and writes the column file. Safe to call more than once.
+        """
+        if self.writer is None:
+            return
+        # decimated results still end on the final communication point
+        if self.recording.is_decimated() and self.model.time != self.last_recorded_time:
+            self.writer.push(self.read_row())
+        writer = self.writer
+        self.writer = None
+        writer.close()                                                  # raises if the writer thread failed
+        self.write_result(writer.rows)
+
+    def write_result(self, rows):
+        write_columns(self.base_path, self.columns, rows)
+
+    def abort(self):
+        """
+        Stops writing after a failed run, the partial row file is left for inspection.
+        """
+        if self.writer is None:
+            return
+        writer = self.writer
+        self.writer = None
+        try:
+            writer.close()
+        except RuntimeError as e:
+            print(e)
+
+    def get_result(self):
+        return self.result_path
+
+
+class CSVRowWriter:
+    """
+    Writes float64 rows as csv text, formatting batch_rows rows at a time.
+    """
+    def __init__(self, file_path, columns, batch_rows = 1024, resume_offset = None, rows = 0):
+        self.file = open_result_file(file_path, "w", resume_offset, newline="")
+        if resume_offset is None:
+            self.file.write(",".join(columns) + "\n")
+        self.buffer = np.empty((batch_rows, len(columns)), dtype=np.float64)
+        self.count = 0
+        self.rows = rows
+
+    def push(self, row):
+        self.buffer[self.count] = row
+        self.count += 1
+        self.rows += 1
+        if self.count == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.count:
+            np.savetxt(self.file, self.buffer[:self.count], delimiter=",", fmt="%.17g")
+            self.count = 0
+
+    def checkpoint(self):
+        self.flush()
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class CSVResultHandler(BinaryResultHandler):
+    """
+    Result handler writing <name>_result.csv ("time" then one column per variable), for masters
+    that don't write pyFMI's csv results themselves (see py_master.py).
+    """
+    def open_writer(self):
+        resume = self.resume_state or {}
+        return CSVRowWriter(self.result_path, self.columns, resume_offset=resume.get("offset"), rows=resume.get("rows", 0))
+
+    def write_result(self, rows):
+        pass
+
+
+def write_columns(base_path, columns, rows):
+    """
+    Transposes <base_path>.rows (row-major float64) into <base_path>.npy and writes the <base_path>.json schema.
+    """
+    row_path = base_path + ".rows"
+    data_path = base_path + ".npy"
+    n_columns = len(columns)
+
+    out = np.lib.format.open_memmap(data_path, mode="w+", dtype=np.float64, shape=(n_columns, rows))
+    if rows:
+        row_data = np.memmap(row_path, dtype=np.float64, mode="r", shape=(rows, n_columns))
+        for start in range(0, n_columns, TRANSPOSE_BLOCK):
+            stop = min(start + TRANSPOSE_BLOCK, n_columns)
+            out[start:stop] = row_data[:, start:stop].T
+        del row_data
+    out.flush()
+    del out
+    os.remove(row_path)
+
+    schema = {
+        "format": RESULT_FORMAT,
+        "version": RESULT_FORMAT_VERSION,
+        "columns": columns,
+        "rows": rows,
+        "dtype": "float64",
+        "layout": "columns",
+        "data": os.path.basename(data_path),
+    }
+    with open(base_path + ".json", "w") as file:
+        json.dump(schema, file)
@@ -1,11 +1,32 @@
 import os
+import io
+import zipfile
+from math import gcd
+from fractions import Fraction
 import numpy as np
-from fmpy import extract
 from pyfmi import Master, exceptions
-import re
-import shutil
 from eppy import modeleditor
 from eppy.modeleditor import IDF
+from fmu_cache import file_hash, load_cached_json, save_cached_json
+from runSim.result_store import BinaryResultHandler, RecordingFilter, DEFAULT_BUFFER_ROWS
+from runSim.input_data import align_sources, StreamingInput, FILL_METHODS, DEFAULT_CHUNK_ROWS
+from runSim.coupling_graph import analyze_coupling
+from runSim.py_master import PythonMaster
+from runSim.model_worker import ModelProcess
+from runSim.checkpoint import get_checkpoint_dir, read_checkpoint_info, clear_checkpoint, DEFAULT_SNAPSHOT_CACHE_BYTES
+
+# bump whenever the fields returned by get_idf_info change, old cache entries are then ignored
+IDF_INFO_VERSION = 1
+
+# "csv" writes <name>_result.csv through pyFMI, "binary" writes the columnar store in result_store.py,
+# "binary-async" writes the same store from a background thread so stepping never waits on disk
+RESULT_FORMATS = ["csv", "binary", "binary-async"]
+
+# step sizes are rounded to this many steps per second when the multi-rate macro step is found
+MULTIRATE_RESOLUTION = 10 ** 6
+
+# "pyfmi" runs pyFMI's Master, "python" runs the master in py_master.py (batched value reference exchange)
+MASTER_TYPES = ["pyfmi", "python"]
 
 def is_number(value):
     if is_float(value) or value.isnumeric():
@@ -48,12 +69,15 @@ def get_final_time():
 
     return final_time
 
-def check_multiple(start_time, final_time, initialize=True):
+def check_multiple(start_time, final_time, initialize=True, interactive=True):
     div_time = 86400
     is_not_multiple = float(final_time)%div_time
 
     if is_not_multiple != 0:
         print("Warning: EnergyPlus requires delta between start and stop time to be a multiple of 86400.")
+        if not interactive:
+            print("Proceeding anyways (non-interactive run).")
+            return start_time, final_time
         proceed = input("Proceed anyways? [y/n] : ")
         while proceed.lower() not in ['y', 'n']:
             proceed = input("Please input [y/n]: ")
@@ -68,91 +92,212 @@ def check_multiple(start_time, final_time, initialize=True):
     
     return start_time, final_time
 
-def get_master_step_size(fmu_objects):
-    # fmu_files is formated like such: [("idf", fmu_model, file_path), ("mo", fmu_model), ("sim", fmu_model) ...]
-
-    size = None
+def get_fmu_step_size(fmu_obj, interactive=True):
+    """
+    Returns the communication step size of one FMU, None if it can handle variable step sizes,
+    or -1 if it can't be found (when interactive is False, nothing is asked).
+    """
     seconds_in_hour = 60 * 60
+    new_size = -1
+    fmu_path = fmu_obj.fmu_path
+    metadata = fmu_obj.metadata
 
+    # if fmu_object can handle variable step_size, skip fmu
+    if metadata.can_handle_variable_step():
+        return None
 
-    for fmu_obj in fmu_objects:
-        new_size = -1
-        fmu_path = fmu_obj.fmu_path
-        loaded_fmu = fmu_obj.loaded_fmu
-
-        # if fmu_object can handle variable step_size, skip fmu
-        canHandle = False
-        if "canHandleVariableCommunicationStepSize" in loaded_fmu.get_capability_flags():
-            canHandle = loaded_fmu.get_capability_flags()["canHandleVariableCommunicationStepSize"]
-        if canHandle:
-            continue
+    # if fmu is EnergyPlus model, parse through idf file to fine TimeStep and calculate step_size
+    if metadata.is_energyplus():
+        try:
+            idf_steps_per_hour = get_idf_info(fmu_path)["steps_per_hour"]    # read from the zip, cached per FMU hash
+        except FileNotFoundError as e:
+            print(e)
+            return -1
 
-        # if fmu is EnergyPlus model, parse through idf file to fine TimeStep and calculate step_size
-        if "idf" in loaded_fmu.get_generation_tool() or "energyplus" in loaded_fmu.get_generation_tool():
-            unzipdir = extract(fmu_path)
-            path = unzipdir + "\\resources\\"
-            for file in os.listdir(path):
-                if file.endswith(".idf"):
-                    path = os.path.join(path, file)
-                # if file.endswith(".idd"):                             used for finding step size with idf modeleditor
-                    # iddfile = os.path.join(path, file)
+        if idf_steps_per_hour > 0:
+            new_size = float(seconds_in_hour/idf_steps_per_hour)
 
-            try:
-                idf_steps_per_hour = get_step_size_parse(path) 
-                # idf_steps_per_hour = get_step_size(path, iddfile)     used for finding step size with idf modeleditor
-                new_size = float(seconds_in_hour/idf_steps_per_hour)
-            except FileNotFoundError as e:
-                print(e)
+        # if TimeStep is not a component of EnergyPlus, input it manually
+        if new_size < 0:
+            fmu_name = os.path.splitext(os.path.basename(fmu_path))[0]
+            if not interactive:
+                print(f"Step_size couldn't be found for FMU '{fmu_name}'. Please give the step size explicitly.")
                 return -1
-            
-            shutil.rmtree(unzipdir)                                     # close the copied zip file
-
-            # if TimeStep is not a component of EnergyPlus, input it manually
-            if new_size < 0:
-                fmu_name = os.path.splitext(os.path.basename(fmu_path))[0]
-                while (1):
-                    new_size = input(f"Step_size couldn't be found for FMU '{fmu_name}'. Please input manually: ")
-                    try:
-                        new_size = float(new_size)
-                        break
-                    except ValueError:
-                        print("That is not a number...")
-                        continue
-        else:
-            new_size = loaded_fmu.get_default_experiment_step()
+            while (1):
+                new_size = input(f"Step_size couldn't be found for FMU '{fmu_name}'. Please input manually: ")
+                try:
+                    new_size = float(new_size)
+                    break
+                except ValueError:
+                    print("That is not a number...")
+                    continue
+    else:
+        new_size = metadata.get_default_step_size()
+
+    return new_size
+
+def ask_step_size(interactive=True):
+    # used when all models can handle variable step size
+    if not interactive:
+        print("All models can handle variable stepSizes. Please give the step size explicitly.")
+        return -1
+    while(1):
+        new_size = input("All models can handle variable stepSizes, please input prefered stepSize: ")
+        try:
+            return float(new_size)
+        except ValueError:
+            print("That is not a number...")
+            continue
+
+def get_master_step_size(fmu_objects, interactive=True):
+    # fmu_files is formated like such: [("idf", fmu_model, file_path), ("mo", fmu_model), ("sim", fmu_model) ...]
+    # when interactive is False, returns -1 instead of asking for step sizes that can't be found
+
+    size = None
+
+    for fmu_obj in fmu_objects:
+        new_size = get_fmu_step_size(fmu_obj, interactive=interactive)
+        if new_size == -1:
+            return -1
+        if new_size is None:
+            continue
 
         if size is None:
             size = new_size
         elif size != new_size:      
             # if sizes aren't equal, master.simulate will not initialize
             print("The stepSizes of models aren't equal and models can't handle variable stepSizes. Cannot run simulation.")
+            print("The python master can run every model at its own step size, type 'master python' to use it.")
             return -1
 
     # if all models can handle variable step size
     if size is None:
-        while(1):
-            new_size = input("All models can handle variable stepSizes, please input prefered stepSize: ")
+        size = ask_step_size(interactive)
+
+    return size
+
+def step_gcd(step_sizes):
+    """
+    Returns the largest step every step size is a whole multiple of, and the smallest time every
+    step size divides (when all models meet again). Step sizes are read as fractions of at most 1e-6 s resolution.
+    """
+    fractions = [Fraction(step).limit_denominator(MULTIRATE_RESOLUTION) for step in step_sizes]
+    numerator = 0
+    denominator = 1
+    for fraction in fractions:
+        denominator = denominator * fraction.denominator // gcd(denominator, fraction.denominator)
+    numerators = [int(fraction * denominator) for fraction in fractions]
+    for value in numerators:
+        numerator = gcd(numerator, value)
+    common_multiple = 1
+    for value in numerators:
+        common_multiple = common_multiple * value // gcd(common_multiple, value)
+    return float(Fraction(numerator, denominator)), float(Fraction(common_multiple, denominator))
+
+def get_multirate_step_sizes(fmu_objects, interactive=True):
+    """
+    Returns (macro step size, {"fmu_name" : step size}) for the multi-rate python master, or -1.
+    Every FMU steps at its own step size, the macro step is their greatest common divisor.
+    FMUs that can handle variable step sizes step at the macro step.
+    """
+    step_sizes = {}
+    for fmu_obj in fmu_objects:
+        new_size = get_fmu_step_size(fmu_obj, interactive=interactive)
+        if new_size == -1:
+            return -1
+        step_sizes[fmu_obj.name] = new_size
+
+    fixed_sizes = [size for size in step_sizes.values() if size is not None]
+    if not fixed_sizes:
+        macro_step = ask_step_size(interactive)
+        if macro_step == -1:
+            return -1
+        return macro_step, {fmu_name: macro_step for fmu_name in step_sizes}
+
+    macro_step, sync_period = step_gcd(fixed_sizes)
+    if macro_step <= 0:
+        print("Step sizes must be larger than 0. Cannot run simulation.")
+        return -1
+    step_sizes = {fmu_name: macro_step if size is None else size for fmu_name, size in step_sizes.items()}
+    if len(set(fixed_sizes)) > 1:
+        print(f"Multi-rate run: macro step {macro_step}s, all models meet every {sync_period}s.")
+        for fmu_name, size in step_sizes.items():
+            print(f" - {fmu_name:<30} steps every {size}s")
+    return macro_step, step_sizes
+
+def parse_idf_objects(lines, class_names):
+    """
+    Yields (class_name, [fields]) for each idf object with a (lowercase) class name in class_names.
+    """
+    current = ""
+    for line in lines:
+        line = line.split("!")[0]                                   # drop idf comments
+        while ";" in line:
+            end, line = line.split(";", 1)
+            fields = [field.strip() for field in (current + end).split(",")]
+            current = ""
+            if fields[0].lower() in class_names:
+                yield fields[0].lower(), fields[1:]
+        current += line
+
+def parse_idf_info(lines):
+    """
+    Parses the facts the co-simulation needs out of an idf: Timestep and RunPeriod.
+    """
+    info = {"version": IDF_INFO_VERSION, "steps_per_hour": -1, "run_period": None}
+    idf_version = 0.0
+    run_period = None
+
+    for class_name, fields in parse_idf_objects(lines, ["version", "timestep", "runperiod"]):
+        if class_name == "version":
             try:
-                new_size = float(new_size)
-                break
+                idf_version = float(".".join(fields[0].split(".")[:2]))
             except ValueError:
-                print("That is not a number...")
-                continue
-        size = new_size 
+                pass
+        elif class_name == "timestep":
+            try:
+                info["steps_per_hour"] = float(fields[0])
+            except (ValueError, IndexError):
+                info["steps_per_hour"] = -1
+        elif class_name == "runperiod" and run_period is None:
+            run_period = fields
+
+    if run_period is not None:
+        # EnergyPlus 9.0 added Begin Year after Begin Day of Month
+        end_month_index = 4 if idf_version >= 9.0 else 3
+        try:
+            info["run_period"] = {
+                "name": run_period[0],
+                "begin_month": int(run_period[1]),
+                "begin_day": int(run_period[2]),
+                "end_month": int(run_period[end_month_index]),
+                "end_day": int(run_period[end_month_index + 1]),
+            }
+        except (ValueError, IndexError):
+            info["run_period"] = {"name": run_period[0]}
+
+    return info
+
+def get_idf_info(fmu_path):
+    """
+    Returns the idf facts of an EnergyPlus FMU ({"steps_per_hour", "run_period"}).
+    The .idf is streamed out of the FMU zip without extracting it, and the result is cached per FMU content hash.
+    """
+    fmu_hash = file_hash(fmu_path)
+    info = load_cached_json("idf", fmu_hash)
+    if info is not None and info.get("version") == IDF_INFO_VERSION:
+        return info
 
-    return size
+    with zipfile.ZipFile(fmu_path) as zf:
+        idf_names = sorted(name for name in zf.namelist() if name.startswith("resources/") and name.lower().endswith(".idf"))
+        if not idf_names:
+            raise FileNotFoundError(f"No .idf file found inside resources of {fmu_path}")
 
-def get_step_size_parse(path):
-    with open(path, "r") as file:
-        for line in file:
-            if re.search("Timestep,", line):
-                next_line = file.readline()
-                new_size = next_line.split(";")[0]
-                try:
-                    new_size = float(new_size)
-                    return new_size
-                except ValueError:
-                    return -1
+        with zf.open(idf_names[0]) as raw_file:
+            info = parse_idf_info(io.TextIOWrapper(raw_file, encoding="utf-8", errors="replace"))
+
+    save_cached_json("idf", fmu_hash, info)
+    return info
                 
 def get_step_size(path, iddfile):
     try:
@@ -196,40 +341,38 @@ def shorten_df(dfs):
     min_length = min(len(df) for df in dfs)
     return [df.truncate(before=0, after=min_length-1) for df in dfs]
 
-# we merge again because initial fmu_files is creating NOT for master
-# but for each fmu object, so we need to merge them all together
-def merge_columns(dfs, column_name):
+def create_master_input(fmu_objects, fill = "hold", stream = False, chunk_rows = DEFAULT_CHUNK_ROWS):
     """
-    merges column of the given dataframes on column with column_name
+    Builds the Master input object (header, data) from every FMU's data files.
+    All files are aligned on one time grid (see input_data.align_sources), data is a contiguous float64 matrix
+    (with "hold" every change is a repeated time point, so interpolating it linearly still holds the values).
+    With stream = True data is a StreamingInput instead, a function of time reading the files chunk by chunk.
+    Returns None if there is no input data, -1 if the data can't be read or aligned.
     """
-    if len(dfs) != 0:
-        master_df = dfs[0]
-        for df in dfs:
-            if df.equals(dfs[0]):
-                master_df.merge(df, how='outer', on=column_name)
-        
-        master_df.ffill(inplace=True)              # ask amanda if she'd like 0s or forward fill...
-        return master_df
-    else:
-        return None
-
-def create_master_input(fmu_objects):
     master_header = []
-    data_dfs_array = []
+    sources = []
 
     for fmu_obj in fmu_objects:
-        input_obj = fmu_obj.csv_to_input_object(master = True)
-        if len(input_obj[0]) != 0 and input_obj[1] is not None:
-            master_header = master_header + input_obj[0]
-            data_dfs_array.append(input_obj[1])
-
-    # shortened_df = shorten_df(data_dfs_array)                     do we want to shorten? otherwise the same data just gets repeated over and over
-    master_df = merge_columns(data_dfs_array, 'time')
+        if stream:
+            input_obj = fmu_obj.stream_input_object(master = True, fill = fill, chunk_rows = chunk_rows)
+        else:
+            input_obj = fmu_obj.csv_to_input_object(master = True)
+        if input_obj == 0:
+            return -1
+        master_header = master_header + input_obj[0]
+        sources = sources + input_obj[1]
 
-    if len(master_header) == 0 and master_df is None:
+    if len(master_header) == 0:
         return None
-    
-    master_data = master_df.values
+
+    if stream:
+        return (master_header, StreamingInput(sources))
+
+    try:
+        master_data = align_sources(sources, fill)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return -1
     
     return (master_header, master_data)
      
@@ -282,28 +425,157 @@ def get_additional_options(options):
                 continue
         
 
-def main(result_dir, fmu_objects, connections, start_time = 0, final_time = 60, initialize = True):
+def set_master_options(options, master_options):
+    """
+    Copies user given Master options (e.g. from a scenario file) into options.
+    Returns 0 if an option doesn't exist, 1 otherwise.
+    """
+    for option_name, option_value in master_options.items():
+        if option_name not in options:
+            print(f"'{option_name}' is NOT a real option. See 'list options' in the interactive run for all options.")
+            return 0
+        options[option_name] = option_value
+    return 1
+
+def set_csv_recording(options, fmu_objects, outputs, record_every_steps):
+    """
+    Applies the recording filters to pyFMI's own csv result handling.
+    Only records the variables in outputs ({"fmu_name": ["var_name", "var*"...]}) for the given FMUs.
+    """
+    if outputs is not None:
+        if "filter" not in options:
+            print("Warning: this version of pyFMI can't filter results, recording every variable.")
+        else:
+            for fmu_obj in fmu_objects:
+                if fmu_obj.name in outputs:
+                    options["filter"][fmu_obj.loaded_fmu] = outputs[fmu_obj.name]
+
+    if record_every_steps > 1:
+        if "result_downsampling_factor" not in options:
+            print("Warning: this version of pyFMI can't decimate csv results, recording every step. Use a binary result format instead.")
+        else:
+            options["result_downsampling_factor"] = record_every_steps
+
+def set_parameters(fmu_objects, parameters):
+    """
+    Sets parameter values ({"fmu_name": {"var_name": value}}) on the loaded models before they are initialized.
+    Returns 0 if an FMU or variable doesn't exist, 1 otherwise.
+    """
+    fmu_dict = {fmu_obj.name: fmu_obj for fmu_obj in fmu_objects}
+    for fmu_name, values in parameters.items():
+        if fmu_name not in fmu_dict:
+            print(f"Error: FMU '{fmu_name}' does not exist, can't set its parameters.")
+            return 0
+        for var_name, value in values.items():
+            if fmu_dict[fmu_name].metadata.get_value_reference(var_name) is None:
+                print(f"Error: '{var_name}' is not a variable of FMU '{fmu_name}'.")
+                return 0
+            fmu_dict[fmu_name].loaded_fmu.set(var_name, value)
+    return 1
+
+def get_snapshot_context(fmu_objects, connections, parameters, input_fill):
+    """
+    What the initial state of a run depends on besides the master's options: the FMU files, their parameters,
+    the links and the input data given to every FMU. File paths are left out, a moved file still matches.
+    """
+    parameters = parameters if parameters is not None else {}
+    fmus = {}
+    for fmu_obj in fmu_objects:
+        fmus[fmu_obj.name] = {
+            "hash": fmu_obj.metadata.fmu_hash,
+            "parameters": parameters.get(fmu_obj.name, {}),
+            "data": sorted([source.get_hash(), sorted(source.inputs)] for source in fmu_obj.input_store.sources.values()),
+            "suppressed": sorted(fmu_obj.suppressed_inputs),
+        }
+    return {"fmus": fmus, "links": sorted(list(link) for link in connections), "input_fill": input_fill}
+
+def main(result_dir, fmu_objects, connections, start_time = 0, final_time = 60, initialize = True,
+         interactive = True, step_size = None, master_options = None, outputs = None, parameters = None,
+         result_format = "csv", result_buffer_rows = DEFAULT_BUFFER_ROWS, record_every_steps = 1, record_every_seconds = None,
+         input_fill = "hold", input_streaming = False, input_chunk_rows = DEFAULT_CHUNK_ROWS, master_type = "pyfmi",
+         checkpoint_every = 0, resume_from = None, warmup_time = 0, snapshot_cache = False,
+         snapshot_cache_bytes = DEFAULT_SNAPSHOT_CACHE_BYTES):
     """
     This function runs the simulation.
+    fmu_objects is {"fmu_name" : FMUObject} and connections is the workspace's ConnectionGraph.
+    With interactive = False nothing is asked, start_time/final_time/step_size/master_options are used as given.
+    result_buffer_rows bounds the rows held in memory by the "binary-async" result writer.
+    outputs ({"fmu_name": ["var_name", "var*"...]}), record_every_steps and record_every_seconds choose what is recorded.
+    input_fill ("hold" or "linear") fills input data between the time points of each data file.
+    input_streaming reads the data files input_chunk_rows rows at a time while running instead of loading them whole.
+    master_type chooses the co-simulation master, see MASTER_TYPES. The python master without a step_size
+    runs every FMU at its own step size (see get_multirate_step_sizes).
+    checkpoint_every (seconds of simulation time) makes the python master checkpoint the run into result_dir,
+    resume_from (a checkpoint directory, see runSim/checkpoint.py) continues a run from its last checkpoint
+    with the times and step sizes it was started with.
+    warmup_time steps the python master that long after start_time without recording. With snapshot_cache the
+    state after initialization and warm-up is cached (at most snapshot_cache_bytes for all runs) and restored
+    by later runs with the same FMUs, parameters, links, input data, start time and step sizes.
     """
+    if result_format not in RESULT_FORMATS:
+        print(f"Result format '{result_format}' doesn't exist, options are: {RESULT_FORMATS}")
+        return -1
+
+    if input_fill not in FILL_METHODS:
+        print(f"Input fill '{input_fill}' doesn't exist, options are: {FILL_METHODS}")
+        return -1
+
+    if master_type not in MASTER_TYPES:
+        print(f"Master '{master_type}' doesn't exist, options are: {MASTER_TYPES}")
+        return -1
+
+    resume_info = None
+    if resume_from is not None:
+        if master_type != "python":
+            print("Error: only runs of the python master can be resumed.")
+            return -1
+        try:
+            resume_info = read_checkpoint_info(resume_from)
+        except (OSError, ValueError) as e:
+            print(f"Error: there is no checkpoint to resume from: {e}")
+            return -1
+        start_time, final_time, step_size = resume_info["start_time"], resume_info["final_time"], resume_info["step_size"]
+        initialize = True
+        interactive = False
+        print(f"Resuming the run from its checkpoint at time {resume_info['time']}.")
+
     hasEnergyPlus = False
 
     models = []                             # list of loaded fmu objects/models
 
+    fmu_dict = fmu_objects                  # {"fmu_name" : FMUObject}
+
+    # models are handed to the Master in execution order, FMUs giving data to others first
+    coupling = analyze_coupling(fmu_dict, connections)
+    coupling.print_summary()
+    fmu_objects = [fmu_dict[fmu_name] for fmu_name in coupling.order]
+
     for fmu_obj in fmu_objects:
         models.append(fmu_obj.loaded_fmu)
-        if "idf" in fmu_obj.loaded_fmu.get_generation_tool() or "energyplus" in fmu_obj.loaded_fmu.get_generation_tool():
+        if fmu_obj.metadata.is_energyplus():
             hasEnergyPlus = True
 
+    isolated = [fmu_obj.name for fmu_obj in fmu_objects if isinstance(fmu_obj.loaded_fmu, ModelProcess)]
+    if isolated and master_type != "python":
+        print(f"Error: FMUs {isolated} run in worker processes, only the python master can run them.")
+        return -1
+
+    # connections are kept between FMU names (see connection_graph.py), Master needs them between the loaded models
+    master_connections = connections.get_master_connections(fmu_dict)
+
     try:
-        master = Master(models, connections)
-    except exceptions.InvalidFMUException as e:
+        if master_type == "python":
+            master = PythonMaster(fmu_objects, connections, coupling)
+        else:
+            master = Master(models, master_connections)
+    except (exceptions.InvalidFMUException, ValueError) as e:
         print(f"Initialization Error: {e}")
         return None
 
-    if initialize:
-        start_time = get_start_time()
-    final_time = get_final_time()
+    if interactive:
+        if initialize:
+            start_time = get_start_time()
+        final_time = get_final_time()
     
     while (start_time > final_time) or start_time < 0 or final_time < 0:
         if (start_time > final_time):
@@ -313,43 +585,108 @@ def main(result_dir, fmu_objects, connections, start_time = 0, final_time = 60,
         if (final_time < 0):
             print("Final time cannot be lower than 0.")
         print("")
+        if not interactive:
+            return -1
         if initialize:
             start_time = get_start_time()
         final_time = get_final_time()
 
     if hasEnergyPlus:
-        start_time, final_time = check_multiple(start_time, final_time, initialize=initialize)
-
-    step_size = get_master_step_size(fmu_objects)
+        start_time, final_time = check_multiple(start_time, final_time, initialize=initialize, interactive=interactive)
+
+    fmu_step_sizes = None                   # {"fmu_name" : step size} when the python master runs every model at its own rate
+    if resume_info is not None:
+        fmu_step_sizes = {fmu_name: size for fmu_name, size in resume_info["step_sizes"].items() if fmu_name in fmu_dict}
+    elif step_size is None and master_type == "python":
+        step_sizes = get_multirate_step_sizes(fmu_objects, interactive=interactive)
+        if step_sizes == -1:
+            return -1
+        step_size, fmu_step_sizes = step_sizes
+    elif step_size is None:
+        step_size = get_master_step_size(fmu_objects, interactive=interactive)
     if step_size == -1:
         return -1
 
-    input_object = create_master_input(fmu_objects)
+    if parameters is not None and not set_parameters(fmu_objects, parameters):
+        return -1
+
+    input_object = create_master_input(fmu_objects, input_fill, input_streaming, input_chunk_rows)
+    if isinstance(input_object, int):
+        return -1
     
     options = master.simulate_options()
-    get_additional_options(options)
+    if master_options is not None and not set_master_options(options, master_options):
+        return -1
+    if master_type == "python":
+        options["checkpoint_dir"] = get_checkpoint_dir(result_dir)
+        options["checkpoint_interval"] = checkpoint_every
+        options["resume"] = resume_from or ""
+        if resume_from is None:
+            clear_checkpoint(options["checkpoint_dir"])
+        options["warmup_time"] = warmup_time
+        options["snapshot_cache_bytes"] = snapshot_cache_bytes
+        if snapshot_cache:
+            options["snapshot_context"] = get_snapshot_context(fmu_objects, connections, parameters, input_fill)
+    elif checkpoint_every or warmup_time or snapshot_cache:
+        print("Warning: pyFMI's Master can't write checkpoints, warm up or cache snapshots, use the python master ('master python').")
+    if parameters is not None and "parameters" in options:
+        # the python master replays them on FMUs it loads again in worker processes
+        options["parameters"] = {fmu_dict[fmu_name].loaded_fmu: values for fmu_name, values in parameters.items()}
+    if interactive:
+        get_additional_options(options)
+
+    is_binary = result_format in ["binary", "binary-async"]
+    if is_binary and "result_handler" not in options:
+        print("Warning: this version of pyFMI can't use custom result handlers, saving results as csv.")
+        is_binary = False
 
     # Necessary options:
     options["initialize"] = initialize
-    options["result_handling"] = "csv"
+    options["result_handling"] = "custom" if is_binary else "csv"
 
     res = {}
+    result_handlers = []
     
     for fmu_obj in fmu_objects:
         name = fmu_obj.name
+        if is_binary:
+            result_path = os.path.join(result_dir, name + "_result.json")
+            recording = RecordingFilter(outputs.get(name) if outputs is not None else None, record_every_steps, record_every_seconds)
+            handler = BinaryResultHandler(fmu_obj.loaded_fmu, result_path, recording,
+                                          async_write=(result_format == "binary-async"), buffer_rows=result_buffer_rows)
+            options["result_handler"][fmu_obj.loaded_fmu] = handler
+            result_handlers.append(handler)
+            res[name] = result_path
+            continue
         result_csv_path = result_dir + "\\" + name + "_result.csv"
         res[name] = result_csv_path
         options["result_file_name"][fmu_obj.loaded_fmu] = result_csv_path
+
+    if not is_binary:
+        if record_every_seconds:
+            print("Warning: csv results can't be recorded every T seconds, use a binary result format instead.")
+        set_csv_recording(options, fmu_objects, outputs, record_every_steps)
     # ncp = int((final_time - start_time)/(step_size))
     options['step_size'] = step_size
+    if fmu_step_sizes is not None:
+        options["step_sizes"] = {fmu_dict[fmu_name].loaded_fmu: size for fmu_name, size in fmu_step_sizes.items()}
 
     try: 
         master.simulate(start_time=start_time, final_time=final_time, options = options, input= input_object)
+        # flushes anything still buffered and raises errors of the background result writers
+        for handler in result_handlers:
+            handler.simulation_end()
+        if master_type == "python":
+            clear_checkpoint(options["checkpoint_dir"])
         return res
     except exceptions.FMUException as e:     
         print(f"FMU Error: {e}")
+        for handler in result_handlers:
+            handler.abort()
         return e
     except Exception as e:
         print(f"Error: {e}")
+        for handler in result_handlers:
+            handler.abort()
         return e
 
@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import functools
+import fmu_files
+from runSim.result_store import DEFAULT_BUFFER_ROWS
+from runSim.input_data import DEFAULT_CHUNK_ROWS
+from runSim.checkpoint import DEFAULT_SNAPSHOT_CACHE_BYTES
+
+"""
+Headless scenario runner. Runs a whole co-simulation from one scenario (json) file, nothing is asked.
+
+Usage:
+python scenario.py <scenario.json> <scenario2.json> ...
+
+Scenario file format (paths are relative to the scenario file):
+{
+    "save_dir" : "path/to/save_dir",                                    optional, defaults to the scenario file's directory
+    "lazy" : true,                                                      optional, only load FMUs with pyFMI when running
+    "fmus" : ["path/to/FMU1.fmu", {"path" : "path/to/FMU2.fmu", "name" : "FMU2"}],
+    "links" : [["FMU1", "output_name", "FMU2", "input_name"], ...],
+    "link_rules" : [{"from" : "FMU1", "to" : "FMU2", "match" : "glob", "outputs" : "zone*_T", "inputs" : "T_zone*"}, ...],
+                                                                        optional, bulk links, see link_rules.py
+    "data" : [{"fmu" : "FMU1", "path" : "path/to/data.csv"}, ...],
+    "suppress" : {"FMU1" : "all", "FMU2" : ["input_name", ...]},
+    "start_time" : 0,
+    "final_time" : 86400,
+    "step_size" : 600,                                                  optional, found from the FMUs otherwise
+    "parameters" : {"FMU1" : {"parameter_name" : 1.5}, ...},            optional, set before the FMUs are initialized
+    "options" : {"logging" : false, ...},                               optional, pyFMI Master simulate options
+    "outputs" : {"FMU1" : ["output_name", "prefix*"], ...},             optional, only record these variables
+    "result_format" : "binary-async",                                   optional, "csv" (default), "binary" or "binary-async"
+    "result_buffer_rows" : 4096,                                        optional, rows buffered by the "binary-async" writer
+    "record_every_steps" : 6,                                           optional, record every N-th communication step
+    "record_every_seconds" : 3600,                                      optional, record at most once every T seconds (binary formats)
+    "input_fill" : "linear",                                            optional, "hold" (default) or "linear" between data time points
+    "input_streaming" : true,                                           optional, read data files chunk by chunk while running
+    "input_chunk_rows" : 8192,                                          optional, rows per chunk when streaming
+    "master" : "python",                                                optional, "pyfmi" (default) or "python"
+    "isolate" : ["FMU1", ...],                                          optional, FMUs run in their own worker process (python master)
+    "checkpoint_every" : 86400,                                         optional, checkpoint python master runs every T seconds
+    "resume_from" : "path/to/Result_and_Logs",                          optional, continue that run from its last checkpoint
+    "warmup_time" : 604800,                                             optional, step T seconds before recording (python master)
+    "snapshot_cache" : true,                                            optional, reuse the initialized/warmed-up state of earlier runs
+    "snapshot_cache_mb" : 4096                                          optional, disk space of all cached snapshots
+}
+"""
+REQUIRED_KEYS = ["fmus", "final_time"]
+
+
+def resolve_path(base_dir, path):
+    return path if os.path.isabs(path) else os.path.normpath(os.path.join(base_dir, path))
+
+
+def load_scenario(scenario_path):
+    """
+    Reads a scenario file, returns the scenario dictionary with absolute paths, or None if it is invalid.
+    """
+    try:
+        with open(scenario_path, "r") as file:
+            scenario = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Error: could not read scenario file {scenario_path}: {e}")
+        return None
+
+    for key in REQUIRED_KEYS:
+        if key not in scenario:
+            print(f"Error: scenario file {scenario_path} is missing '{key}'.")
+            return None
+
+    # the workspace changes the working directory, so every path is made absolute first
+    base_dir = os.path.dirname(os.path.abspath(scenario_path))
+    scenario["save_dir"] = resolve_path(base_dir, scenario.get("save_dir", base_dir))
+
+    fmus = []
+    for fmu in scenario["fmus"]:
+        if isinstance(fmu, str):
+            fmu = {"path": fmu}
+        fmu["path"] = resolve_path(base_dir, fmu["path"])
+        fmus.append(fmu)
+    scenario["fmus"] = fmus
+
+    for data in scenario.get("data", []):
+        data["path"] = resolve_path(base_dir, data["path"])
+
+    if "resume_from" in scenario:
+        scenario["resume_from"] = resolve_path(base_dir, scenario["resume_from"])
+
+    return scenario
+
+
+def build_workspace(scenario):
+    """
+    Builds a non-interactive FMUWorkspace from a scenario, returns None if any step of the setup fails.
+    """
+    if not os.path.isdir(scenario["save_dir"]):
+        print(f"Error: The directory {scenario['save_dir']} does not exist.")
+        return None
+
+    workspace = fmu_files.FMUWorkspace(save_dir=scenario["save_dir"], lazy=scenario.get("lazy", False), interactive=False)
+    workspace.set_input_streaming(scenario.get("input_streaming", False))
+
+    # FMUs without a name are loaded together, named FMUs keep their given name
+    unnamed_paths = [fmu["path"] for fmu in scenario["fmus"] if "name" not in fmu]
+    for fmu_name, fmu_path, ret in workspace.add_fmus(unnamed_paths):
+        if ret != 1:
+            return None
+    for fmu in scenario["fmus"]:
+        if "name" in fmu and workspace.add_fmu(fmu["path"], fmu["name"]) != 1:
+            return None
+
+    for link in scenario.get("links", []):
+        if isinstance(link, dict):
+            link = [link["output_fmu"], link["output"], link["input_fmu"], link["input"]]
+        if not workspace.link_input_output(*link):
+            return None
+
+    if scenario.get("link_rules") and not workspace.link_by_rules(scenario["link_rules"]):
+        return None
+
+    for fmu_name in scenario.get("isolate", []):
+        if not workspace.isolate_fmu(fmu_name):
+            return None
+
+    for data in scenario.get("data", []):
+        if not workspace.add_data(data["fmu"], data["path"]):
+            return None
+
+    for fmu_name, input_names in scenario.get("suppress", {}).items():
+        if input_names == "all":
+            ret = workspace.suppress_input(fmu_name)
+        else:
+            ret = min([workspace.suppress_input(fmu_name, input_name) for input_name in input_names], default=1)
+        if not ret:
+            return None
+
+    return workspace
+
+
+def run_scenario(scenario):
+    """
+    Builds and runs one scenario.
+    Returns (0, {"fmu_name" : "result_file"}) if the run finished, (1, None) otherwise.
+    """
+    workspace = build_workspace(scenario)
+    if workspace is None:
+        print("Scenario setup failed.")
+        return 1, None
+
+    try:
+        return run_workspace(workspace, scenario)
+    finally:
+        workspace.close_workers()
+
+
+def run_workspace(workspace, scenario):
+    """
+    Runs the built workspace of scenario, returns like run_scenario.
+    """
+    if not workspace.run_checks():
+        return 1, None
+
+    cache_mb = scenario.get("snapshot_cache_mb")
+    # a resumed run keeps the times and step sizes of its checkpoint
+    run = functools.partial(workspace.resume_sim, scenario["resume_from"]) if "resume_from" in scenario else workspace.run_sim
+    ret = run(start_time=scenario.get("start_time", 0), final_time=scenario["final_time"],
+              interactive=False, step_size=scenario.get("step_size"),
+              master_options=scenario.get("options"), outputs=scenario.get("outputs"),
+              parameters=scenario.get("parameters"), result_format=scenario.get("result_format", "csv"),
+              result_buffer_rows=scenario.get("result_buffer_rows", DEFAULT_BUFFER_ROWS),
+              record_every_steps=scenario.get("record_every_steps", 1),
+              record_every_seconds=scenario.get("record_every_seconds"),
+              input_fill=scenario.get("input_fill", "hold"),
+              input_chunk_rows=scenario.get("input_chunk_rows", DEFAULT_CHUNK_ROWS),
+              master_type=scenario.get("master", workspace.master_type),
+              checkpoint_every=scenario.get("checkpoint_every", 0),
+              warmup_time=scenario.get("warmup_time", 0),
+              snapshot_cache=scenario.get("snapshot_cache", False),
+              snapshot_cache_bytes=int(cache_mb * 1024 * 1024) if cache_mb else DEFAULT_SNAPSHOT_CACHE_BYTES)
+    if ret != 1:
+        return 1, None
+
+    # the newest result is the one this run just saved
+    return 0, list(workspace.results.values())[-1]
+
+
+def main(scenario_paths):
+    """
+    Runs every scenario file in order, returns the exit status (0 only if every scenario ran).
+    """
+    failed = []
+    for scenario_path in scenario_paths:
+        print(f"Running scenario '{scenario_path}'")
+        scenario = load_scenario(scenario_path)
+        if scenario is None or run_scenario(scenario)[0] != 0:
+            failed.append(scenario_path)
+
+    print(f"{len(scenario_paths) - len(failed)} of {len(scenario_paths)} scenarios finished.")
+    for scenario_path in failed:
+        print(f"Failed: {scenario_path}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Correct usage of program:")
+        print("python scenario.py <scenario.json> <scenario2.json> ...")
+        sys.exit(2)
+
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,189 @@
+import os
+import sys
+import copy
+import json
+import itertools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import scenario as scenario_runner
+
+"""
+Parameter sweeps. Runs the same scenario many times with different overrides, every case in
+its own worker process (with its own FMU instances) and its own result directory.
+
+Usage:
+python sweep.py <sweep.json>
+
+Sweep file format (paths are relative to the sweep file):
+{
+    "scenario" : "path/to/scenario.json",                               base scenario, see scenario.py
+    "save_dir" : "path/to/save_dir",                                    optional, case_<n> directories are made inside
+    "workers" : 8,                                                      optional, defaults to every core of the machine
+    "grid" : {                                                          every combination of the values is a case
+        "parameters.FMU1.parameter_name" : [1.0, 2.0, 3.0],
+        "final_time" : [86400, 172800]
+    },
+    "cases" : [                                                         and/or explicit cases
+        {"start_time" : 86400, "final_time" : 172800, "data.0.path" : "path/to/other.csv"}
+    ]
+}
+Override keys are dotted paths into the scenario, list entries are given by index. "parameters.<fmu>.<name>"
+is only split twice, so Modelica names like "parameters.FMU1.room.T0" stay whole. For FMU names with a dot,
+give the dictionary instead, it is merged into the scenario's: "parameters" : [{"FMU.1" : {"room.T0" : 293.15}}, ...]
+"""
+# scenario keys whose dotted overrides are only split this many times, the rest is one variable name
+NAMED_KEYS = {"parameters": 2}
+
+
+def expand_cases(sweep):
+    """
+    Returns the list of override dictionaries, explicit cases first and then the grid in order.
+    """
+    cases = [dict(case) for case in sweep.get("cases", [])]
+
+    grid = sweep.get("grid", {})
+    if grid:
+        keys = list(grid.keys())
+        for values in itertools.product(*[grid[key] for key in keys]):
+            cases.append(dict(zip(keys, values)))
+
+    return cases
+
+
+def merge_dicts(target, values):
+    for key, value in values.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_dicts(target[key], value)
+        else:
+            target[key] = value
+
+
+def apply_override(scenario, dotted_key, value, base_dir):
+    """
+    Sets scenario[a][b][c] = value for the dotted key "a.b.c", missing dictionaries are created.
+    A dictionary value is merged into a dictionary that is already there.
+    """
+    first_key = dotted_key.split(".", 1)[0]
+    keys = dotted_key.split(".", NAMED_KEYS[first_key]) if first_key in NAMED_KEYS else dotted_key.split(".")
+    target = scenario
+    for key in keys[:-1]:
+        if isinstance(target, list):
+            target = target[int(key)]
+        else:
+            target = target.setdefault(key, {})
+
+    if keys[-1] == "path" and isinstance(value, str):
+        value = scenario_runner.resolve_path(base_dir, value)
+
+    if isinstance(target, list):
+        target[int(keys[-1])] = value
+    elif isinstance(value, dict) and isinstance(target.get(keys[-1]), dict):
+        merge_dicts(target[keys[-1]], value)
+    else:
+        target[keys[-1]] = value
+
+
+def run_case(case_index, case_scenario, case_dir):
+    """
+    Worker process entry point, runs one case and logs everything it prints into the case directory.
+    """
+    with open(os.path.join(case_dir, "sweep_case_log.txt"), "w") as log_file:
+        with contextlib.redirect_stdout(log_file):
+            try:
+                status, results = scenario_runner.run_scenario(case_scenario)
+            except Exception as e:
+                print(f"Error: {e}")
+                status, results = 1, None
+
+    return case_index, status, results
+
+
+def run_sweep(sweep_path, workers = None):
+    """
+    Runs every case of a sweep file, writes sweep_summary.json and returns the list of case summaries.
+    Returns None if the sweep file or base scenario can't be read.
+    """
+    try:
+        with open(sweep_path, "r") as file:
+            sweep = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Error: could not read sweep file {sweep_path}: {e}")
+        return None
+
+    base_dir = os.path.dirname(os.path.abspath(sweep_path))
+
+    if isinstance(sweep.get("scenario"), str):
+        base_scenario = scenario_runner.load_scenario(scenario_runner.resolve_path(base_dir, sweep["scenario"]))
+    else:
+        print(f"Error: sweep file {sweep_path} must give the path of its base 'scenario'.")
+        return None
+    if base_scenario is None:
+        return None
+
+    save_dir = scenario_runner.resolve_path(base_dir, sweep.get("save_dir", base_scenario["save_dir"]))
+    cases = expand_cases(sweep)
+    if not cases:
+        print("Sweep has no cases. Add a 'grid' or 'cases' to the sweep file.")
+        return None
+
+    summaries = []
+    for case_index, overrides in enumerate(cases):
+        case_scenario = copy.deepcopy(base_scenario)
+        for dotted_key, value in overrides.items():
+            try:
+                apply_override(case_scenario, dotted_key, value, base_dir)
+            except (KeyError, IndexError, ValueError, TypeError) as e:
+                print(f"Error: can't apply override '{dotted_key}' to case {case_index}: {e}")
+                return None
+
+        case_dir = os.path.join(save_dir, f"case_{case_index}")
+        os.makedirs(case_dir, exist_ok=True)
+        case_scenario["save_dir"] = case_dir
+
+        summaries.append({"case": case_index, "overrides": overrides, "save_dir": case_dir,
+                          "scenario": case_scenario, "status": None, "results": None})
+
+    if workers is None:
+        workers = sweep.get("workers", os.cpu_count())
+
+    print(f"Running {len(summaries)} cases on {workers} worker processes...")
+
+    # max_tasks_per_child=1 gives every case a fresh process, some FMUs can only be instantiated once per process
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as pool:
+        futures = [pool.submit(run_case, summary["case"], summary["scenario"], summary["save_dir"]) for summary in summaries]
+        for future in as_completed(futures):
+            try:
+                case_index, status, results = future.result()
+            except Exception as e:                                      # the worker process itself died
+                print(f"Error: a sweep worker crashed: {e}")
+                continue
+            summaries[case_index]["status"] = status
+            summaries[case_index]["results"] = results
+            print(f"Case {case_index} {'finished' if status == 0 else 'failed'}. Log: {os.path.join(summaries[case_index]['save_dir'], 'sweep_case_log.txt')}")
+
+    for summary in summaries:
+        del summary["scenario"]
+        if summary["status"] is None:
+            summary["status"] = 1
+
+    summary_path = os.path.join(save_dir, "sweep_summary.json")
+    with open(summary_path, "w") as file:
+        json.dump(summaries, file, indent=4)
+    print(f"Sweep summary saved in '{summary_path}'")
+
+    return summaries
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Correct usage of program:")
+        print("python sweep.py <sweep.json>")
+        sys.exit(2)
+
+    summaries = run_sweep(sys.argv[1])
+    if summaries is None:
+        sys.exit(1)
+
+    failed = [summary for summary in summaries if summary["status"] != 0]
+    print(f"{len(summaries) - len(failed)} of {len(summaries)} cases finished.")
+    sys.exit(1 if failed else 0)
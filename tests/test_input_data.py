@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+from runSim.input_data import align_sources, ChunkedSourceReader, StreamingInput, FILL_METHODS
+from runSim.py_master import TableInput
+
+"""
+The in-memory input (the aligned matrix, interpolated linearly like pyFMI's Master) and the streamed input
+must give the same values, at the time points of the files and between them.
+"""
+# two files on different time grids, the first one steps at 3600 (a repeated time point)
+SOURCES = [
+    {"time": [0, 3600, 3600, 7200, 10800], "u": [0, 10, 15, 20, 20], "v": [1, 2, 3, 4, 5]},
+    {"time": [0, 1800, 5400, 9000], "w": [5, -5, 5, -5]},
+]
+TIMES = [0, 1, 600, 1800, 2700, 3599.5, 3600, 3600.5, 5000, 5400, 7199, 7200, 9000, 10000, 10800, 12000]
+
+
+def write_sources(directory):
+    paths = []
+    for index, source in enumerate(SOURCES):
+        path = directory / f"source_{index}.csv"
+        pd.DataFrame(source).to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("fill", FILL_METHODS)
+@pytest.mark.parametrize("chunk_rows", [2, 3, 100])
+def test_streamed_input_matches_aligned_input(tmp_path, fill, chunk_rows):
+    sources, readers = [], []
+    for path, source in zip(write_sources(tmp_path), SOURCES):
+        header = [name for name in source if name != "time"]
+        sources.append((np.array(source["time"], dtype=np.float64), np.array([source[name] for name in header], dtype=np.float64).T))
+        readers.append(ChunkedSourceReader(str(path), header, fill, chunk_rows))
+
+    table = TableInput(align_sources(sources, fill))
+    stream = StreamingInput(readers)
+    for time in TIMES:
+        np.testing.assert_allclose(stream(time), table(time), err_msg=f"{fill} input differs at time {time}")
+
+
+def test_hold_doesnt_interpolate():
+    table = TableInput(align_sources([(np.array([0.0, 3600.0, 7200.0]), np.array([[0.0], [10.0], [20.0]]))], "hold"))
+    assert table(600)[0] == 0.0
+    assert table(3600)[0] == 10.0
+    assert table(7199)[0] == 10.0